@@ -38,15 +38,18 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
     'core',
     'user',
     'listing',
+    'batch',
 ]
 
 MIDDLEWARE = [
+    'core.access_log.AccessLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +101,114 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+
+# Property list responses: fresh for TIMEOUT seconds, then served stale
+# for up to STALE_TIMEOUT more while a background refresh runs. Workers
+# see writes made by other workers within GENERATION_TTL seconds.
+PROPERTY_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('PROPERTY_CACHE_TIMEOUT', 30)),
+    'STALE_TIMEOUT': 300,
+    'LOCAL_SIZE': 1024,
+    'LOCK_TIMEOUT': 5,
+    'GENERATION_TTL': 1,
+}
+
+# Batch API: most sub-requests per batch, and how many read-only ones
+# may run at once across all the batches of a process, each holding a
+# database connection.
+BATCH = {
+    'MAX_REQUESTS': 20,
+    'CONCURRENCY': int(os.environ.get('BATCH_CONCURRENCY', 4)),
+}
+
+# Seconds between the periodic refreshes of the price statistics run by
+# the job worker.
+PRICE_STATS = {
+    'REFRESH_INTERVAL': int(os.environ.get('PRICE_STATS_REFRESH_INTERVAL',
+                                           15 * 60)),
+}
+
+# Seconds a saved search matching run waits after a listing is created,
+# so the listings created meanwhile are matched in the same batch.
+SAVED_SEARCHES = {
+    'MATCH_DELAY': int(os.environ.get('SAVED_SEARCHES_MATCH_DELAY', 30)),
+}
+
+# Property photos: stored under ROOT by content hash, up to MAX_SIZE
+# bytes each. With ACCEL_REDIRECT set to an internal location of the
+# front proxy mapped to ROOT, e.g. '/protected-photos/', downloads are
+# sent by the proxy instead of a worker.
+PHOTOS = {
+    'ROOT': Path(os.environ.get('PHOTOS_ROOT', BASE_DIR / 'media' / 'photos')),
+    'MAX_SIZE': int(os.environ.get('PHOTOS_MAX_SIZE', 10 * 2 ** 20)),
+    'ACCEL_REDIRECT': os.environ.get('PHOTOS_ACCEL_REDIRECT', ''),
+}
+
+# Property view counters: seconds between flushes of each process's
+# buffered counts, and how many properties it may hold before flushing
+# early. Together they bound the counts lost if a process dies.
+COUNTERS = {
+    'FLUSH_INTERVAL': int(os.environ.get('COUNTERS_FLUSH_INTERVAL', 10)),
+    'MAX_PENDING': 10_000,
+}
+
+# Property price history: monthly partitions kept MONTHS_AHEAD months in
+# advance, and dropped once older than RETENTION_MONTHS, by a job run
+# every MAINTENANCE_INTERVAL seconds.
+PRICE_HISTORY = {
+    'MONTHS_AHEAD': 3,
+    'RETENTION_MONTHS': int(os.environ.get('PRICE_HISTORY_RETENTION_MONTHS',
+                                           24)),
+    'MAINTENANCE_INTERVAL': 24 * 60 * 60,
+}
+
+# Property change log behind the sync feed: entries older than
+# RETENTION_DAYS are pruned by a job run every PRUNE_INTERVAL seconds.
+# Clients whose cursor is older than that have to reload the listings.
+CHANGE_LOG = {
+    'RETENTION_DAYS': int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30)),
+    'PRUNE_INTERVAL': 24 * 60 * 60,
+}
+
+# Structured access log of API requests, one JSON line each, written to
+# stdout by a background thread. Records beyond CAPACITY queued ones are
+# dropped and counted. Set ACCESS_LOG_LEVEL=INFO to enable it.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.access_log.JSONFormatter'},
+    },
+    'handlers': {
+        'access': {
+            '()': 'core.access_log.BatchingQueueHandler',
+            'formatter': 'json',
+            'capacity': int(os.environ.get('ACCESS_LOG_CAPACITY', 10_000)),
+            'batch_size': 500,
+            'flush_interval': 0.5,
+        },
+    },
+    'loggers': {
+        'access': {
+            'handlers': ['access'],
+            'level': os.environ.get('ACCESS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -143,4 +254,36 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
   'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+  'DEFAULT_THROTTLE_CLASSES': [
+    'core.throttling.ScopedBucketThrottle',
+    'core.throttling.AnonBucketThrottle',
+    'core.throttling.UserBucketThrottle',
+  ],
+  # Requests per period, allowed in a burst and refilled evenly. Scopes
+  # without a rate are not limited.
+  'DEFAULT_THROTTLE_RATES': {
+    'anon': os.environ.get('THROTTLE_ANON_RATE'),
+    'user': os.environ.get('THROTTLE_USER_RATE'),
+    'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+    'signup': os.environ.get('THROTTLE_SIGNUP_RATE', '5/min'),
+  },
+  # Clients are identified by REMOTE_ADDR, or with proxies in front by
+  # the X-Forwarded-For entry the outermost of them added. Anything to
+  # its left is sent by the client and must never be trusted.
+  'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
+
+# Throttle buckets are kept per process unless STORE is 'cache', which
+# shares them between processes through the CACHE_ALIAS cache; it must
+# be Redis for the updates to be atomic across processes.
+THROTTLE = {
+  'STORE': os.environ.get('THROTTLE_STORE', 'local'),
+  'CACHE_ALIAS': 'default',
+  'LOCAL_SIZE': 100_000,
+}
+
+# Serve the OpenAPI schema generated once per code version instead of
+# introspecting the API on every request.
+PRECOMPUTED_SCHEMA = os.environ.get('PRECOMPUTED_SCHEMA', '0') == '1'
+
+SCHEMA_DIR = Path(os.environ.get('SCHEMA_DIR', BASE_DIR / 'schema'))
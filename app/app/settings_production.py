@@ -0,0 +1,94 @@
+"""
+Production settings profile for API workers.
+
+Extends the base settings and drops startup work an API worker never
+uses: the admin site, sessions, messages, static files, templates and
+the browsable API. The OpenAPI schema is served precomputed, so the
+schema tooling is only imported if the stored file is missing.
+
+Select it with DJANGO_SETTINGS_MODULE=app.settings_production.
+"""
+import os
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import (
+    DATABASES,
+    INSTALLED_APPS,
+    LOGGING,
+    MIDDLEWARE,
+    REST_FRAMEWORK,
+    THROTTLE,
+)
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host
+]
+
+SECRET_KEY = os.environ.get('SECRET_KEY')
+
+DROPPED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DROPPED_APPS]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    )
+]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
+
+PRECOMPUTED_SCHEMA = True
+
+# Every worker spends from the same buckets, so a rate holds across the
+# whole deployment rather than per process.
+THROTTLE = {
+    **THROTTLE,
+    'STORE': os.environ.get('THROTTLE_STORE', 'cache'),
+}
+
+# Keep database connections open between requests instead of paying for
+# a new connection on each one, checking a reused connection before the
+# first query of each request, so a connection dropped while idle fails
+# over instead of erroring.
+DATABASES = {
+    **DATABASES,
+    'default': {
+        **DATABASES['default'],
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+# Access log on by default; see LOGGING in the base settings.
+LOGGING = {
+    **LOGGING,
+    'loggers': {
+        'access': {
+            **LOGGING['loggers']['access'],
+            'level': os.environ.get('ACCESS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -14,19 +14,41 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
 from django.urls import path, include
 
-from drf_spectacular.views import (
-  SpectacularAPIView,
-  SpectacularSwaggerView
-)
+from core.health import LivenessView, ReadinessView
+from core.schema import PrecomputedSchemaView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'),
-         name='docs'),
+    path('health/live/', LivenessView.as_view(), name='health-live'),
+    path('health/ready/', ReadinessView.as_view(), name='health-ready'),
     path('api/user/', include('user.urls')),
     path('api/listing/', include('listing.urls')),
+    path('api/batch/', include('batch.urls')),
 ]
+
+if settings.PRECOMPUTED_SCHEMA:
+    urlpatterns.append(
+        path('api/schema/', PrecomputedSchemaView.as_view(), name='schema')
+    )
+else:
+    from drf_spectacular.views import SpectacularAPIView
+
+    urlpatterns.append(
+        path('api/schema/', SpectacularAPIView.as_view(), name='schema')
+    )
+
+if apps.is_installed('drf_spectacular'):
+    from drf_spectacular.views import SpectacularSwaggerView
+
+    urlpatterns.append(
+        path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'),
+             name='docs')
+    )
+
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -0,0 +1,36 @@
+"""
+Contains the serializers for the batch API
+"""
+from django.conf import settings
+from django.utils.translation import gettext as _
+
+from rest_framework import serializers
+
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializes a single request inside a batch"""
+    method = serializers.ChoiceField(choices=METHODS, default='GET')
+    path = serializers.RegexField(r'^/api/(?!batch/)')
+    body = serializers.JSONField(required=False)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and isinstance(data.get('method'), str):
+            data = {**data, 'method': data['method'].upper()}
+        return super().to_internal_value(data)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializes a batch of API requests"""
+    requests = serializers.ListField(
+        child=SubRequestSerializer(),
+        allow_empty=False
+    )
+
+    def validate_requests(self, value):
+        limit = settings.BATCH['MAX_REQUESTS']
+        if len(value) > limit:
+            message = _('A batch holds at most %(limit)d requests.')
+            raise serializers.ValidationError(message % {'limit': limit})
+        return value
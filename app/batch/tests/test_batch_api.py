@@ -0,0 +1,188 @@
+"""
+Tests for the batch request API
+"""
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from batch import views
+from core.models import Country, Photo, PropertyType
+from listing import photos
+
+BATCH_URL = reverse('batch:batch')
+ME_URL = reverse('user:me')
+COUNTRIES_URL = reverse('listing:countries')
+TYPES_URL = reverse('listing:property_types')
+SAVED_SEARCHES_URL = reverse('listing:saved-search-list')
+
+
+def create_user(**params):
+    """Helper function: create user for test purposes."""
+    return get_user_model().objects.create_user(**params)
+
+
+@override_settings(BATCH={'MAX_REQUESTS': 5, 'CONCURRENCY': 1})
+class TestBatchAPI(TestCase):
+    """Tests for the batch endpoint"""
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com',
+                                password='testing123', name='Test User')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        Country.objects.create(name='Nigeria')
+
+    def batch(self, *requests):
+        return self.client.post(BATCH_URL, {'requests': list(requests)},
+                                format='json')
+
+    def test_responses_returned_in_order(self):
+        """Tests every sub-request gets its response, in order."""
+        res = self.batch(
+            {'method': 'GET', 'path': COUNTRIES_URL},
+            {'method': 'get', 'path': ME_URL},
+            {'method': 'GET', 'path': '/api/missing/'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        countries, me, missing = res.data['responses']
+        self.assertEqual(countries['status'], status.HTTP_200_OK)
+        self.assertEqual(countries['body'], [{'name': 'Nigeria'}])
+        self.assertEqual(me['body']['email'], self.user.email)
+        self.assertEqual(missing['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_authenticates_once(self):
+        """Tests sub-requests reuse the batch's authentication."""
+        self.batch({'method': 'GET', 'path': ME_URL})
+
+        with self.assertNumQueries(1):
+            self.batch(*[{'method': 'GET', 'path': ME_URL}] * 4)
+
+    def test_writes_visible_to_later_reads(self):
+        """Tests a write is applied before the reads that follow it."""
+        res = self.batch(
+            {'method': 'PATCH', 'path': ME_URL, 'body': {'name': 'Gift'}},
+            {'method': 'GET', 'path': ME_URL},
+        )
+
+        patched, me = res.data['responses']
+        self.assertEqual(patched['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['name'], 'Gift')
+
+    def test_anonymous_sub_requests_keep_permissions(self):
+        """Tests unauthenticated batches cannot reach private routes."""
+        self.client.credentials()
+
+        res = self.batch({'method': 'GET', 'path': ME_URL})
+
+        self.assertEqual(res.data['responses'][0]['status'],
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_http404_from_django_view(self):
+        """Tests Http404 raised by a plain Django view answers 404, as
+        it would outside a batch.
+        """
+        res = self.batch({'method': 'GET',
+                          'path': reverse('listing:photo', args=['0' * 64])})
+
+        self.assertEqual(res.data['responses'][0]['status'],
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_streamed_response_refused(self):
+        """Tests a photo download is refused on its own, leaving the rest
+        of the batch intact.
+        """
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        digest = 'ab' * 32
+        with override_settings(PHOTOS={**settings.PHOTOS,
+                                       'ROOT': Path(root.name)}):
+            path = photos.photo_path(digest)
+            path.parent.mkdir(parents=True)
+            path.write_bytes(b'photo')
+            Photo.objects.create(sha256=digest, size=5,
+                                 content_type='image/jpeg')
+
+            res = self.batch(
+                {'method': 'GET',
+                 'path': reverse('listing:photo', args=[digest])},
+                {'method': 'GET', 'path': COUNTRIES_URL},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        photo, countries = res.data['responses']
+        self.assertEqual(photo['status'], status.HTTP_406_NOT_ACCEPTABLE)
+        self.assertEqual(countries['body'], [{'name': 'Nigeria'}])
+
+    def test_empty_json_body_kept(self):
+        """Tests an empty JSON list is returned as such, not as null."""
+        res = self.batch({'method': 'GET', 'path': SAVED_SEARCHES_URL})
+
+        self.assertEqual(res.data['responses'][0]['body'], [])
+
+    def test_invalid_batches_rejected(self):
+        """Tests nested batches, foreign paths and oversized batches."""
+        for requests in (
+            [{'method': 'GET', 'path': BATCH_URL}],
+            [{'method': 'GET', 'path': '/admin/'}],
+            [{'method': 'GET', 'path': COUNTRIES_URL}] * 6,
+            [],
+        ):
+            with self.subTest(requests=requests):
+                res = self.batch(*requests)
+                self.assertEqual(res.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BATCH={'MAX_REQUESTS': 20, 'CONCURRENCY': 4})
+class TestBatchConcurrency(TransactionTestCase):
+    """Tests read-only sub-requests running concurrently"""
+
+    def test_concurrent_reads(self):
+        """Tests concurrent reads each get their own response."""
+        Country.objects.create(name='Nigeria')
+        PropertyType.objects.create(name='Bungalow')
+        requests = [
+            {'method': 'GET', 'path': path}
+            for path in (COUNTRIES_URL, TYPES_URL) * 4
+        ]
+
+        res = APIClient().post(BATCH_URL, {'requests': requests},
+                               format='json')
+
+        bodies = [r['body'] for r in res.data['responses']]
+        self.assertEqual(bodies,
+                         [[{'name': 'Nigeria'}], [{'name': 'Bungalow'}]] * 4)
+
+    def test_reads_share_one_pool(self):
+        """Tests every batch reads on the same few pool threads, so
+        concurrent batches cannot open more connections than that.
+        """
+        Country.objects.create(name='Nigeria')
+        threads = set()
+
+        def record(*args, **kwargs):
+            threads.add(threading.current_thread().name)
+            return {'status': status.HTTP_200_OK, 'body': None}
+
+        requests = [{'method': 'GET', 'path': COUNTRIES_URL}] * 8
+        with patch('batch.views.dispatch', side_effect=record):
+            for _ in range(3):
+                APIClient().post(BATCH_URL, {'requests': requests},
+                                 format='json')
+
+        self.assertLessEqual(len(threads), 4)
+        self.assertTrue(all(name.startswith('batch-read')
+                            for name in threads))
+        self.assertIs(views.read_executor(), views.read_executor())
@@ -0,0 +1,168 @@
+"""
+Contains the view that multiplexes several API requests into one
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from batch.serializers import BatchSerializer
+
+READ_ONLY = ('GET', 'HEAD')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def read_executor():
+    """The process's thread pool for concurrent reads.
+
+    Its threads keep their database connections between batches, as
+    request threads do, so however many batches run at once a process
+    holds at most BATCH['CONCURRENCY'] connections for them.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Threads do not survive a fork; each worker starts its own.
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH['CONCURRENCY'],
+                thread_name_prefix='batch-read',
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def build_request(parent, method, path, body=None):
+    """Builds a sub-request inheriting the parent's environment."""
+    path, _, query = path.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        key: value for key, value in parent.META.items()
+        if isinstance(value, str) and key not in (
+            'HTTP_ACCEPT_ENCODING',
+            'HTTP_IF_NONE_MATCH',
+            'HTTP_CONTENT_LENGTH',
+            'HTTP_CONTENT_TYPE',
+        )
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(data),
+        'wsgi.url_scheme': parent.scheme,
+    })
+    return WSGIRequest(environ)
+
+
+def dispatch(request, user, auth, method, path, body=None):
+    """Runs one sub-request through the URL resolver and its view."""
+    sub = build_request(request, method, path, body)
+    sub.user = user
+    if user.is_authenticated:
+        # DRF skips its authenticators when these are set, so the batch
+        # is authenticated once for all of its sub-requests.
+        sub._force_auth_user = user
+        sub._force_auth_token = auth
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return {'status': status.HTTP_404_NOT_FOUND, 'body': None}
+
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception as exc:
+        # Turned into the response the handler would send, e.g. a 404
+        # for Http404 raised by a plain Django view.
+        response = response_for_exception(sub, exc)
+
+    if response.streaming:
+        # Files and generators have no place in a JSON body. Closed
+        # directly: close() sends request_finished, which would recycle
+        # the batch's own database connection.
+        for closer in response._resource_closers:
+            closer()
+        return {
+            'status': status.HTTP_406_NOT_ACCEPTABLE,
+            'body': {'detail': 'Streamed responses cannot be batched.'},
+        }
+
+    content = response.content
+    body = None
+    if content and 'json' in response.get('Content-Type', ''):
+        body = json.loads(content)
+    elif content:
+        body = content.decode(response.charset, errors='replace')
+    return {'status': response.status_code, 'body': body}
+
+
+class BatchView(APIView):
+    """Handles a list of API requests in a single round trip.
+
+    Consecutive read-only requests run concurrently on the threads of
+    `read_executor`, each on its thread's database connection. Writes run
+    in order on the request's connection and act as barriers, so later
+    reads see earlier writes.
+    """
+    authentication_classes = [TokenAuthentication]
+    serializer_class = BatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        subrequests = serializer.validated_data['requests']
+
+        user = request.user
+        results = []
+        reads = []
+
+        def run(sub):
+            return dispatch(request._request, user, request.auth,
+                            sub['method'], sub['path'], sub.get('body'))
+
+        for sub in subrequests:
+            if sub['method'] in READ_ONLY:
+                reads.append(sub)
+                continue
+            results += self.run_reads(reads, run)
+            reads = []
+            results.append(run(sub))
+        results += self.run_reads(reads, run)
+
+        return Response({'responses': results})
+
+    def run_reads(self, reads, run):
+        """Runs independent read-only sub-requests concurrently."""
+        if len(reads) <= 1 or settings.BATCH['CONCURRENCY'] <= 1:
+            return [run(sub) for sub in reads]
+
+        def run_in_thread(sub):
+            # Recycles the thread's connection the way a request does:
+            # kept for CONN_MAX_AGE unless it broke.
+            close_old_connections()
+            try:
+                return run(sub)
+            finally:
+                close_old_connections()
+
+        return list(read_executor().map(run_in_thread, reads))
@@ -0,0 +1,192 @@
+"""
+Structured JSON access log for the API.
+
+The middleware records one entry per API request: route name, user id,
+status, latency and the time spent in database queries. Entries go
+through BatchingQueueHandler, which only puts the record on a bounded
+queue. A writer thread formats what has queued up and writes it to the
+stream in one call. When the writer falls behind and the queue is full,
+records are dropped and counted instead of making requests wait on I/O.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from django.db import connection
+
+logger = logging.getLogger('access')
+
+# Tells the writer thread to drain the queue and stop.
+_STOP = object()
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record and its `access` fields as one JSON line."""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'access', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BatchingQueueHandler(logging.Handler):
+    """Queues records for a writer thread that writes them in batches.
+
+    Each process starts its own writer on the first record it emits, as
+    threads do not survive a fork. `dropped` counts the records lost to a
+    full queue; the writer logs the count once it catches up.
+    """
+
+    def __init__(self, stream=None, capacity=10_000, batch_size=500,
+                 flush_interval=0.5):
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._reported = 0
+        # Request threads count drops concurrently; += is not atomic.
+        self._dropped_lock = threading.Lock()
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Records queued by a parent process are its to write.
+            if self._pid is None:
+                atexit.register(self.close)
+            self._queue = queue.Queue(self.capacity)
+            self._thread = threading.Thread(target=self._write_forever,
+                                            name='access-log-writer',
+                                            daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def _next_batch(self):
+        """Waits for a record, then takes whatever else is queued."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_forever(self):
+        while True:
+            batch = self._next_batch()
+            stop = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            lines = []
+            for record in records:
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            dropped = self.dropped
+            if dropped != self._reported:
+                lines.append(json.dumps({
+                    'time': round(time.time(), 3),
+                    'level': 'WARNING',
+                    'logger': 'access',
+                    'message': 'Dropped access log records',
+                    'dropped': dropped - self._reported,
+                    'dropped_total': dropped,
+                }))
+                self._reported = dropped
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except Exception:
+                    self.handleError(records[0] if records else None)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Waits until everything queued so far has been written."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=self.flush_interval)
+            except queue.Full:
+                pass
+            self._thread.join(self.flush_interval * 4)
+        super().close()
+
+
+class AccessLogMiddleware:
+    """Logs one structured entry per API request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/') \
+                or not logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+        db_time = [0.0]
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db_time[0] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(timed):
+            response = self.get_response(request)
+        latency = time.perf_counter() - started
+
+        match = request.resolver_match
+        # Set on the Django request by DRF once it authenticates.
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated \
+            else None
+        logger.info('%s %s', request.method, request.path, extra={
+            'access': {
+                'method': request.method,
+                'path': request.path,
+                'route': match.view_name if match else None,
+                'user_id': user_id,
+                'status': response.status_code,
+                'latency_ms': round(latency * 1000, 2),
+                'db_ms': round(db_time[0] * 1000, 2),
+            },
+        })
+        return response
@@ -0,0 +1,128 @@
+"""
+Liveness and readiness probes, and the warm-up a worker does before it
+reports ready.
+
+Warm-up loads the reference data caches and the similarity index and
+serializes a page of properties, so the first real requests do not pay
+for lazy imports and cold caches. Database connections belong to the
+thread that opens them and are only kept between requests when
+CONN_MAX_AGE is set, as in the production settings; then `connect`
+opens one on a thread serving requests, and `warm_threads` on each
+thread of a request pool.
+"""
+import json
+import logging
+import threading
+import time
+
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.views import View
+
+from core.models import Property
+from listing import bootstrap
+from listing.serializers import PropertySerializer
+from listing.similar import similarity_index
+from listing.typeahead import prefix_index
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_ROWS = 20
+
+_lock = threading.Lock()
+_warmed = threading.Event()
+
+
+def ping(alias='default'):
+    """Runs the cheapest possible query, returning its latency in ms."""
+    started = time.perf_counter()
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError:
+        # Drops the broken socket so the next probe reconnects.
+        connection.close()
+        raise
+    return (time.perf_counter() - started) * 1000
+
+
+def warm_up():
+    """Primes the worker once; later calls return immediately."""
+    if _warmed.is_set():
+        return
+    with _lock:
+        if _warmed.is_set():
+            return
+        started = time.perf_counter()
+        bootstrap.load_bundle()
+        prefix_index.current()
+        similarity_index.maybe_sync()
+        PropertySerializer(
+            Property.objects.select_related(
+                'property_type', 'location', 'unit',
+            ).order_by('id')[:WARM_UP_ROWS],
+            many=True,
+        ).data
+        _warmed.set()
+        logger.info('Worker warmed up in %.1fms',
+                    (time.perf_counter() - started) * 1000)
+
+
+def connect(alias='default'):
+    """Opens this thread's connection if it is kept between requests,
+    returning whether it is.
+    """
+    connection = connections[alias]
+    if connection.settings_dict['CONN_MAX_AGE'] == 0:
+        # Closed again at the end of the first request.
+        return False
+    connection.ensure_connection()
+    return True
+
+
+def warm_threads(executor, count, alias='default', timeout=10):
+    """Opens a connection on each of the `count` threads of `executor`,
+    returning how many were opened. Each task waits until all have
+    started, so no thread runs two of them.
+    """
+    barrier = threading.Barrier(count)
+
+    def connect_thread():
+        try:
+            return connect(alias)
+        finally:
+            barrier.wait(timeout)
+
+    futures = [executor.submit(connect_thread) for _ in range(count)]
+    return sum(future.result() for future in futures)
+
+
+def json_response(payload, status=200):
+    response = HttpResponse(json.dumps(payload), status=status,
+                            content_type='application/json')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class LivenessView(View):
+    """Answers as long as the process can serve requests at all."""
+
+    def get(self, request, *args, **kwargs):
+        return json_response({'status': 'ok'})
+
+
+class ReadinessView(View):
+    """Answers 200 once the worker is warm and the database responds."""
+
+    def get(self, request, *args, **kwargs):
+        try:
+            warm_up()
+            latency = ping()
+        except Exception as error:
+            # Any failure, the cache included, keeps the worker out of
+            # rotation rather than answering 500.
+            logger.warning('Readiness check failed: %s', error)
+            return json_response({'status': 'unavailable'}, status=503)
+        return json_response({'status': 'ok', 'db_ms': round(latency, 2)})
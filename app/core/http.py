@@ -0,0 +1,36 @@
+"""
+HTTP helpers for serving precomputed payloads.
+"""
+import gzip
+
+from django.http import HttpResponse, HttpResponseNotModified
+
+
+def compress(body):
+    """Gzips a payload reproducibly, so every worker sends equal bytes."""
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def precomputed_response(request, etag, body, gzipped, content_type,
+                         max_age=300):
+    """Serves a precomputed payload with an ETag and gzip encoding.
+
+    Clients holding the current version get an empty 304, whether they
+    send it as If-None-Match or as a `hash` query parameter.
+    """
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    tag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in if_none_match or if_none_match.strip() == '*' \
+            or request.GET.get('hash') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(gzipped if use_gzip else body,
+                                content_type=content_type)
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = tag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = f'public, max-age={max_age}'
+    return response
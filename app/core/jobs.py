@@ -0,0 +1,246 @@
+"""
+Durable background jobs stored in Postgres.
+
+Tasks are plain functions registered with `@task` in an app's `tasks`
+module. `enqueue` inserts a row in the same transaction as the caller's
+writes; workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED, so
+any number of them can poll the table without blocking each other.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+_registry = {}
+_on_start = []
+
+
+def task(name=None, queue='default', priority=0, max_attempts=5):
+    """Registers a function as a task, adding an `enqueue` helper to it.
+
+        @task(queue='mail', max_attempts=3)
+        def send_welcome_email(user_id):
+            ...
+
+        send_welcome_email.enqueue(user_id=user.id)
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = func
+
+        def enqueue_task(run_at=None, **payload):
+            return enqueue(task_name, payload, queue=queue,
+                           priority=priority, run_at=run_at,
+                           max_attempts=max_attempts)
+
+        func.task_name = task_name
+        func.enqueue = enqueue_task
+        return func
+    return register
+
+
+def on_worker_start(func):
+    """Registers a function every worker calls when it starts, e.g. to
+    queue the first run of a periodic task.
+    """
+    _on_start.append(func)
+    return func
+
+
+def enqueue(name, payload=None, queue='default', priority=0, run_at=None,
+            max_attempts=5):
+    """Adds a job to the queue."""
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        queue=queue,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after `attempts` failed runs."""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def claim(queues, limit, worker_id):
+    """Locks up to `limit` due jobs for this worker, highest priority
+    first, skipping rows other workers hold.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                status=Job.QUEUED,
+                queue__in=queues,
+                run_at__lte=now,
+            ).order_by('-priority', 'run_at', 'id')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=Job.RUNNING,
+                locked_at=now,
+                locked_by=worker_id,
+                attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def execute(job):
+    """Runs a claimed job, then deletes it or schedules its retry."""
+    try:
+        func = _registry[job.name]
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %d of %d)', job,
+                       job.attempts, job.max_attempts)
+        if job.attempts < job.max_attempts:
+            retry_at = timezone.now() + timedelta(
+                seconds=backoff(job.attempts)
+            )
+            Job.objects.filter(id=job.id).update(
+                status=Job.QUEUED, run_at=retry_at, locked_at=None,
+                locked_by='', last_error=error,
+            )
+        else:
+            Job.objects.filter(id=job.id).update(
+                status=Job.FAILED, locked_at=None, last_error=error,
+            )
+        return False
+    Job.objects.filter(id=job.id).delete()
+    return True
+
+
+def execute_in_thread(job):
+    """Runs a job on a pool thread, recycling its database connection."""
+    try:
+        return execute(job)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale(lock_timeout):
+    """Releases jobs whose worker stopped without finishing them,
+    returning how many were queued again.
+
+    Claiming a job already counted the abandoned run as an attempt, so a
+    job that keeps taking its worker down fails once it is out of
+    attempts instead of being claimed forever.
+    """
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=lock_timeout),
+    )
+    error = 'Worker stopped without finishing the job.'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_at=None, last_error=error,
+    )
+    if failed:
+        logger.warning('%d abandoned jobs out of attempts', failed)
+    return stale.update(status=Job.QUEUED, locked_at=None, locked_by='',
+                        last_error=error)
+
+
+class Worker:
+    """Claims jobs in batches and runs up to `concurrency` at once.
+
+    Every `lock_timeout` seconds it also queues again the jobs left
+    running by workers that crashed.
+    """
+
+    def __init__(self, queues=('default',), concurrency=1, batch_size=10,
+                 poll_interval=1.0, lock_timeout=600):
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self._requeue_at = 0.0
+        autodiscover_modules('tasks')
+
+    def stop(self, *args):
+        """Finishes the running jobs, then exits, e.g. on SIGTERM."""
+        self.stopping.set()
+
+    def requeue_stale(self):
+        """Requeues abandoned jobs, unless done within `lock_timeout`."""
+        now = time.monotonic()
+        if now >= self._requeue_at:
+            requeue_stale(self.lock_timeout)
+            self._requeue_at = now + self.lock_timeout
+
+    def run(self, once=False):
+        """Processes jobs until stopped, or until idle when `once`."""
+        self.requeue_stale()
+        for func in _on_start:
+            try:
+                func()
+            except Exception:
+                logger.exception('Worker start hook %s failed',
+                                 func.__name__)
+        if self.concurrency <= 1:
+            return self._run_inline(once)
+
+        processed = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self.stopping.is_set():
+                self.requeue_stale()
+                free = self.concurrency - len(running)
+                jobs = claim(self.queues, min(free, self.batch_size),
+                             self.worker_id) if free else []
+                running.update(executor.submit(execute_in_thread, job)
+                               for job in jobs)
+                if once and not running:
+                    break
+                if running and (not jobs or not free):
+                    done, running = wait(running,
+                                         timeout=self.poll_interval,
+                                         return_when=FIRST_COMPLETED)
+                    processed += len(done)
+                elif not jobs:
+                    close_old_connections()
+                    self.stopping.wait(self.poll_interval)
+            done, _ = wait(running)
+            processed += len(done)
+        return processed
+
+    def _run_inline(self, once):
+        processed = 0
+        while not self.stopping.is_set():
+            self.requeue_stale()
+            jobs = claim(self.queues, self.batch_size, self.worker_id)
+            for job in jobs:
+                execute(job)
+            processed += len(jobs)
+            if not jobs:
+                if once:
+                    break
+                close_old_connections()
+                self.stopping.wait(self.poll_interval)
+        return processed
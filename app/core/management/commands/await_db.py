@@ -5,26 +5,52 @@ import time
 
 from psycopg import OperationalError as PsycopgError
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import OperationalError
 
 
+def backoff_delays(initial, maximum):
+    """Doubles the delay after every attempt, up to `maximum`."""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+
 class Command(BaseCommand):
     """Main command definition."""
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait before giving up.')
+        parser.add_argument('--initial-delay', type=float, default=0.1,
+                            help='Seconds before the first retry.')
+        parser.add_argument('--max-delay', type=float, default=5,
+                            help='Longest pause between retries.')
+
+    def handle(self, *args, **options):
         """Handles the execution of the command."""
         self.stdout.write('Waiting for Database to start ...')
-        db_up = False
-        while db_up is False:
+        deadline = time.monotonic() + options['timeout']
+        delays = backoff_delays(options['initial_delay'],
+                                options['max_delay'])
+        while True:
             try:
                 self.check(databases=['default'])
-                db_up = True
+                break
             except (PsycopgError, OperationalError):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database not available after "
+                        f"{options['timeout']:g}s."
+                    )
+                delay = min(next(delays), remaining)
                 self.stdout.write(
-                    'Database not yet available, trying again ...'
+                    f'Database not yet available, retrying in '
+                    f'{delay:.1f}s ...'
                 )
-                time.sleep(1)
+                time.sleep(delay)
         self.stdout.write(
             self.style.SUCCESS('Database is now available !!!')
         )
@@ -0,0 +1,271 @@
+"""
+'bench': command to measure the latency of every API route on seeded data
+"""
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import seeding
+from core.models import Property
+from listing import price_stats
+from listing.cache import property_cache
+
+BENCH_DIR = settings.BASE_DIR / 'benchmarks'
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+PASSWORD = 'bench-password'
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of the samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(timings, query_counts):
+    """Reduces raw per-request samples to the reported statistics."""
+    total = sum(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'throughput_rps': round(len(timings) / total, 1) if total else 0.0,
+        'queries_per_request': round(statistics.mean(query_counts), 2),
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """Lists the routes that are slower or chattier than the baseline."""
+    regressions = []
+    for route, current in results.items():
+        expected = baseline.get(route)
+        if expected is None:
+            continue
+        if current['queries_per_request'] > expected['queries_per_request']:
+            regressions.append(
+                f"{route}: {current['queries_per_request']} queries per "
+                f"request, baseline {expected['queries_per_request']}"
+            )
+        limit = expected['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit:
+            regressions.append(
+                f"{route}: p95 {current['p95_ms']}ms exceeds "
+                f"{limit:.3f}ms (baseline {expected['p95_ms']}ms)"
+            )
+    return regressions
+
+
+def build_routes():
+    """Maps each benchmarked route to the request it should issue."""
+    user = seeding.seed_users(1, password=PASSWORD, prefix='bench')[0]
+    token, _ = Token.objects.get_or_create(user=user)
+    prop = Property.objects.order_by('id').first()
+    country = prop.location.country
+
+    anonymous = APIClient()
+    authenticated = APIClient()
+    authenticated.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get(url, data=None, client=anonymous):
+        return lambda: client.get(url, data)
+
+    return {
+        'schema': get(reverse('schema')),
+        'docs': get(reverse('docs')),
+        'listing:property_types': get(reverse('listing:property_types')),
+        'listing:countries': get(reverse('listing:countries')),
+        'listing:locations': get(reverse('listing:locations')),
+        'listing:locations?country': get(reverse('listing:locations'),
+                                         {'country': country.name}),
+        'listing:locations?prefix': get(reverse('listing:locations'),
+                                        {'prefix': prop.location.name[:3]}),
+        'listing:amenities': get(reverse('listing:amenities')),
+        'listing:bootstrap': get(reverse('listing:bootstrap')),
+        'listing:changes': get(reverse('listing:changes')),
+        'listing:price_stats': get(reverse('listing:price_stats'),
+                                   {'country': country.name}),
+        'listing:property-list': get(reverse('listing:property-list')),
+        'listing:property-list?page': get(reverse('listing:property-list'),
+                                          {'page': 2}),
+        'listing:property-detail': get(
+            reverse('listing:property-detail', args=[prop.id])
+        ),
+        'listing:property-similar': get(
+            reverse('listing:property-similar', args=[prop.id])
+        ),
+        'listing:property-most-viewed': get(
+            reverse('listing:property-most-viewed')
+        ),
+        'user:login': lambda: anonymous.post(
+            reverse('user:login'),
+            {'email': user.email, 'password': PASSWORD}
+        ),
+        'user:me': get(reverse('user:me'), client=authenticated),
+    }
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Benchmarks every API route against a seeded dataset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='1k',
+                            help='1k, 100k, 1m or a number of properties.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--routes', nargs='+',
+                            help='Only benchmark these routes.')
+        parser.add_argument('--output',
+                            help='Where to write the JSON results.')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 slowdown over the baseline.')
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse the seeded benchmark database.')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Use the current database as is.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        try:
+            size = seeding.parse_size(options['size'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options['in_place']:
+            results = self.run(size, options)
+        else:
+            old_name = connection.creation.create_test_db(
+                verbosity=0,
+                autoclobber=True,
+                keepdb=options['keepdb']
+            )
+            try:
+                results = self.run(size, options)
+            finally:
+                connection.creation.destroy_test_db(
+                    old_name,
+                    verbosity=0,
+                    keepdb=options['keepdb']
+                )
+
+        self.report(results, options)
+
+    def seed(self, size, seed):
+        """Seeds `size` properties unless they are already there."""
+        if Property.objects.count() == size:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'TRUNCATE {Property._meta.db_table} '
+                'RESTART IDENTITY CASCADE'
+            )
+        self.stdout.write(f'Seeding {size} properties ...')
+        started = time.perf_counter()
+        reference = seeding.seed_reference_data()
+        owners = seeding.seed_users(max(1, size // 100))
+        seeding.seed_properties(size, owners, reference, seed=seed)
+        price_stats.refresh(concurrently=False)
+        property_cache.invalidate_all()
+        self.stdout.write(
+            f'Seeded in {time.perf_counter() - started:.1f}s'
+        )
+
+    def run(self, size, options):
+        """Seeds the data and times every selected route."""
+        self.seed(size, options['seed'])
+        routes = build_routes()
+        selected = options['routes'] or list(routes)
+        unknown = set(selected) - set(routes)
+        if unknown:
+            raise CommandError(f"Unknown routes: {', '.join(unknown)}")
+
+        results = {}
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        unthrottled = {**settings.REST_FRAMEWORK,
+                       'DEFAULT_THROTTLE_RATES': {}}
+        with override_settings(ALLOWED_HOSTS=hosts,
+                               REST_FRAMEWORK=unthrottled):
+            for name in selected:
+                results[name] = self.measure(name, routes[name], options)
+        return {
+            'size': options['size'],
+            'properties': size,
+            'iterations': options['iterations'],
+            'routes': results,
+        }
+
+    def measure(self, name, request, options):
+        """Times `iterations` calls to a route after a warm-up."""
+        for _ in range(options['warmup']):
+            request()
+        timings, query_counts = [], []
+        for _ in range(options['iterations']):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request()
+                timings.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{name} returned {response.status_code}'
+                )
+            query_counts.append(len(queries))
+        return summarize(timings, query_counts)
+
+    def report(self, results, options):
+        """Prints, stores and checks the results against the baseline."""
+        for name, stats in results['routes'].items():
+            self.stdout.write(
+                f"{name:<28} p50 {stats['p50_ms']:>9.3f}ms  "
+                f"p95 {stats['p95_ms']:>9.3f}ms  "
+                f"p99 {stats['p99_ms']:>9.3f}ms  "
+                f"{stats['throughput_rps']:>8.1f} req/s  "
+                f"{stats['queries_per_request']:>6.2f} queries"
+            )
+
+        output = options['output'] or \
+            BENCH_DIR / f"results-{options['size']}.json"
+        with open(output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+        baseline_path = options['baseline']
+        try:
+            with open(baseline_path) as fp:
+                baseline = json.load(fp)
+        except FileNotFoundError:
+            baseline = {}
+
+        if options['update_baseline']:
+            baseline[options['size']] = results
+            with open(baseline_path, 'w') as fp:
+                json.dump(baseline, fp, indent=2)
+            self.stdout.write(self.style.SUCCESS('Baseline updated.'))
+            return
+
+        expected = baseline.get(options['size'])
+        if expected is None:
+            self.stdout.write(
+                self.style.WARNING(f"No baseline for {options['size']}")
+            )
+            return
+        regressions = find_regressions(results['routes'],
+                                       expected['routes'],
+                                       options['tolerance'])
+        if regressions:
+            raise CommandError(
+                'Performance regressions:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
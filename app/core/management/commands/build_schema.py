@@ -0,0 +1,29 @@
+"""
+'build_schema': command to precompute the OpenAPI schema for this build
+"""
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Generates and stores the OpenAPI schema for the code version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate even if already stored.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        version = schema.build_version()
+        path = schema.schema_path(version)
+        if not path.exists() or options['force']:
+            path = schema.write_schema(schema.generate_schema(), version)
+            self.stdout.write(self.style.SUCCESS(
+                f'Schema written to {path}'
+            ))
+        else:
+            self.stdout.write(f'Schema is up to date: {path}')
+        # Read back by the server, which does not hash the sources.
+        schema.write_version(version)
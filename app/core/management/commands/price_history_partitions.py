@@ -0,0 +1,34 @@
+"""
+'price_history_partitions': command to create and drop the monthly
+partitions of the property price history
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listing import history
+from listing.tasks import schedule_price_history
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = ('Creates the price history partitions of the coming months '
+            'and drops those past the retention period.')
+
+    def add_arguments(self, parser):
+        config = settings.PRICE_HISTORY
+        parser.add_argument('--months-ahead', type=int,
+                            default=config['MONTHS_AHEAD'])
+        parser.add_argument('--retention-months', type=int,
+                            default=config['RETENTION_MONTHS'])
+        parser.add_argument('--schedule', action='store_true',
+                            help='Also queue daily maintenance for the job '
+                                 'worker.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        for name in history.create_partitions(options['months_ahead']):
+            self.stdout.write(f'Created {name}')
+        for name in history.drop_partitions(options['retention_months']):
+            self.stdout.write(f'Dropped {name}')
+        if options['schedule'] and schedule_price_history():
+            self.stdout.write('Periodic maintenance scheduled')
@@ -0,0 +1,185 @@
+"""
+'profile_server': command to compare worker memory and throughput of
+the development server and `serve`
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SETUPS = {
+    'runserver': ['runserver'],
+    'serve-no-preload': ['serve', '--no-preload'],
+    'serve': ['serve'],
+    'serve-threads': ['serve', '--worker-class', 'threads'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    """The pids of every descendant of the process."""
+    found = []
+    for task in Path(f'/proc/{pid}/task').iterdir():
+        for child in (task / 'children').read_text().split():
+            found.append(int(child))
+            found.extend(children(int(child)))
+    return found
+
+
+def parse_smaps_rollup(text):
+    """Reads PSS and USS, in KiB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(':')
+        if value.strip().endswith('kB'):
+            fields[name] = int(value.split()[0])
+    return {
+        'pss_kb': fields.get('Pss', 0),
+        'uss_kb': (fields.get('Private_Clean', 0)
+                   + fields.get('Private_Dirty', 0)),
+    }
+
+
+def memory_of(pid):
+    return parse_smaps_rollup(
+        Path(f'/proc/{pid}/smaps_rollup').read_text()
+    )
+
+
+def wait_until_up(url, process, timeout):
+    """Polls the URL until the server answers, whatever the status."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'Server exited with {process.returncode}.')
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Server did not answer within {timeout}s.')
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+    except urllib.error.HTTPError:
+        pass
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = ('Starts the development server and `serve` in turn, reporting '
+            'memory per worker and requests per second for each.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setups', nargs='+', default=list(SETUPS),
+                            choices=list(SETUPS))
+        parser.add_argument('--path', default='/api/listing/properties/',
+                            help='Path the load is sent to.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Workers for the serve setups.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--startup-timeout', type=int, default=60)
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON.')
+        parser.add_argument('--output',
+                            help='Also write the JSON report to this file.')
+
+    def measure(self, setup, options):
+        """Runs one setup under load and measures its processes."""
+        port = free_port()
+        command = [sys.executable, 'manage.py', *SETUPS[setup]]
+        if setup == 'runserver':
+            command.append(f'127.0.0.1:{port}')
+        else:
+            # Measures the server, whichever cache backend is set up.
+            command += ['--bind', f'127.0.0.1:{port}',
+                        '--workers', str(options['workers']),
+                        '--allow-local-cache']
+        url = f"http://127.0.0.1:{port}{options['path']}"
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR,
+                                   env=os.environ.copy(),
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(url, process, options['startup_timeout'])
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(fetch, [url] * options['requests']))
+            elapsed = time.perf_counter() - started
+            # Measured after the load, once workers have touched the
+            # pages a request needs.
+            workers = [memory_of(pid) for pid in children(process.pid)]
+            master = memory_of(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+
+        # runserver's autoreloader serves from its child process.
+        serving = workers or [master]
+        return {
+            'processes': 1 + len(workers),
+            'pss_per_worker_mb': round(
+                sum(w['pss_kb'] for w in serving) / len(serving) / 1024, 1),
+            'uss_per_worker_mb': round(
+                sum(w['uss_kb'] for w in serving) / len(serving) / 1024, 1),
+            'total_pss_mb': round(
+                (master['pss_kb'] + sum(w['pss_kb'] for w in workers))
+                / 1024, 1),
+            'throughput_rps': round(options['requests'] / elapsed, 1),
+        }
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        if not Path('/proc/self/smaps_rollup').exists():
+            raise CommandError('Memory is read from /proc, which needs '
+                               'Linux 4.14 or newer.')
+        report = {
+            setup: self.measure(setup, options)
+            for setup in options['setups']
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+                'path': options['path'],
+                'workers': options['workers'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'setups': report,
+            }, indent=2) + '\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'setup':<18} {'procs':>5} {'PSS/worker':>11} "
+            f"{'USS/worker':>11} {'total PSS':>10} {'req/s':>8}"
+        )
+        for setup, row in report.items():
+            self.stdout.write(
+                f"{setup:<18} {row['processes']:>5} "
+                f"{row['pss_per_worker_mb']:>9.1f}MB "
+                f"{row['uss_per_worker_mb']:>9.1f}MB "
+                f"{row['total_pss_mb']:>8.1f}MB "
+                f"{row['throughput_rps']:>8.1f}"
+            )
@@ -0,0 +1,141 @@
+"""
+'profile_startup': command to measure worker cold starts and import times
+"""
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+GROUPS = (
+    'app.settings',
+    'django.contrib.admin',
+    'django',
+    'rest_framework',
+    'drf_spectacular',
+    'psycopg',
+    'core',
+    'user',
+    'listing',
+)
+
+# Loads everything a worker needs before it can serve its first request
+# and prints how long that took, as seen from inside the process.
+WORKER_SCRIPT = '''
+import time
+started = time.perf_counter()
+from app.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(output):
+    """Parses `python -X importtime` output into (module, self, cumulative)
+    tuples, in microseconds.
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, _, module = match.groups()
+            modules.append((module, int(own), int(cumulative)))
+    return modules
+
+
+def group_of(module, groups=GROUPS):
+    """The longest group prefix `module` belongs to, or 'other'."""
+    matches = [group for group in groups
+               if module == group or module.startswith(group + '.')]
+    return max(matches, key=len) if matches else 'other'
+
+
+def group_times(modules, groups=GROUPS):
+    """Sums the self import time of every module per group."""
+    totals = dict.fromkeys([*groups, 'other'], 0)
+    for module, own, _ in modules:
+        totals[group_of(module, groups)] += own
+    return totals
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Reports worker cold-start latency and per-module import times.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module',
+                            default=os.environ.get('DJANGO_SETTINGS_MODULE'),
+                            help='Settings profile the worker starts with.')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Cold starts to take the median of.')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Slowest modules to list.')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON.')
+
+    def start_worker(self, settings_module, importtime=False):
+        """Starts a fresh interpreter that loads the app like a worker."""
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        result = subprocess.run(command + ['-c', WORKER_SCRIPT],
+                                capture_output=True, text=True, env=env,
+                                cwd=settings.BASE_DIR)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return float(result.stdout.strip()), result.stderr
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        settings_module = options['settings_module']
+        cold_starts = [
+            self.start_worker(settings_module)[0]
+            for _ in range(options['runs'])
+        ]
+        _, trace = self.start_worker(settings_module, importtime=True)
+        modules = parse_importtime(trace)
+        slowest = sorted(modules, key=lambda m: m[2], reverse=True)
+
+        report = {
+            'settings': settings_module,
+            'cold_start_ms': {
+                'median': round(statistics.median(cold_starts) * 1000, 1),
+                'max': round(max(cold_starts) * 1000, 1),
+            },
+            'modules_imported': len(modules),
+            'groups_ms': {
+                group: round(us / 1000, 1)
+                for group, us in group_times(modules).items()
+            },
+            'slowest_ms': [
+                {'module': module, 'cumulative': round(cumulative / 1000, 1)}
+                for module, _, cumulative in slowest[:options['top']]
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        cold = report['cold_start_ms']
+        self.stdout.write(
+            f"{settings_module}: cold start {cold['median']}ms median, "
+            f"{cold['max']}ms max, {len(modules)} modules imported"
+        )
+        self.stdout.write('\nSelf import time by group:')
+        for group, ms in sorted(report['groups_ms'].items(),
+                                key=lambda item: item[1], reverse=True):
+            self.stdout.write(f'  {group:<24} {ms:>8.1f}ms')
+        self.stdout.write('\nSlowest imports (cumulative):')
+        for entry in report['slowest_ms']:
+            self.stdout.write(
+                f"  {entry['module']:<48} {entry['cumulative']:>8.1f}ms"
+            )
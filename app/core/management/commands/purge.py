@@ -0,0 +1,79 @@
+"""
+'purge': command to delete rows and their dependents in small batches
+"""
+import signal
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Country, Location, PropertyType, Unit
+from core.purge import Purger, PurgeError
+from listing import bootstrap
+from listing.cache import property_cache
+
+TARGETS = {
+    'country': lambda: Country,
+    'location': lambda: Location,
+    'user': get_user_model,
+    'property_type': lambda: PropertyType,
+    'unit': lambda: Unit,
+}
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = ('Deletes countries, locations or users with everything that '
+            'depends on them, in short batches. Stop it with Ctrl-C and '
+            'run it again to resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=sorted(TARGETS))
+        parser.add_argument('ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Most rows deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches.')
+        parser.add_argument('--lock-timeout', type=float, default=2.0,
+                            help='Seconds a batch may wait for row locks '
+                                 'before retrying.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        reported = {'at': 0.0}
+
+        def progress(table, deleted):
+            now = time.monotonic()
+            if now - reported['at'] >= 1:
+                reported['at'] = now
+                self.stdout.write(f'{table}: {deleted} rows deleted')
+
+        purger = Purger(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            lock_timeout=options['lock_timeout'],
+            progress=progress,
+        )
+        handlers = {sig: signal.signal(sig, purger.stop)
+                    for sig in (signal.SIGTERM, signal.SIGINT)}
+
+        model = TARGETS[options['target']]()
+        try:
+            finished = purger.purge(model, options['ids'])
+        except PurgeError as exc:
+            raise CommandError(str(exc))
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+            if purger.deleted:
+                bootstrap.invalidate()
+                property_cache.invalidate_all()
+
+        for table, deleted in purger.deleted.items():
+            self.stdout.write(f'{table}: {deleted} rows deleted')
+        if finished:
+            self.stdout.write(self.style.SUCCESS('Purge complete'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Purge stopped; run the same command again to resume'
+            ))
@@ -0,0 +1,26 @@
+"""
+'refresh_price_stats': command to recompute the market price statistics
+"""
+from django.core.management.base import BaseCommand
+
+from listing import price_stats
+from listing.tasks import schedule_price_stats
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Recomputes the price percentiles served by the stats API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocking', action='store_true',
+                            help='Lock readers out for a faster refresh.')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Also queue periodic refreshes for the '
+                                 'job worker.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        price_stats.refresh(concurrently=not options['blocking'])
+        self.stdout.write(self.style.SUCCESS('Price statistics refreshed'))
+        if options['schedule'] and schedule_price_stats():
+            self.stdout.write('Periodic refresh scheduled')
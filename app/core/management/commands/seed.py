@@ -0,0 +1,81 @@
+"""
+'seed': command to fill the database with production-shaped data
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import seeding
+from core.models import (
+    Country,
+    Location,
+    Property,
+)
+from listing import bootstrap, price_stats
+from listing.cache import property_cache
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Generates synthetic users, reference data and properties.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', default='100k',
+                            help='1k, 100k, 1m or a number of properties.')
+        parser.add_argument('--users', type=int,
+                            help='Defaults to one per 100 properties.')
+        parser.add_argument('--countries', type=int,
+                            default=len(seeding.COUNTRIES))
+        parser.add_argument('--locations-per-country', type=int, default=20)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent for owners and locations; '
+                                 '0 spreads properties evenly.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes used to insert properties.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=seeding.CHUNK_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        try:
+            count = seeding.parse_size(options['properties'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        users = options['users'] or max(1, count // 100)
+
+        started = time.perf_counter()
+        reference = seeding.seed_reference_data(
+            country_count=options['countries'],
+            locations_per_country=options['locations_per_country']
+        )
+        owners = seeding.seed_users(users)
+        self.stdout.write(
+            f"{len(owners)} users, {len(reference['countries'])} countries, "
+            f"{len(reference['locations'])} locations ready in "
+            f'{time.perf_counter() - started:.1f}s'
+        )
+
+        started = time.perf_counter()
+        seeding.seed_properties(
+            count,
+            owners,
+            reference,
+            seed=options['seed'],
+            skew=options['skew'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size']
+        )
+        with connection.cursor() as cursor:
+            for model in (Country, Location, Property):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        price_stats.refresh(concurrently=False)
+        property_cache.invalidate_all()
+        bootstrap.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {count} properties in {elapsed:.1f}s '
+            f'({count / elapsed:,.0f} rows/s)'
+        ))
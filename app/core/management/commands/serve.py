@@ -0,0 +1,81 @@
+"""
+'serve': command to run the production HTTP server
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import server
+
+
+def default_workers():
+    return (os.cpu_count() or 1) * 2 + 1
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = ('Runs the app under gunicorn, loaded once before the workers '
+            'fork. Send HUP to restart the workers gracefully and TERM to '
+            'stop after the requests in flight.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='0.0.0.0:8000')
+        parser.add_argument('--worker-class', default='sync',
+                            choices=sorted(server.WORKER_CLASSES),
+                            help='sync: one request per process; threads: '
+                                 'a thread pool per process.')
+        parser.add_argument('--workers', type=int,
+                            default=int(os.environ.get('WEB_CONCURRENCY',
+                                                       default_workers())))
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Threads per worker for --worker-class '
+                                 'threads.')
+        parser.add_argument('--timeout', type=int, default=30,
+                            help='Seconds before a silent worker is '
+                                 'restarted.')
+        parser.add_argument('--graceful-timeout', type=int, default=30,
+                            help='Seconds workers get to finish their '
+                                 'requests on restart or shutdown.')
+        parser.add_argument('--max-requests', type=int, default=0,
+                            help='Requests before a worker is replaced, '
+                                 '0 to keep workers for good.')
+        parser.add_argument('--max-requests-jitter', type=int, default=0)
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Load the app in each worker instead.')
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help='Run several workers on a per-process '
+                                 'cache, e.g. for benchmarks. Cached '
+                                 'responses then ignore writes made '
+                                 'through other workers.')
+
+    def gunicorn_options(self, options):
+        """The gunicorn settings for the given command options."""
+        config = {
+            'bind': [options['bind']],
+            'worker_class': server.WORKER_CLASSES[options['worker_class']],
+            'workers': options['workers'],
+            'timeout': options['timeout'],
+            'graceful_timeout': options['graceful_timeout'],
+            'max_requests': options['max_requests'],
+            'max_requests_jitter': options['max_requests_jitter'],
+        }
+        if options['worker_class'] == 'threads':
+            config['threads'] = options['threads']
+        return config
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        local = server.local_caches()
+        if options['workers'] > 1 and local \
+                and not options['allow_local_cache']:
+            raise CommandError(
+                f"Caches {', '.join(local)} are per process, so "
+                f"{options['workers']} workers would serve stale data. "
+                'Set REDIS_URL, run --workers 1 or pass '
+                '--allow-local-cache.'
+            )
+        server.Server(
+            self.gunicorn_options(options),
+            preload=not options['no_preload'],
+        ).run()
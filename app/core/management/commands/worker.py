@@ -0,0 +1,43 @@
+"""
+'worker': command to run queued background jobs
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import Worker
+
+
+class Command(BaseCommand):
+    """Main command definition."""
+    help = 'Runs background jobs from the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', nargs='+', default=['default'])
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Jobs run at the same time.')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Most jobs claimed per query.')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--lock-timeout', type=int, default=600,
+                            help='Seconds before a running job is assumed '
+                                 'abandoned and queued again.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        """Handles the execution of the command."""
+        worker = Worker(
+            queues=options['queues'],
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            lock_timeout=options['lock_timeout'],
+        )
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(
+            f"Worker {worker.worker_id} on {', '.join(worker.queues)}"
+        )
+        processed = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-19 12:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_property_updated_at_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='property',
+            name='unit',
+            field=models.ForeignKey(help_text='days, weeks, months when property is unavailable.', on_delete=django.db.models.deletion.CASCADE, to='core.unit'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('queue', models.CharField(default='default', max_length=64)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('priority', models.SmallIntegerField(default=0, help_text='jobs with a higher priority are claimed first.')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('FAILED', 'Failed')], default='QUEUED', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'QUEUED')), fields=['queue', '-priority', 'run_at', 'id'], name='core_job_claim_idx'), models.Index(condition=models.Q(('status', 'RUNNING')), fields=['locked_at'], name='core_job_running_idx')],
+            },
+        ),
+    ]
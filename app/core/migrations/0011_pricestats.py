@@ -0,0 +1,84 @@
+# Generated by Django 4.2.8 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+# One row per market: a unit combined with any of country, location and
+# property type. Percentiles are kept to cents, like the listing prices.
+CREATE_VIEW = """
+CREATE MATERIALIZED VIEW core_pricestats AS
+SELECT
+    concat_ws('|', u.name, coalesce(c.name, '*'),
+              coalesce(l.id::text, '*'), coalesce(t.name, '*')) AS id,
+    c.name AS country,
+    l.id AS location_id,
+    l.name AS location,
+    t.name AS property_type,
+    u.name AS unit,
+    count(*) AS listings,
+    round((percentile_cont(0.1) WITHIN GROUP (
+        ORDER BY p.price_per_unit))::numeric, 2) AS p10,
+    round((percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY p.price_per_unit))::numeric, 2) AS median,
+    round((percentile_cont(0.9) WITHIN GROUP (
+        ORDER BY p.price_per_unit))::numeric, 2) AS p90,
+    now() AS refreshed_at
+FROM core_property p
+JOIN core_location l ON l.id = p.location_id
+JOIN core_country c ON c.id = l.country_id
+JOIN core_propertytype t ON t.id = p.property_type_id
+JOIN core_unit u ON u.id = p.unit_id
+WHERE p.deleted_at IS NULL
+GROUP BY GROUPING SETS (
+    (u.name, c.name, l.id, l.name, t.name),
+    (u.name, c.name, l.id, l.name),
+    (u.name, c.name, t.name),
+    (u.name, c.name),
+    (u.name, t.name),
+    (u.name)
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceStats',
+            fields=[
+                ('id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('country', models.CharField(null=True)),
+                ('location_id', models.IntegerField(null=True)),
+                ('location', models.CharField(max_length=255, null=True)),
+                ('property_type', models.CharField(null=True)),
+                ('unit', models.CharField(max_length=20)),
+                ('listings', models.IntegerField()),
+                ('p10', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('median', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('p90', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'core_pricestats',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            CREATE_VIEW,
+            'DROP MATERIALIZED VIEW core_pricestats',
+        ),
+        # REFRESH ... CONCURRENTLY needs a unique index over every row.
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_pricestats_id_idx '
+            'ON core_pricestats (id)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_pricestats_scope_idx '
+            'ON core_pricestats (country, location, property_type)',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.8 on 2026-10-19 12:42
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+# Accounts whose email only differs in case from an older account's.
+FIND_DUPLICATES = """
+CREATE TEMPORARY TABLE core_user_merge ON COMMIT DROP AS
+SELECT id, keep_id FROM (
+    SELECT id, min(id) OVER (PARTITION BY lower(email)) AS keep_id
+    FROM core_user
+) users
+WHERE id <> keep_id
+"""
+
+
+def merge_duplicate_users(apps, schema_editor):
+    """Folds accounts differing only in email case into the oldest one.
+
+    Listings move to the kept account in one statement; the duplicates'
+    tokens, permissions and admin log entries are deleted with them.
+    """
+    User = apps.get_model('core', 'User')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_DUPLICATES)
+        cursor.execute('SELECT id FROM core_user_merge')
+        duplicates = [row[0] for row in cursor.fetchall()]
+        if not duplicates:
+            return
+        cursor.execute(
+            'UPDATE core_property SET owner_id = merge.keep_id '
+            'FROM core_user_merge merge '
+            'WHERE core_property.owner_id = merge.id'
+        )
+        cursor.execute("SELECT to_regclass('django_admin_log')")
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(
+                'DELETE FROM django_admin_log '
+                'WHERE user_id IN (SELECT id FROM core_user_merge)'
+            )
+    User.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0003_tokenproxy'),
+        ('core', '0012_location_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_users,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='core_user_email_ci_unique', violation_error_message='user with this email already exists.'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.8 on 2026-10-19 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_user_property_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyCounter',
+            fields=[
+                ('property', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='core.property')),
+                ('views', models.BigIntegerField(default=0)),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-views', 'property'], name='core_counter_views_idx')],
+            },
+        ),
+    ]
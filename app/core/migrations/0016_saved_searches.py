@@ -0,0 +1,85 @@
+# Generated by Django 4.2.8 on 2026-10-19 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_propertycounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('min_price', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        # Listings that predate saved searches have nothing to match.
+        migrations.AddField(
+            model_name='property',
+            name='search_matched',
+            field=models.BooleanField(default=True, help_text='set once the listing is matched to saved searches.'),
+        ),
+        migrations.AlterField(
+            model_name='property',
+            name='search_matched',
+            field=models.BooleanField(default=False, help_text='set once the listing is matched to saved searches.'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('search_matched', False)), fields=['id'], name='core_property_unmatched_idx'),
+        ),
+        migrations.AddField(
+            model_name='searchmatch',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.property'),
+        ),
+        migrations.AddField(
+            model_name='searchmatch',
+            name='search',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='core.savedsearch'),
+        ),
+        migrations.AddField(
+            model_name='savedsearch',
+            name='country',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.country'),
+        ),
+        migrations.AddField(
+            model_name='savedsearch',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='savedsearch',
+            name='property_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.propertytype'),
+        ),
+        migrations.AddIndex(
+            model_name='searchmatch',
+            index=models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['created_on'], name='core_match_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchmatch',
+            constraint=models.UniqueConstraint(fields=('search', 'property'), name='core_searchmatch_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['country', 'property_type', 'min_price'], include=('max_price', 'owner'), name='core_search_criteria_idx'),
+        ),
+    ]
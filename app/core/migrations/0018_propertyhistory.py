@@ -0,0 +1,118 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Partitioned by month so expired history is dropped a partition at a
+# time instead of deleted row by row. Rows for months without their own
+# partition land in the default one; listing.history creates partitions
+# ahead of time so it stays empty.
+CREATE_TABLE = """
+CREATE TABLE core_propertyhistory (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    property_id bigint NOT NULL,
+    location_id bigint NOT NULL,
+    price_per_unit numeric(5, 2) NOT NULL,
+    available boolean NOT NULL,
+    changed_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+CREATE TABLE core_propertyhistory_default
+    PARTITION OF core_propertyhistory DEFAULT;
+
+CREATE INDEX core_propertyhistory_property_idx
+    ON core_propertyhistory (property_id, changed_at);
+CREATE INDEX core_propertyhistory_location_idx
+    ON core_propertyhistory (location_id, changed_at);
+
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR i IN 0..3 LOOP
+        month := date_trunc('month', now()) + i * interval '1 month';
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF core_propertyhistory '
+            'FOR VALUES FROM (%L) TO (%L)',
+            'core_propertyhistory_' || to_char(month, '"y"YYYY"m"MM'),
+            month, month + interval '1 month'
+        );
+    END LOOP;
+END
+$$;
+"""
+
+# Statement-level triggers see every row a statement wrote through its
+# transition tables, so a statement updating any number of properties
+# adds their history with a single INSERT, in the same round trip.
+CREATE_TRIGGERS = """
+CREATE FUNCTION core_propertyhistory_capture() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.price_per_unit, n.available, now()
+        FROM new_rows n;
+    ELSE
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.price_per_unit, n.available, now()
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.price_per_unit IS DISTINCT FROM o.price_per_unit
+           OR n.available IS DISTINCT FROM o.available;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_property_history_insert
+    AFTER INSERT ON core_property
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_propertyhistory_capture();
+
+CREATE TRIGGER core_property_history_update
+    AFTER UPDATE ON core_property
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_propertyhistory_capture();
+
+INSERT INTO core_propertyhistory
+    (property_id, location_id, price_per_unit, available, changed_at)
+SELECT id, location_id, price_per_unit, available, now()
+FROM core_property;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER core_property_history_update ON core_property;
+DROP TRIGGER core_property_history_insert ON core_property;
+DROP FUNCTION core_propertyhistory_capture();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_photos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('price_per_unit', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('available', models.BooleanField()),
+                ('changed_at', models.DateTimeField()),
+                ('location', models.ForeignKey(db_constraint=False, help_text='location of the property when it changed.', on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.location')),
+                ('property', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='history', to='core.property')),
+            ],
+            options={
+                'db_table': 'core_propertyhistory',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_TABLE, 'DROP TABLE core_propertyhistory'),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 4.2.8 on 2026-10-19 16:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Statement-level triggers record every property a statement changed,
+# including bulk updates, raw deletes and renames of the property type,
+# location or unit a listing shows, with one INSERT per statement.
+# txid_current() is the writing transaction: the feed only serves
+# transactions older than any still running, which cannot add rows
+# before a position it has already served.
+CREATE_TRIGGERS = """
+CREATE FUNCTION core_propertychange_capture() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'core_property' AND TG_OP = 'INSERT' THEN
+        INSERT INTO core_propertychange (property_id, txid, changed_at)
+        SELECT n.id, txid_current(), now() FROM new_rows n ORDER BY n.id;
+    ELSIF TG_TABLE_NAME = 'core_property' AND TG_OP = 'DELETE' THEN
+        INSERT INTO core_propertychange (property_id, txid, changed_at)
+        SELECT o.id, txid_current(), now() FROM old_rows o ORDER BY o.id;
+    ELSIF TG_TABLE_NAME = 'core_property' THEN
+        -- Matching saved searches is bookkeeping, not a change.
+        INSERT INTO core_propertychange (property_id, txid, changed_at)
+        SELECT n.id, txid_current(), now()
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE (n.name, n.price_per_unit, n.available, n.description,
+               n.deleted_at, n.version, n.owner_id, n.location_id,
+               n.property_type_id, n.unit_id)
+              IS DISTINCT FROM
+              (o.name, o.price_per_unit, o.available, o.description,
+               o.deleted_at, o.version, o.owner_id, o.location_id,
+               o.property_type_id, o.unit_id)
+        ORDER BY n.id;
+    ELSE
+        EXECUTE format(
+            'INSERT INTO core_propertychange '
+            '(property_id, txid, changed_at) '
+            'SELECT p.id, txid_current(), now() FROM core_property p '
+            'WHERE p.%I IN (SELECT n.id FROM new_rows n '
+            'JOIN old_rows o ON o.id = n.id WHERE n.name <> o.name) '
+            'ORDER BY p.id',
+            TG_ARGV[0]
+        );
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_property_change_insert
+    AFTER INSERT ON core_property
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_propertychange_capture();
+
+CREATE TRIGGER core_property_change_update
+    AFTER UPDATE ON core_property
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_propertychange_capture();
+
+CREATE TRIGGER core_property_change_delete
+    AFTER DELETE ON core_property
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_propertychange_capture();
+
+CREATE TRIGGER core_propertytype_change_update
+    AFTER UPDATE ON core_propertytype
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION core_propertychange_capture('property_type_id');
+
+CREATE TRIGGER core_location_change_update
+    AFTER UPDATE ON core_location
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION core_propertychange_capture('location_id');
+
+CREATE TRIGGER core_unit_change_update
+    AFTER UPDATE ON core_unit
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION core_propertychange_capture('unit_id');
+
+INSERT INTO core_propertychange (property_id, txid, changed_at)
+SELECT id, txid_current(), updated_at
+FROM core_property
+ORDER BY updated_at, id;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER core_unit_change_update ON core_unit;
+DROP TRIGGER core_location_change_update ON core_location;
+DROP TRIGGER core_propertytype_change_update ON core_propertytype;
+DROP TRIGGER core_property_change_delete ON core_property;
+DROP TRIGGER core_property_change_update ON core_property;
+DROP TRIGGER core_property_change_insert ON core_property;
+DROP FUNCTION core_propertychange_capture();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_propertyhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField()),
+                ('property', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['txid', 'id'], name='core_propertychange_feed_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,82 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The unit is kept on each row so history outlives purged properties;
+# rows of properties already purged have none.
+ADD_UNIT = """
+ALTER TABLE core_propertyhistory ADD COLUMN unit_id bigint;
+
+UPDATE core_propertyhistory h
+SET unit_id = p.unit_id
+FROM core_property p
+WHERE p.id = h.property_id;
+
+CREATE OR REPLACE FUNCTION core_propertyhistory_capture() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, unit_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.unit_id, n.price_per_unit,
+               n.available, now()
+        FROM new_rows n;
+    ELSE
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, unit_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.unit_id, n.price_per_unit,
+               n.available, now()
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.price_per_unit IS DISTINCT FROM o.price_per_unit
+           OR n.available IS DISTINCT FROM o.available
+           OR n.unit_id IS DISTINCT FROM o.unit_id;
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+DROP_UNIT = """
+CREATE OR REPLACE FUNCTION core_propertyhistory_capture() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.price_per_unit, n.available, now()
+        FROM new_rows n;
+    ELSE
+        INSERT INTO core_propertyhistory
+            (property_id, location_id, price_per_unit, available,
+             changed_at)
+        SELECT n.id, n.location_id, n.price_per_unit, n.available, now()
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.price_per_unit IS DISTINCT FROM o.price_per_unit
+           OR n.available IS DISTINCT FROM o.available;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+ALTER TABLE core_propertyhistory DROP COLUMN unit_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_propertychange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyhistory',
+            name='unit',
+            field=models.ForeignKey(db_constraint=False, help_text='unit the price was asked per when it changed.', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.unit'),
+        ),
+        migrations.RunSQL(ADD_UNIT, DROP_UNIT),
+    ]
@@ -8,9 +8,63 @@ from django.contrib.auth.models import (
 )
 from django.conf import settings
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+class VersionConflict(Exception):
+    """Raised when saving a row changed since the instance was read."""
+
+
+class VersionedModel(models.Model):
+    """Model using optimistic concurrency control.
+
+    Every UPDATE bumps `version` and only applies while the row still has
+    the version the instance holds, so a save never silently overwrites
+    another writer's changes. Saves touching only `unversioned_fields`
+    are not checked.
+    """
+    version = models.PositiveIntegerField(default=1)
+
+    unversioned_fields = frozenset()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if not update_fields <= self.unversioned_fields:
+                update_fields.add('version')
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        if not any(field.attname == 'version' for field, _, _ in values):
+            return super()._do_update(base_qs, using, pk_val, values,
+                                      update_fields, forced_update)
+        expected = self.version
+        values = [
+            (field, model, expected + 1 if field.attname == 'version'
+             else value)
+            for field, model, value in values
+        ]
+        updated = super()._do_update(base_qs.filter(version=expected),
+                                     using, pk_val, values, update_fields,
+                                     forced_update)
+        if updated:
+            self.version = expected + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(
+                f'{self._meta.object_name} {pk_val} is no longer at '
+                f'version {expected}'
+            )
+        return updated
+
+
 class CustomUserManager(BaseUserManager):
     """Custom user model manager"""
 
@@ -34,8 +88,17 @@ class CustomUserManager(BaseUserManager):
         user.save()
         return user
 
+    def filter_email(self, email):
+        """Users with `email`, whatever its case, found through the
+        unique index on lower(email).
+        """
+        return self.filter(Exact(Lower('email'), Lower(models.Value(email))))
+
+    def get_by_natural_key(self, username):
+        return self.filter_email(username).get()
 
-class User(AbstractBaseUser, PermissionsMixin):
+
+class User(AbstractBaseUser, PermissionsMixin, VersionedModel):
     """User DB model"""
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=255)
@@ -46,8 +109,22 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    # Logging in records last_login without invalidating edits.
+    unversioned_fields = frozenset({'last_login'})
+
     objects = CustomUserManager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'),
+                name='core_user_email_ci_unique',
+                violation_error_message=_(
+                    'user with this email already exists.'
+                ),
+            ),
+        ]
+
     def __str__(self):
         """String representation"""
         return self.email
@@ -107,12 +184,29 @@ class Location(models.Model):
         return self.name
 
 
-class Property(models.Model):
+class PropertyManager(models.Manager):
+    """Manager hiding properties that have been deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Property(VersionedModel):
     """The property to be rented"""
     name = models.CharField(max_length=255)
     price_per_unit = models.DecimalField(max_digits=5, decimal_places=2)
     available = models.BooleanField(default=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text=_('set when the listing is deleted, kept as a tombstone.')
+    )
+    search_matched = models.BooleanField(
+        default=False,
+        help_text=_('set once the listing is matched to saved searches.')
+    )
 
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -135,5 +229,335 @@ class Property(models.Model):
         help_text=_('days, weeks, months when property is unavailable.')
     )
 
+    objects = PropertyManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'],
+                         name='core_property_changes_idx'),
+            models.Index(fields=['id'],
+                         name='core_property_unmatched_idx',
+                         condition=models.Q(search_matched=False)),
+        ]
+
     def __str__(self):
         return self.name
+
+    def soft_delete(self):
+        """Marks the property deleted, leaving a tombstone for syncing."""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at', 'updated_at'])
+
+
+class PropertyCounter(models.Model):
+    """View and impression totals of a property, flushed in batches by
+    listing.counters rather than written on every request.
+    """
+    # No database constraint, so flushing buffered counts never waits on
+    # a check of, or a lock on, the property row.
+    property = models.OneToOneField(
+        Property,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_constraint=False,
+        related_name='counter'
+    )
+    views = models.BigIntegerField(default=0)
+    impressions = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-views', 'property'],
+                         name='core_counter_views_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.property_id}: {self.views} views'
+
+
+class Photo(models.Model):
+    """Image stored once per distinct content, named by its SHA-256"""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=50)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class PropertyPhoto(models.Model):
+    """A photo shown on a property listing"""
+    # Indexed as the leading column of the unique constraint.
+    property = models.ForeignKey(Property,
+                                 on_delete=models.CASCADE,
+                                 related_name='photos',
+                                 db_index=False)
+    # Files are shared between listings, so are never deleted with one.
+    photo = models.ForeignKey(Photo, on_delete=models.PROTECT)
+    position = models.PositiveSmallIntegerField(default=0)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'photo'],
+                                    name='core_propertyphoto_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.property_id}: {self.photo_id}'
+
+
+class SavedSearch(models.Model):
+    """Property search filters a user wants to hear about new matches of.
+    Unset filters match any value.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='saved_searches'
+    )
+    name = models.CharField(max_length=255, blank=True)
+    # Indexed as the leading column of the criteria index.
+    country = models.ForeignKey(Country,
+                                on_delete=models.CASCADE,
+                                null=True,
+                                blank=True,
+                                db_index=False)
+    property_type = models.ForeignKey(PropertyType,
+                                      on_delete=models.CASCADE,
+                                      null=True,
+                                      blank=True)
+    min_price = models.DecimalField(max_digits=5, decimal_places=2,
+                                    default=0)
+    max_price = models.DecimalField(max_digits=5, decimal_places=2,
+                                    null=True,
+                                    blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The inverted index new listings are matched through: the
+            # searches for a country and type, by minimum price.
+            models.Index(fields=['country', 'property_type', 'min_price'],
+                         include=['max_price', 'owner'],
+                         name='core_search_criteria_idx'),
+        ]
+
+    def __str__(self):
+        return self.name or f'Saved search #{self.pk}'
+
+
+class SearchMatch(models.Model):
+    """A new listing matching a saved search, kept until notified"""
+    # Indexed as the leading column of the unique constraint.
+    search = models.ForeignKey(SavedSearch,
+                               on_delete=models.CASCADE,
+                               related_name='matches',
+                               db_index=False)
+    property = models.ForeignKey(Property, on_delete=models.CASCADE)
+    created_on = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['search', 'property'],
+                                    name='core_searchmatch_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_on'],
+                         name='core_match_pending_idx',
+                         condition=models.Q(notified_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.search_id}: {self.property_id}'
+
+
+class Job(models.Model):
+    """Background job waiting for, or being run by, a worker"""
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+    name = models.CharField(max_length=255)
+    queue = models.CharField(max_length=64, default='default')
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(
+        default=0,
+        help_text=_('jobs with a higher priority are claimed first.')
+    )
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', '-priority', 'run_at', 'id'],
+                         name='core_job_claim_idx',
+                         condition=models.Q(status='QUEUED')),
+            models.Index(fields=['locked_at'],
+                         name='core_job_running_idx',
+                         condition=models.Q(status='RUNNING')),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class PriceStats(models.Model):
+    """Listing price percentiles for a market, precomputed by the
+    core_pricestats materialized view. Unset scope fields mean the row
+    covers every value of that field.
+    """
+    id = models.CharField(max_length=255, primary_key=True)
+    country = models.CharField(null=True)
+    location_id = models.IntegerField(null=True)
+    location = models.CharField(max_length=255, null=True)
+    property_type = models.CharField(null=True)
+    unit = models.CharField(max_length=20)
+    listings = models.IntegerField()
+    p10 = models.DecimalField(max_digits=7, decimal_places=2)
+    median = models.DecimalField(max_digits=7, decimal_places=2)
+    p90 = models.DecimalField(max_digits=7, decimal_places=2)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_pricestats'
+
+    def __str__(self):
+        return self.id
+
+
+class PropertyHistory(models.Model):
+    """Price and availability of a property from `changed_at` on.
+
+    Rows are appended by statement-level triggers on core_property, one
+    INSERT per statement however many rows it wrote, into a table
+    partitioned by month of `changed_at`; see listing.history.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # No database constraints: history outlives purged properties, and
+    # a partitioned table cannot be referenced by foreign keys anyway.
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='history'
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        help_text=_('location of the property when it changed.')
+    )
+    # Null for rows recorded before units were, or for since purged
+    # properties.
+    unit = models.ForeignKey(
+        Unit,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        help_text=_('unit the price was asked per when it changed.')
+    )
+    price_per_unit = models.DecimalField(max_digits=5, decimal_places=2)
+    available = models.BooleanField()
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_propertyhistory'
+
+    def __str__(self):
+        return f'{self.property_id} at {self.changed_at}'
+
+
+class PropertyChangeQuerySet(models.QuerySet):
+    """Reads the change log in the order it is served."""
+
+    def settled(self):
+        """Changes of transactions older than every transaction still
+        running, in order. A transaction committing later cannot add a
+        change before them.
+
+        That includes transactions that never touch properties, in any
+        database of the cluster, as long as they write: a long COPY of
+        seed data or a REFRESH MATERIALIZED VIEW CONCURRENTLY holds back
+        every change made after it started until it ends.
+        """
+        return self.filter(
+            txid__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())',
+                            [])
+        ).order_by('txid', 'id')
+
+    def after(self, txid, pk):
+        """Changes past the position (txid, pk)."""
+        return self.filter(models.Q(txid__gt=txid)
+                           | models.Q(txid=txid, id__gt=pk))
+
+
+class PropertyChange(models.Model):
+    """A write that changed how a property is listed, in the order the
+    sync feed serves them.
+
+    Rows are appended by triggers on core_property and on the reference
+    tables its listing shows, so bulk updates and deletes are recorded
+    too. `txid` is the writing transaction; see PropertyChangesView.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # No database constraint: the change must outlive a purged property.
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    txid = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+
+    objects = PropertyChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'],
+                         name='core_propertychange_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.property_id} in {self.txid}'
+
+
+class ChangeLogHorizon(models.Model):
+    """The feed position up to which the change log has been pruned, in
+    a single row. A cursor before it may have missed pruned changes.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    txid = models.BigIntegerField()
+    change_id = models.BigIntegerField()
+    pruned_at = models.DateTimeField()
+
+    @classmethod
+    def position(cls):
+        """The (txid, id) of the last pruned change, or None."""
+        return cls.objects.filter(pk=1).values_list(
+            'txid', 'change_id'
+        ).first()
+
+    def __str__(self):
+        return f'{self.change_id} in {self.txid}'
@@ -0,0 +1,184 @@
+"""
+Batched deletion of rows together with everything depending on them.
+
+Django's delete() loads every dependent row into memory, then deletes
+them all in one transaction holding their locks until it commits; for a
+country or a prolific user that is millions of rows. Purging follows the
+same on_delete rules, but removes each table's rows a batch at a time,
+children before parents, in short transactions of their own, walking the
+index on each foreign key in order from the last key seen. Whole
+batches are all a stop leaves behind, and purging again carries on where
+it left off.
+
+Raw deletes send no signals: callers refresh whatever caches depend on
+the purged rows.
+"""
+import threading
+import time
+
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    models,
+    transaction,
+)
+
+# Postgres error code for lock_timeout expiring.
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class PurgeError(Exception):
+    """Raised when a dependent row cannot be purged."""
+
+
+def dependents(model):
+    """Yields (model, foreign key column, on_delete) for each relation
+    pointing at `model`, including many-to-many link tables.
+    """
+    for field in model._meta.get_fields(include_hidden=True):
+        if field.auto_created and not field.concrete \
+                and (field.one_to_many or field.one_to_one):
+            yield field.related_model, field.field.column, field.on_delete
+
+
+class Purger:
+    """Deletes rows and their dependents in batches of `batch_size`.
+
+    Each batch waits at most `lock_timeout` seconds for locks, so it never
+    queues writers behind it for longer, and is followed by `sleep`
+    seconds for replicas and vacuum to keep up.
+    """
+
+    def __init__(self, batch_size=1000, sleep=0.0, lock_timeout=2.0,
+                 progress=None):
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.lock_timeout = lock_timeout
+        self.progress = progress
+        self.deleted = {}
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        """Stops after the current batch, e.g. on SIGTERM."""
+        self.stopping.set()
+
+    def purge(self, model, pks):
+        """Deletes the `model` rows with primary keys `pks` and all that
+        depends on them. Returns False when stopped before the end.
+        """
+        self._check(model, set())
+        self._purge(model, model._meta.pk.column, list(pks))
+        return not self.stopping.is_set()
+
+    def _check(self, model, seen):
+        """Refuses relations whose on_delete purging cannot follow."""
+        seen.add(model)
+        for child, column, on_delete in dependents(model):
+            if on_delete is models.CASCADE:
+                if child not in seen:
+                    self._check(child, seen)
+            elif on_delete not in (models.SET_NULL, models.DO_NOTHING):
+                raise PurgeError(
+                    f'{child._meta.label}.{column} does not allow '
+                    f'deleting {model._meta.label} rows'
+                )
+
+    def _purge(self, model, column, values):
+        """Deletes the rows of `model` whose `column` is in `values`."""
+        qn = connection.ops.quote_name
+        table, pk = model._meta.db_table, model._meta.pk.column
+        delete = f'DELETE FROM {qn(table)} WHERE {qn(pk)} = ANY(%s)'
+        children = list(dependents(model))
+        conflicts = 0
+        after = None
+        while not self.stopping.is_set():
+            keys = self._select(model, column, values, after)
+            if not keys:
+                return
+            batch = [key[-1] for key in keys]
+            for child, child_column, on_delete in children:
+                if on_delete is models.CASCADE:
+                    self._purge(child, child_column, batch)
+                elif on_delete is models.SET_NULL:
+                    self._set_null(child, child_column, batch)
+                if self.stopping.is_set():
+                    return
+            try:
+                self._run(table, delete, [batch])
+                conflicts = 0
+                after = keys[-1]
+            except IntegrityError as exc:
+                # A dependent added meanwhile is purged on the next pass;
+                # one that keeps blocking the delete is not purgeable.
+                conflicts += 1
+                if conflicts > 1:
+                    raise PurgeError(f'Cannot delete from {table}: {exc}')
+
+    def _set_null(self, model, column, values):
+        """Clears `column` on the rows of `model` referencing `values`."""
+        qn = connection.ops.quote_name
+        table, pk = model._meta.db_table, model._meta.pk.column
+        update = (f'UPDATE {qn(table)} SET {qn(column)} = NULL '
+                  f'WHERE {qn(pk)} = ANY(%s) AND {qn(column)} = ANY(%s)')
+        after = None
+        while not self.stopping.is_set():
+            keys = self._select(model, column, values, after)
+            if not keys:
+                return
+            self._run(None, update, [[key[-1] for key in keys], values])
+            if len(keys) < self.batch_size:
+                return
+            after = keys[-1]
+
+    def _select(self, model, column, values, after):
+        """Returns the next batch of (`column`, primary key) keys of the
+        rows of `model` whose `column` is in `values`, in index order and
+        past the key `after` of the previous batch.
+
+        Carrying on from the last key keeps each scan from wading again
+        through the rows earlier batches removed but vacuum has not.
+        """
+        qn = connection.ops.quote_name
+        table, pk = model._meta.db_table, model._meta.pk.column
+        columns = [qn(pk)] if column == pk else [qn(column), qn(pk)]
+        keys = ', '.join(columns)
+        sql = (f'SELECT {keys} FROM {qn(table)} '
+               f'WHERE {qn(column)} = ANY(%s)')
+        params = [values]
+        if after is not None:
+            sql += f' AND ({keys}) > ({", ".join(["%s"] * len(after))})'
+            params.extend(after)
+        sql += f' ORDER BY {keys} LIMIT %s'
+        params.append(self.batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _run(self, table, sql, params):
+        """Runs one batch in its own short transaction, waiting for locks
+        again while they are held elsewhere. Returns the rows affected.
+        """
+        while True:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT set_config('lock_timeout', %s, true)",
+                        [f'{int(self.lock_timeout * 1000)}ms']
+                    )
+                    cursor.execute(sql, params)
+                    rows = cursor.rowcount
+                break
+            except OperationalError as exc:
+                if getattr(exc.__cause__, 'sqlstate', None) \
+                        != LOCK_NOT_AVAILABLE:
+                    raise
+                if self.stopping.wait(self.lock_timeout):
+                    return 0
+        if table is not None:
+            self.deleted[table] = self.deleted.get(table, 0) + rows
+            if self.progress:
+                self.progress(table, self.deleted[table])
+        if self.sleep:
+            time.sleep(self.sleep)
+        return rows
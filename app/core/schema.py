@@ -0,0 +1,143 @@
+"""
+Precomputed OpenAPI schema, generated once per code version and served
+from memory instead of introspecting every view on each request.
+
+The build runs `build_schema`, which stores the schema under the code
+version and records the version in SCHEMA_DIR/VERSION. At run time the
+version is only read back, and the schema tooling is only imported if
+the stored schema is missing.
+"""
+import hashlib
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.views import View
+
+from core.http import compress, precomputed_response
+
+CONTENT_TYPE = 'application/vnd.oai.openapi+json'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def source_digest():
+    """Digest of the project sources and the library versions the schema
+    depends on; walks the whole tree, so only the build computes it.
+    """
+    import django
+    import drf_spectacular
+    import rest_framework
+
+    digest = hashlib.sha256()
+    for library in (django, rest_framework, drf_spectacular):
+        digest.update(library.__version__.encode())
+    for path in sorted(settings.BASE_DIR.rglob('*.py')):
+        digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def build_version():
+    """The version a build stores the schema under: APP_VERSION when the
+    build sets one, otherwise the digest of the sources.
+    """
+    return os.environ.get('APP_VERSION') or source_digest()
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Identifies the code the schema was built for: APP_VERSION, or the
+    version `build_schema` recorded. None when neither is set.
+    """
+    version = os.environ.get('APP_VERSION')
+    if version:
+        return version
+    try:
+        return (settings.SCHEMA_DIR / 'VERSION').read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def schema_path(version=None):
+    """Where the schema for a code version is stored."""
+    return settings.SCHEMA_DIR / f'openapi-{version or code_version()}.json'
+
+
+def generate_schema():
+    """Introspects the API and renders the schema as JSON bytes."""
+    from drf_spectacular.renderers import OpenApiJsonRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return OpenApiJsonRenderer().render(schema, renderer_context={})
+
+
+def write_schema(body, version=None):
+    """Atomically stores the schema and its gzipped copy on disk."""
+    path = schema_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for target, data in ((path, body),
+                         (path.with_suffix('.json.gz'), compress(body))):
+        tmp = target.with_suffix(target.suffix + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+    return path
+
+
+def write_version(version):
+    """Records the version the stored schema belongs to."""
+    path = settings.SCHEMA_DIR / 'VERSION'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(version)
+    os.replace(tmp, path)
+
+
+def load_schema():
+    """Returns (etag, body, gzipped body) for the current code version.
+
+    Reads the stored schema when present, otherwise generates it once and
+    tries to store it for the other workers. Without a recorded version,
+    e.g. when `build_schema` never ran, the schema is generated and kept
+    in memory only.
+    """
+    version = code_version()
+    if version in _loaded:
+        return _loaded[version]
+    with _lock:
+        if version not in _loaded:
+            body = None
+            if version is None:
+                logger.warning('No schema version recorded; run '
+                               'build_schema when building')
+            else:
+                try:
+                    body = schema_path(version).read_bytes()
+                except FileNotFoundError:
+                    pass
+            if body is None:
+                body = generate_schema()
+                if version is not None:
+                    try:
+                        write_schema(body, version)
+                    except OSError:
+                        pass
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            _loaded[version] = (etag, body, compress(body))
+    return _loaded[version]
+
+
+class PrecomputedSchemaView(View):
+    """Serves the precomputed schema with an ETag and gzip encoding."""
+
+    def get(self, request, *args, **kwargs):
+        etag, body, gzipped = load_schema()
+        return precomputed_response(request, etag, body, gzipped,
+                                    CONTENT_TYPE)
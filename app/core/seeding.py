@@ -0,0 +1,198 @@
+"""
+Deterministic bulk data generation for benchmarks and load tests.
+"""
+import multiprocessing
+import random
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.utils import timezone
+
+from core.models import (
+    Country,
+    PropertyType,
+    Unit,
+    Amenity,
+    Location,
+    Property,
+)
+
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+COUNTRIES = ('Nigeria', 'Ghana', 'Kenya', 'South Africa', 'Canada',
+             'Egypt', 'Morocco', 'Rwanda', 'Senegal', 'Uganda')
+PROPERTY_TYPES = ('Bungalow', 'Duplex', 'Cottage', 'Flat', 'Studio',
+                  'Terrace', 'Mansion', 'Penthouse')
+AMENITIES = ('Wifi', 'Swimming pool', 'Gym', 'Parking', 'Generator',
+             'Air conditioning', 'Security', 'Laundry')
+STREETS = ('Crescent', 'Garden', 'Palm', 'Harbour', 'Market', 'Hill',
+           'Lake', 'Station', 'Unity', 'Freedom')
+
+BATCH_SIZE = 5_000
+CHUNK_SIZE = 100_000
+
+COPY_PROPERTIES = (
+    f'COPY {Property._meta.db_table} (name, price_per_unit, available, '
+    'description, owner_id, location_id, property_type_id, unit_id, '
+    'updated_at, version, search_matched) FROM STDIN'
+)
+
+
+def parse_size(value):
+    """Turns '1k', '100k', '1m' or a plain number into a row count."""
+    value = str(value).lower()
+    if value in SIZES:
+        return SIZES[value]
+    if not value.isdigit():
+        raise ValueError(f'Unknown dataset size: {value}')
+    return int(value)
+
+
+def seed_reference_data(country_count=len(COUNTRIES),
+                        locations_per_country=20):
+    """Creates the lookup tables every property points at."""
+    names = list(COUNTRIES[:country_count]) + [
+        f'Country {i}' for i in range(len(COUNTRIES), country_count)
+    ]
+    Country.objects.bulk_create(
+        [Country(name=name) for name in names],
+        ignore_conflicts=True
+    )
+    PropertyType.objects.bulk_create(
+        [PropertyType(name=name) for name in PROPERTY_TYPES],
+        ignore_conflicts=True
+    )
+    Amenity.objects.bulk_create(
+        [Amenity(name=name) for name in AMENITIES],
+        ignore_conflicts=True
+    )
+    existing_units = set(Unit.objects.values_list('name', flat=True))
+    Unit.objects.bulk_create([
+        Unit(name=name) for name, _ in Unit.UNIT_CHOICES
+        if name not in existing_units
+    ])
+    countries = list(Country.objects.order_by('id'))
+    if not Location.objects.exists():
+        Location.objects.bulk_create([
+            Location(name=f'{STREETS[i % len(STREETS)]} {i}, {country}',
+                     country=country)
+            for country in countries
+            for i in range(locations_per_country)
+        ], batch_size=BATCH_SIZE)
+
+    return {
+        'countries': countries,
+        'property_types': list(PropertyType.objects.order_by('id')),
+        'units': list(Unit.objects.order_by('id')),
+        'amenities': list(Amenity.objects.order_by('id')),
+        'locations': list(Location.objects.order_by('id')),
+    }
+
+
+def seed_users(count, password='testing123', prefix='user'):
+    """Creates `count` users sharing a single password hash."""
+    hashed = make_password(password)
+    user_model = get_user_model()
+    for start in range(0, count, BATCH_SIZE):
+        user_model.objects.bulk_create([
+            user_model(email=f'{prefix}{i}@example.com',
+                       name=f'{prefix.title()} {i}',
+                       password=hashed)
+            for i in range(start, min(start + BATCH_SIZE, count))
+        ], ignore_conflicts=True)
+    return list(
+        user_model.objects.filter(email__startswith=prefix).order_by('id')
+    )
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights giving item `k` a share proportional to
+    1 / (k + 1) ** skew; a skew of 0 is uniform.
+    """
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def property_rows(count, ids, seed=0, start=0, skew=0.0, updated_at=None):
+    """Yields COPY rows for the properties numbered `start` onwards.
+
+    Every chunk draws from its own generator, so the rows only depend on
+    the seed and the chunk, never on how chunks are spread over workers.
+    """
+    rng = random.Random(f'{seed}:{start}')
+    updated_at = updated_at or timezone.now()
+    owners = rng.choices(ids['owners'],
+                         cum_weights=zipf_weights(len(ids['owners']), skew),
+                         k=count)
+    locations = rng.choices(
+        ids['locations'],
+        cum_weights=zipf_weights(len(ids['locations']), skew),
+        k=count
+    )
+    for i, owner, location in zip(range(start, start + count), owners,
+                                  locations):
+        price = min(max(rng.lognormvariate(4, 0.8), 5), 999.99)
+        yield (
+            f'{rng.choice(STREETS)} {rng.choice(PROPERTY_TYPES)} {i}',
+            f'{price:.2f}',
+            rng.random() < 0.8,
+            '',
+            owner,
+            location,
+            rng.choice(ids['property_types']),
+            rng.choice(ids['units']),
+            updated_at,
+            1,
+            # Bulk loads are not announced to saved searches.
+            True,
+        )
+
+
+def copy_properties(rows):
+    """Streams property rows into the table with COPY."""
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(COPY_PROPERTIES) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def _seed_chunk(args):
+    """Worker entry point: seeds one chunk on its own connection."""
+    ids, seed, skew, start, count = args
+    try:
+        copy_properties(property_rows(count, ids, seed, start, skew))
+    finally:
+        connection.close()
+    return count
+
+
+def seed_properties(count, owners, reference, seed=0, skew=0.0,
+                    workers=1, chunk_size=CHUNK_SIZE):
+    """Inserts `count` properties in chunks, across `workers` processes.
+
+    Worker processes commit on their own connections, so use a single
+    worker inside a transaction.
+    """
+    ids = {
+        'owners': [owner.pk for owner in owners],
+        'locations': [location.pk for location in reference['locations']],
+        'property_types': [t.pk for t in reference['property_types']],
+        'units': [unit.pk for unit in reference['units']],
+    }
+    chunks = [
+        (ids, seed, skew, start, min(chunk_size, count - start))
+        for start in range(0, count, chunk_size)
+    ]
+    if workers <= 1:
+        for _, _, _, start, size in chunks:
+            copy_properties(property_rows(size, ids, seed, start, skew))
+        return count
+
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        return sum(pool.imap_unordered(_seed_chunk, chunks))
@@ -0,0 +1,143 @@
+"""
+Production HTTP server: gunicorn with the app loaded before forking.
+
+The master process imports the app, resolves every URL pattern, builds
+each view's serializer fields once and loads the translation catalogs,
+then moves everything allocated so far out of the garbage collector's
+reach with gc.freeze(). Workers forked from it share those pages copy
+on write instead of each importing the app again, and the collector
+never writes to them, which would copy them into every worker.
+"""
+import gc
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import translation
+from gunicorn.app.base import BaseApplication
+
+from core import health
+from listing.counters import counters
+from listing.similar import similarity_index
+
+logger = logging.getLogger(__name__)
+
+# Every view is synchronous: under an ASGI server Django would run each
+# one through a single thread per worker, adding overhead for no extra
+# concurrency, so only WSGI worker classes are offered.
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'threads': 'gthread',
+}
+
+
+def iter_views(patterns):
+    """Yields the view class or function behind every URL pattern."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            callback = pattern.callback
+            yield getattr(callback, 'cls',
+                          getattr(callback, 'view_class', callback))
+
+
+def warm_up():
+    """Loads what every request needs, returning the number of views."""
+    resolver = get_resolver()
+    # Builds the reverse lookup tables, which also imports every view.
+    resolver.reverse_dict
+    views = set(iter_views(resolver.url_patterns))
+    for view in views:
+        serializer_class = getattr(view, 'serializer_class', None)
+        if serializer_class is None:
+            continue
+        try:
+            serializer_class().fields
+        except Exception:
+            # Serializers needing context are built on first use instead.
+            logger.debug('Could not build %s', serializer_class,
+                         exc_info=True)
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+    return len(views)
+
+
+def local_caches():
+    """Aliases of the caches each process keeps to itself. Invalidations
+    written to them never reach the other workers.
+    """
+    return [alias for alias in settings.CACHES
+            if isinstance(caches[alias], LocMemCache)]
+
+
+def load_app():
+    """Imports the WSGI application."""
+    from app.wsgi import application
+    return application
+
+
+def preload():
+    """Loads the app and freezes its objects before workers fork."""
+    gc.disable()
+    application = load_app()
+    warm_up()
+    # Sockets must not be shared with the workers.
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+    return application
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    """Warms the worker up before it accepts its first connection."""
+    counters.start()
+    try:
+        health.warm_up()
+        similarity_index.start()
+        # Threaded workers serve from a pool of their own threads, sync
+        # workers from this one.
+        pool = getattr(worker, 'tpool', None)
+        if pool is not None:
+            health.warm_threads(pool, worker.cfg.threads)
+        else:
+            health.connect()
+    except Exception:
+        # The readiness probe retries and reports the failure.
+        logger.exception('Worker warm-up failed')
+
+
+class Server(BaseApplication):
+    """Runs the app under gunicorn with the given settings.
+
+    With `preload` the app is loaded and frozen in the master process,
+    otherwise every worker loads its own copy after forking.
+    """
+
+    def __init__(self, options, preload=True):
+        self.options = options
+        self.preload = preload
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('preload_app', self.preload)
+        self.cfg.set('post_fork', post_fork)
+        self.cfg.set('post_worker_init', post_worker_init)
+        # Newer gunicorn opens a control socket in $HOME, which the
+        # container user does not have.
+        if 'control_socket_disable' in self.cfg.settings:
+            self.cfg.set('control_socket_disable', True)
+
+    def load(self):
+        if self.preload:
+            return preload()
+        return load_app()
@@ -0,0 +1,62 @@
+"""
+Shared assertions guarding endpoints against N+1 queries and unindexed
+scans as the dataset grows.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Tables are seeded to this many rows before their plans are checked, so
+# the planner has a real choice between an index and a sequential scan.
+PLAN_ROWS = 2_000
+
+
+def seq_scans(plan, table):
+    """Yields the Seq Scan nodes over `table` in an EXPLAIN JSON plan."""
+    if plan.get('Node Type') == 'Seq Scan' \
+            and plan.get('Relation Name') == table:
+        yield plan
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child, table)
+
+
+class QueryHarnessMixin:
+    """Mixin for TestCase adding query-count and query-plan assertions."""
+
+    def capture(self, request):
+        """Runs `request()` and returns its response and SQL queries."""
+        with CaptureQueriesContext(connection) as queries:
+            res = request()
+        self.assertLess(res.status_code, 400, getattr(res, 'data', None))
+        return res, [query['sql'] for query in queries.captured_queries]
+
+    def assertConstantQueries(self, request, grow, steps=(1, 5, 20)):
+        """Asserts the query count of `request()` does not change as
+        `grow(n)` adds `n` more rows before each call. A first call warms
+        up one-off work, such as issuing a token, before counting.
+        """
+        self.capture(request)
+        counts = []
+        for step in steps:
+            grow(step)
+            _, queries = self.capture(request)
+            counts.append(len(queries))
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'Query count grew with the dataset: {counts}'
+        )
+
+    def main_query(self, queries, table):
+        """Returns the first captured query reading from `table`."""
+        for sql in queries:
+            if f'FROM "{table}"' in sql:
+                return sql
+        self.fail(f'No query read from {table}')
+
+    def assertNoSeqScan(self, sql, table='core_property'):
+        """Asserts the planner does not scan all of `table` for `sql`."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{table}"')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0][0]['Plan']
+        scans = list(seq_scans(plan, table))
+        self.assertEqual(scans, [], f'Sequential scan on {table}: {sql}')
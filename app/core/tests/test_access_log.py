@@ -0,0 +1,154 @@
+"""
+Tests for the structured access log
+"""
+import io
+import json
+import logging
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.access_log import BatchingQueueHandler, JSONFormatter
+
+
+def make_record(message, **access):
+    record = logging.LogRecord('access', logging.INFO, __file__, 0,
+                               message, None, None)
+    record.access = access
+    return record
+
+
+class BlockingStream(io.StringIO):
+    """A stream whose writes wait until it is released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.release.wait(5)
+        return super().write(text)
+
+
+class TestBatchingQueueHandler(SimpleTestCase):
+    """Test the queue handler and its writer thread"""
+
+    def make_handler(self, stream, **kwargs):
+        handler = BatchingQueueHandler(stream=stream, **kwargs)
+        handler.setFormatter(JSONFormatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def wait_until_taken(self, handler, timeout=5):
+        """Waits for the writer to take everything queued."""
+        deadline = time.monotonic() + timeout
+        while not handler._queue.empty():
+            self.assertLess(time.monotonic(), deadline,
+                            'The writer never took the queued records')
+            time.sleep(0.001)
+
+    def test_writes_json_lines(self):
+        """Tests queued records are written as one JSON line each."""
+        stream = io.StringIO()
+        handler = self.make_handler(stream)
+
+        for status in (200, 404):
+            handler.handle(make_record('GET /api/', status=status))
+        handler.flush()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line['status'] for line in lines], [200, 404])
+        self.assertEqual(lines[0]['message'], 'GET /api/')
+
+    def test_drops_and_counts_when_full(self):
+        """Tests records are dropped once the queue is full, and the
+        count is logged when the writer catches up.
+        """
+        stream = BlockingStream()
+        handler = self.make_handler(stream, capacity=2, batch_size=1)
+
+        # The writer takes the first record and blocks writing it, two
+        # fill the queue and the last two are dropped.
+        handler.handle(make_record('first'))
+        self.wait_until_taken(handler)
+        for message in ('a', 'b', 'c', 'd'):
+            handler.handle(make_record(message))
+        self.assertEqual(handler.dropped, 2)
+
+        stream.release.set()
+        handler.flush()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        reports = [line for line in lines if 'dropped' in line]
+        self.assertEqual(
+            [line['message'] for line in lines if 'dropped' not in line],
+            ['first', 'a', 'b'],
+        )
+        self.assertEqual(reports[0]['message'], 'Dropped access log records')
+        self.assertEqual(reports[0]['dropped'], 2)
+
+    def test_drops_counted_across_threads(self):
+        """Tests drops from concurrent request threads are all counted."""
+        stream = BlockingStream()
+        handler = self.make_handler(stream, capacity=2, batch_size=1)
+        handler.handle(make_record('first'))
+        self.wait_until_taken(handler)
+        for message in ('a', 'b'):
+            handler.handle(make_record(message))
+
+        def drop():
+            for _ in range(500):
+                handler.handle(make_record('dropped'))
+
+        threads = [threading.Thread(target=drop) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stream.release.set()
+
+        self.assertEqual(handler.dropped, 4000)
+
+
+class TestAccessLogMiddleware(TestCase):
+    """Test the entries logged for API requests"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testing123',
+        )
+
+    def test_logs_route_user_status_and_timings(self):
+        """Tests an entry has the route, user, status and timings."""
+        self.client.force_authenticate(self.user)
+
+        with self.assertLogs('access', level='INFO') as logs:
+            res = self.client.get(reverse('listing:saved-search-list'))
+
+        self.assertEqual(res.status_code, 200)
+        entry = logs.records[0].access
+        self.assertEqual(entry['route'], 'listing:saved-search-list')
+        self.assertEqual(entry['user_id'], self.user.id)
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['latency_ms'], 0)
+        self.assertGreaterEqual(entry['latency_ms'], entry['db_ms'])
+
+    def test_anonymous_request(self):
+        """Tests anonymous requests are logged without a user id."""
+        with self.assertLogs('access', level='INFO') as logs:
+            self.client.get(reverse('listing:countries'))
+
+        entry = logs.records[0].access
+        self.assertIsNone(entry['user_id'])
+        self.assertEqual(entry['route'], 'listing:countries')
+
+    def test_skips_routes_outside_the_api(self):
+        """Tests requests outside /api/ are not logged."""
+        with self.assertNoLogs('access', level='INFO'):
+            self.client.get(reverse('health-live'))
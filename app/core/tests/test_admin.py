@@ -0,0 +1,114 @@
+"""
+Tests for the admin site and the estimated-count paginator
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import seeding
+from core.models import Property
+from core.pagination import EstimatedCountPaginator, estimate_count
+
+
+class TestEstimatedCount(TestCase):
+    """Test counting large querysets from planner estimates"""
+
+    def setUp(self):
+        seeding.seed_users(50)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_user')
+
+    def test_unfiltered_uses_table_statistics(self):
+        self.assertEqual(estimate_count(get_user_model().objects.all()), 50)
+
+    def test_filtered_uses_plan_estimate(self):
+        estimate = estimate_count(
+            get_user_model().objects.filter(is_staff=True)
+        )
+
+        self.assertLess(estimate, 50)
+
+    def test_small_results_counted_exactly(self):
+        paginator = EstimatedCountPaginator(
+            get_user_model().objects.order_by('id'), 10
+        )
+
+        self.assertEqual(paginator.count, 50)
+        self.assertFalse(paginator.estimated)
+
+    @patch.object(EstimatedCountPaginator, 'exact_count_limit', 10)
+    def test_large_results_not_counted(self):
+        paginator = EstimatedCountPaginator(
+            get_user_model().objects.order_by('id'), 10
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 50)
+
+        self.assertTrue(paginator.estimated)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+
+
+class TestAdminSite(TestCase):
+    """Test the admin change lists"""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testing123'
+        )
+        self.client.force_login(self.admin)
+        reference = seeding.seed_reference_data(country_count=2)
+        owners = seeding.seed_users(5)
+        seeding.seed_properties(30, owners, reference, seed=1)
+
+    def test_change_lists_render(self):
+        """Tests every registered model lists without errors."""
+        for model in ('user', 'property', 'location', 'country',
+                      'propertytype', 'amenity', 'unit', 'job',
+                      'savedsearch'):
+            res = self.client.get(reverse(f'admin:core_{model}_changelist'))
+            self.assertEqual(res.status_code, 200, model)
+
+    @patch.object(EstimatedCountPaginator, 'exact_count_limit', 0)
+    def test_property_list_constant_queries(self):
+        """Tests properties list with their relations joined, without
+        counting the table.
+        """
+        url = reverse('admin:core_property_changelist')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        property_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "core_property"' in query['sql']
+        ]
+        self.assertEqual(len(property_queries), 1)
+        self.assertIn('JOIN "core_location"', property_queries[0])
+        self.assertNotIn('COUNT(', property_queries[0])
+
+    def test_user_search_ignores_case(self):
+        """Tests users are found by email through the lower index."""
+        url = reverse('admin:core_user_changelist')
+
+        res = self.client.get(url, {'q': 'ADMIN@example.com'})
+
+        self.assertContains(res, 'admin@example.com')
+
+    def test_property_search_by_id(self):
+        """Tests properties are searched by primary key."""
+        prop = Property.objects.order_by('id').first()
+        url = reverse('admin:core_property_changelist')
+
+        res = self.client.get(url, {'q': str(prop.id)})
+
+        self.assertEqual(res.context['cl'].result_count, 1)
@@ -1,13 +1,25 @@
 """
 test_commands.py: Tests for the custom commands I create
 """
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
 from psycopg import OperationalError as PsycopgError
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from core import seeding
+from core.management.commands import (
+    bench, profile_server, profile_startup, serve,
+)
+from core.models import Location, Property
 
 
 @patch('core.management.commands.await_db.Command.check')
@@ -30,3 +42,228 @@ class TestCommand(TestCase):
 
         self.assertEqual(patched_check.call_count, 8)
         patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    def test_command_backs_off_exponentially(self, patched_timer,
+                                             patched_check):
+        patched_check.side_effect = [OperationalError] * 6 + [True]
+
+        call_command('await_db', '--initial-delay', '0.5', '--max-delay', '4')
+
+        delays = [c.args[0] for c in patched_timer.call_args_list]
+        self.assertEqual(delays, [0.5, 1, 2, 4, 4, 4])
+
+    @patch('time.sleep')
+    @patch('time.monotonic')
+    def test_command_gives_up_at_deadline(self, patched_clock, patched_timer,
+                                          patched_check):
+        patched_clock.side_effect = [0, 1, 3, 11]
+        patched_check.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command('await_db', '--timeout', '10',
+                         '--initial-delay', '1')
+
+        delays = [c.args[0] for c in patched_timer.call_args_list]
+        self.assertEqual(delays, [1, 2])
+
+
+class TestBenchCommand(TestCase):
+    """Unit tests for the benchmark command"""
+
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+
+        self.assertEqual(bench.percentile(samples, 50), 50)
+        self.assertEqual(bench.percentile(samples, 99), 99)
+        self.assertEqual(bench.percentile([7], 95), 7)
+
+    def test_find_regressions(self):
+        baseline = {
+            'a': {'p95_ms': 10.0, 'queries_per_request': 1},
+            'b': {'p95_ms': 10.0, 'queries_per_request': 1},
+        }
+        results = {
+            'a': {'p95_ms': 12.0, 'queries_per_request': 1},
+            'b': {'p95_ms': 13.0, 'queries_per_request': 2},
+            'c': {'p95_ms': 99.0, 'queries_per_request': 9},
+        }
+
+        regressions = bench.find_regressions(results, baseline, 0.25)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith('b:') for r in regressions))
+
+    def test_bench_writes_results_and_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'results.json'
+            baseline = Path(tmp) / 'baseline.json'
+            baseline.write_text(json.dumps({'20': {'routes': {
+                'listing:property-list': {
+                    'p95_ms': 1000.0,
+                    'queries_per_request': 0,
+                },
+            }}}))
+
+            with self.assertRaisesRegex(CommandError, 'property-list'):
+                call_command('bench', '--in-place', '--size', '20',
+                             '--iterations', '2', '--warmup', '0',
+                             '--routes', 'listing:property-list',
+                             'user:me', '--output', str(output),
+                             '--baseline', str(baseline), stdout=StringIO())
+
+            results = json.loads(output.read_text())
+        self.assertEqual(results['properties'], 20)
+        self.assertEqual(Property.objects.count(), 20)
+        self.assertEqual(
+            set(results['routes']),
+            {'listing:property-list', 'user:me'}
+        )
+
+
+class TestSeedCommand(TestCase):
+    """Unit tests for the synthetic data generator"""
+
+    IDS = {
+        'owners': list(range(1, 11)),
+        'locations': list(range(1, 51)),
+        'property_types': [1, 2],
+        'units': [1],
+    }
+
+    def test_property_rows_deterministic(self):
+        now = timezone.now()
+        rows = list(seeding.property_rows(100, self.IDS, seed=3, start=200,
+                                          updated_at=now))
+
+        self.assertEqual(
+            rows,
+            list(seeding.property_rows(100, self.IDS, seed=3, start=200,
+                                       updated_at=now))
+        )
+        self.assertNotEqual(
+            rows,
+            list(seeding.property_rows(100, self.IDS, seed=4, start=200,
+                                       updated_at=now))
+        )
+
+    def test_property_rows_skewed_towards_popular_locations(self):
+        rows = list(seeding.property_rows(5000, self.IDS, skew=1.5))
+        first = sum(1 for row in rows if row[5] == 1)
+        last = sum(1 for row in rows if row[5] == 50)
+
+        self.assertGreater(first, 10 * max(last, 1))
+
+    def test_seed_command(self):
+        call_command('seed', '--properties', '300', '--users', '7',
+                     '--countries', '12', '--locations-per-country', '3',
+                     '--workers', '1', '--chunk-size', '128',
+                     stdout=StringIO())
+
+        self.assertEqual(Property.objects.count(), 300)
+        self.assertEqual(Location.objects.count(), 36)
+        self.assertEqual(
+            Property.objects.values('owner').distinct().count(), 7
+        )
+
+
+class TestProfileStartupCommand(TestCase):
+    """Unit tests for the startup profiler"""
+
+    TRACE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     django.utils
+import time:       300 |        420 |   django
+import time:        50 |         50 |     django.contrib.admin.utils
+import time:        75 |         75 |   core.models
+import time:        10 |         10 | encodings
+"""
+
+    def test_parse_importtime(self):
+        modules = profile_startup.parse_importtime(self.TRACE)
+
+        self.assertEqual(modules[0], ('django.utils', 120, 120))
+        self.assertEqual(len(modules), 5)
+
+    def test_group_times_use_longest_prefix(self):
+        modules = profile_startup.parse_importtime(self.TRACE)
+        totals = profile_startup.group_times(modules)
+
+        self.assertEqual(totals['django'], 420)
+        self.assertEqual(totals['django.contrib.admin'], 50)
+        self.assertEqual(totals['core'], 75)
+        self.assertEqual(totals['other'], 10)
+
+
+class TestServeCommand(TestCase):
+    """Unit tests for the production server entrypoint"""
+
+    def options(self, **overrides):
+        return {
+            'bind': '0.0.0.0:8000',
+            'worker_class': 'sync',
+            'workers': 3,
+            'threads': 4,
+            'timeout': 30,
+            'graceful_timeout': 30,
+            'max_requests': 0,
+            'max_requests_jitter': 0,
+            'no_preload': False,
+            **overrides,
+        }
+
+    def test_gunicorn_options_for_worker_classes(self):
+        command = serve.Command()
+
+        sync = command.gunicorn_options(self.options())
+        threads = command.gunicorn_options(
+            self.options(worker_class='threads', threads=8)
+        )
+
+        self.assertEqual(sync['worker_class'], 'sync')
+        self.assertNotIn('threads', sync)
+        self.assertEqual(threads['worker_class'], 'gthread')
+        self.assertEqual(threads['threads'], 8)
+        self.assertNotIn('asgi', serve.server.WORKER_CLASSES)
+
+    @patch('core.server.Server.run')
+    @patch('core.server.Server.__init__', return_value=None)
+    def test_serve_preloads_unless_disabled(self, patched_init, _):
+        call_command('serve', '--worker-class', 'threads', '--workers', '1')
+        call_command('serve', '--no-preload', '--allow-local-cache')
+
+        first, second = patched_init.call_args_list
+        self.assertEqual(first.kwargs, {'preload': True})
+        self.assertEqual(second.kwargs, {'preload': False})
+
+    @patch('core.server.Server.run')
+    def test_serve_requires_shared_cache_for_workers(self, run):
+        """Tests several workers are refused a per-process cache."""
+        with self.assertRaisesMessage(CommandError, 'REDIS_URL'):
+            call_command('serve', '--workers', '2')
+
+        run.assert_not_called()
+
+    def test_warm_up_visits_every_view(self):
+        from core import server
+        from listing.views import PropertyViewset
+
+        views = set(server.iter_views(server.get_resolver().url_patterns))
+
+        self.assertIn(PropertyViewset, views)
+        self.assertEqual(server.warm_up(), len(views))
+
+
+class TestProfileServerCommand(TestCase):
+    """Unit tests for the server profiler"""
+
+    def test_parse_smaps_rollup(self):
+        text = """55d0c2a4e000-7ffd2e1f4000 ---p 00000000 00:00 0  [rollup]
+Rss:               51200 kB
+Pss:               20480 kB
+Shared_Clean:      30720 kB
+Private_Clean:      1024 kB
+Private_Dirty:     10240 kB
+"""
+        memory = profile_server.parse_smaps_rollup(text)
+
+        self.assertEqual(memory, {'pss_kb': 20480, 'uss_kb': 11264})
@@ -0,0 +1,105 @@
+"""
+Tests for the liveness and readiness probes
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.db import OperationalError, connections
+from django.test import TestCase
+from django.urls import reverse
+
+from core import health
+from listing.similar import similarity_index
+
+LIVE_URL = reverse('health-live')
+READY_URL = reverse('health-ready')
+
+
+class TestHealth(TestCase):
+    """Test the probes and the worker warm-up"""
+
+    def setUp(self):
+        health._warmed.clear()
+
+    def test_liveness_does_not_query(self):
+        """Tests liveness answers without touching the database."""
+        with self.assertNumQueries(0):
+            res = self.client.get(LIVE_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+        self.assertEqual(res['Cache-Control'], 'no-store')
+
+    def test_readiness_warms_up_once(self):
+        """Tests the first readiness check warms up and later ones do
+        not repeat it.
+        """
+        with patch('listing.bootstrap.load_bundle',
+                   wraps=health.bootstrap.load_bundle) as patched_load:
+            first = self.client.get(READY_URL)
+            second = self.client.get(READY_URL)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['status'], 'ok')
+        self.assertIn('db_ms', second.json())
+        patched_load.assert_called_once()
+
+    def test_warm_up_loads_similarity_index(self):
+        """Tests warming up loads the similarity index, so the first
+        similar-properties request does not.
+        """
+        similarity_index.clear()
+        self.addCleanup(similarity_index.clear)
+
+        health.warm_up()
+
+        self.assertIsNotNone(similarity_index.columns)
+
+    def test_warmed_readiness_is_a_single_query(self):
+        """Tests a warm worker's readiness check runs one query."""
+        health.warm_up()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    @patch('core.health.ping', side_effect=OperationalError('down'))
+    def test_readiness_fails_without_database(self, _):
+        """Tests a database failure answers 503 instead of erroring."""
+        with self.assertLogs('core.health', level='WARNING'):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'status': 'unavailable'})
+
+    def test_warm_threads_connects_every_pool_thread(self):
+        """Tests each thread of a request pool opens its own persistent
+        connection.
+        """
+        threads = set()
+        pool = ThreadPoolExecutor(3)
+        self.addCleanup(pool.shutdown)
+        wrapper = connections['default']
+
+        with patch.dict(wrapper.settings_dict, {'CONN_MAX_AGE': 60}), \
+                patch.object(type(wrapper), 'ensure_connection',
+                             lambda _: threads.add(threading.get_ident())):
+            opened = health.warm_threads(pool, 3)
+
+        self.assertEqual(opened, 3)
+        self.assertEqual(len(threads), 3)
+
+    def test_connect_skipped_without_persistent_connections(self):
+        """Tests no connection is opened that the first request would
+        close anyway.
+        """
+        wrapper = connections['default']
+
+        with patch.dict(wrapper.settings_dict, {'CONN_MAX_AGE': 0}), \
+                patch.object(type(wrapper), 'ensure_connection') as opened:
+            self.assertFalse(health.connect())
+
+        opened.assert_not_called()
@@ -0,0 +1,219 @@
+"""
+Tests for the database-backed job queue
+"""
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class TestJobQueue(TestCase):
+    """Test enqueueing, claiming and running jobs"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_stores_payload(self):
+        job = record.enqueue(value=3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.name, 'tests.record')
+        self.assertEqual(job.payload, {'value': 3})
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_claim_orders_by_priority_then_age(self):
+        low = jobs.enqueue('tests.record', {'value': 1})
+        high = jobs.enqueue('tests.record', {'value': 2}, priority=5)
+        later = jobs.enqueue('tests.record', {'value': 3})
+
+        claimed = jobs.claim(['default'], 2, 'w1')
+
+        self.assertEqual([job.id for job in claimed], [high.id, low.id])
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+        high.refresh_from_db()
+        self.assertEqual(high.status, Job.RUNNING)
+        self.assertEqual(high.locked_by, 'w1')
+        self.assertEqual(high.attempts, 1)
+
+    def test_claim_skips_future_and_other_queues(self):
+        jobs.enqueue('tests.record', {'value': 1},
+                     run_at=timezone.now() + timedelta(hours=1))
+        jobs.enqueue('tests.record', {'value': 2}, queue='mail')
+
+        self.assertEqual(jobs.claim(['default'], 10, 'w1'), [])
+
+    def test_successful_job_is_deleted(self):
+        record.enqueue(value=7)
+
+        processed = jobs.Worker().run(once=True)
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(calls, [7])
+        self.assertFalse(Job.objects.filter(name='tests.record').exists())
+
+    def test_worker_runs_start_hooks(self):
+        """Tests each start hook is called once, and a failing one does
+        not stop the worker.
+        """
+        def broken():
+            raise RuntimeError('boom')
+
+        hooks = [broken, lambda: calls.append('started')]
+        with patch.object(jobs, '_on_start', hooks), \
+                self.assertLogs('core.jobs', 'ERROR'):
+            jobs.Worker().run(once=True)
+
+        self.assertEqual(calls, ['started'])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = explode.enqueue()
+        [claimed] = jobs.claim(['default'], 1, 'w1')
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(jobs.execute(claimed))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+    def test_job_fails_after_max_attempts(self):
+        job = explode.enqueue()
+        for _ in range(2):
+            Job.objects.filter(id=job.id).update(run_at=timezone.now())
+            [claimed] = jobs.claim(['default'], 1, 'w1')
+            with self.assertLogs('core.jobs', 'WARNING'):
+                jobs.execute(claimed)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @patch('random.uniform', return_value=1.0)
+    def test_backoff_grows_and_is_capped(self, _):
+        self.assertEqual(jobs.backoff(1), jobs.BACKOFF_BASE)
+        self.assertEqual(jobs.backoff(3), jobs.BACKOFF_BASE * 4)
+        self.assertEqual(jobs.backoff(30), jobs.BACKOFF_MAX)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = record.enqueue(value=1)
+        jobs.claim(['default'], 1, 'w1')
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(jobs.requeue_stale(600), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_abandoned_job_out_of_attempts_fails(self):
+        """Tests a job that keeps crashing its worker fails once its
+        attempts are used up, instead of being requeued forever.
+        """
+        job = explode.enqueue()
+
+        def abandon():
+            jobs.claim(['default'], 1, 'w1')
+            Job.objects.filter(id=job.id).update(
+                locked_at=timezone.now() - timedelta(hours=1)
+            )
+
+        abandon()
+        self.assertEqual(jobs.requeue_stale(600), 1)
+        abandon()
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertEqual(jobs.requeue_stale(600), 0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Worker stopped', job.last_error)
+
+
+class TestConcurrentClaims(TransactionTestCase):
+    """Test workers on separate connections never claim the same job"""
+
+    def test_locked_jobs_are_skipped(self):
+        for value in range(4):
+            record.enqueue(value=value)
+        held = threading.Event()
+        release = threading.Event()
+        first = []
+
+        def hold_claim():
+            try:
+                with transaction.atomic():
+                    first.extend(
+                        Job.objects.select_for_update(skip_locked=True)
+                        .order_by('id')[:2]
+                    )
+                    held.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_claim)
+        thread.start()
+        held.wait(5)
+        try:
+            second = jobs.claim(['default'], 4, 'w2')
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(len(second), 2)
+        self.assertFalse({job.id for job in first}
+                         & {job.id for job in second})
+
+
+class TestStaleJobRecovery(TransactionTestCase):
+    """Test running workers pick up jobs abandoned by crashed ones"""
+
+    def test_running_worker_requeues_stale_job(self):
+        """Tests a job left running by a crashed worker is run by a
+        worker that was already polling.
+        """
+        calls.clear()
+        job = jobs.enqueue('tests.record', {'value': 9}, queue='recovery')
+        jobs.claim(['recovery'], 1, 'crashed')
+        worker = jobs.Worker(queues=['recovery'], poll_interval=0.05,
+                             lock_timeout=1)
+
+        def run():
+            try:
+                worker.run()
+            finally:
+                connection.close()
+
+        with patch.object(jobs, '_on_start', []):
+            thread = threading.Thread(target=run)
+            thread.start()
+            try:
+                deadline = time.monotonic() + 5
+                while not calls and time.monotonic() < deadline:
+                    time.sleep(0.05)
+            finally:
+                worker.stop()
+                thread.join()
+
+        self.assertEqual(calls, [9])
+        self.assertFalse(Job.objects.filter(id=job.id).exists())
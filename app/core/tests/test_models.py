@@ -2,10 +2,14 @@
 Tests for all the models used in the app.
 """
 from decimal import Decimal
+from importlib import import_module
 
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.contrib.auth.models import update_last_login
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
 
 from parameterized import parameterized
 
@@ -15,7 +19,8 @@ from core.models import (
     Unit,
     Amenity,
     Location,
-    Property
+    Property,
+    VersionConflict,
 )
 
 
@@ -57,6 +62,51 @@ class TestModels(TestCase):
         )
         self.assertEqual(user.email, expected)
 
+    def test_email_unique_in_any_case(self):
+        """Tests that emails differing only in case cannot both exist."""
+        get_user_model().objects.create_user(email='Test@example.com')
+
+        with self.assertRaises(IntegrityError):
+            get_user_model().objects.create_user(email='tEST@example.com')
+
+    def test_user_found_by_email_in_any_case(self):
+        """Tests that the natural key lookup ignores email case."""
+        user = get_user_model().objects.create_user(email='Test@example.com')
+
+        found = get_user_model().objects.get_by_natural_key(
+            'TEST@EXAMPLE.com'
+        )
+
+        self.assertEqual(found, user)
+
+    def test_migration_merges_duplicate_emails(self):
+        """Tests the migration folds case duplicates into the oldest user."""
+        User = get_user_model()
+        [constraint] = User._meta.constraints
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(User, constraint)
+        first = User.objects.create_user(email='test@example.com')
+        second = User.objects.create_user(email='TEST@example.com')
+        Token.objects.create(user=second)
+        country = Country.objects.create(name='Nigeria')
+        prop = Property.objects.create(
+            name='Golden Palace',
+            price_per_unit=Decimal('23.45'),
+            owner=second,
+            unit=Unit.objects.create(),
+            location=Location.objects.create(name='Lagos', country=country),
+            property_type=PropertyType.objects.create(name='Bungalow'),
+        )
+        migration = import_module('core.migrations.0013_user_email_ci_unique')
+
+        with connection.schema_editor() as editor:
+            migration.merge_duplicate_users(apps, editor)
+
+        self.assertEqual(list(User.objects.all()), [first])
+        prop.refresh_from_db()
+        self.assertEqual(prop.owner, first)
+        self.assertFalse(Token.objects.exists())
+
     def test_country_db_model(self):
         """Tests the Country DB model"""
         countries = ('Nigeria', 'Venezuela', 'Ghana')
@@ -174,3 +224,47 @@ class TestModels(TestCase):
 
         self.assertTrue(new_property.available)
         self.assertEqual(new_property.name, str(new_property))
+
+    def test_save_increments_version(self):
+        """Tests each update of a versioned row bumps its version."""
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testing123'
+        )
+        self.assertEqual(user.version, 1)
+
+        user.name = 'Renamed'
+        user.save(update_fields=['name'])
+
+        user.refresh_from_db()
+        self.assertEqual((user.name, user.version), ('Renamed', 2))
+
+    def test_stale_save_conflicts(self):
+        """Tests saving over a newer version raises VersionConflict."""
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testing123'
+        )
+        stale = get_user_model().objects.get(pk=user.pk)
+        user.name = 'First'
+        user.save()
+
+        stale.name = 'Second'
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            stale.save()
+
+        user.refresh_from_db()
+        self.assertEqual((user.name, user.version), ('First', 2))
+
+    def test_last_login_keeps_version(self):
+        """Tests recording a login leaves the version alone."""
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testing123'
+        )
+
+        update_last_login(None, user)
+
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+        self.assertEqual(user.version, 1)
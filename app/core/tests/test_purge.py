@@ -0,0 +1,170 @@
+"""
+Tests for the batched purge of rows and their dependents
+"""
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import seeding
+from core.models import (
+    Country,
+    Location,
+    Property,
+    PropertyCounter,
+    SavedSearch,
+    SearchMatch,
+)
+from core.purge import Purger, dependents
+
+
+class TestPurger(TestCase):
+    """Tests purging follows every cascade in bounded batches"""
+
+    def setUp(self):
+        reference = seeding.seed_reference_data(country_count=2,
+                                                locations_per_country=3)
+        self.owners = seeding.seed_users(3)
+        seeding.seed_properties(60, self.owners, reference, seed=1)
+        self.country, self.other = Country.objects.order_by('id')[:2]
+        prop = Property.objects.filter(
+            location__country=self.country
+        ).first()
+        search = SavedSearch.objects.create(owner=self.owners[1],
+                                            country=self.other)
+        SearchMatch.objects.create(search=search, property=prop)
+        PropertyCounter.objects.create(property=prop, views=3)
+        self.batches = []
+
+    def record(self, table, deleted):
+        self.batches.append((table, deleted))
+
+    def test_dependents(self):
+        """Tests the relations pointing at a model are all found."""
+        tables = {child._meta.db_table for child, _, _ in
+                  dependents(get_user_model())}
+
+        self.assertTrue({'core_property', 'core_savedsearch',
+                         'authtoken_token', 'core_user_groups'} <= tables)
+
+    def test_purge_country(self):
+        """Tests a country is purged with its locations, their
+        properties and what points at those.
+        """
+        kept = Property.objects.filter(location__country=self.other).count()
+        purger = Purger(batch_size=7, progress=self.record)
+
+        self.assertTrue(purger.purge(Country, [self.country.id]))
+
+        self.assertFalse(Country.objects.filter(pk=self.country.pk).exists())
+        self.assertFalse(Location.objects.filter(
+            country=self.country
+        ).exists())
+        self.assertEqual(Property.all_objects.count(), kept)
+        self.assertFalse(SearchMatch.objects.exists())
+        self.assertFalse(PropertyCounter.objects.exists())
+        self.assertTrue(SavedSearch.objects.exists())
+
+    def test_batches_bounded(self):
+        """Tests no transaction deletes more than a batch of rows."""
+        purger = Purger(batch_size=7, progress=self.record)
+        purger.purge(Country, [self.country.id])
+
+        previous = {}
+        for table, deleted in self.batches:
+            self.assertLessEqual(deleted - previous.get(table, 0), 7)
+            previous[table] = deleted
+        self.assertEqual(previous, purger.deleted)
+
+    def test_batches_walk_index_in_order(self):
+        """Tests each batch is read in key order from where the previous
+        one ended instead of scanning from the start again.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            Purger(batch_size=7).purge(Country, [self.country.id])
+
+        selects = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('SELECT "location_id", "id" '
+                                          'FROM "core_property"')]
+        self.assertGreater(len(selects), 1)
+        for sql in selects:
+            self.assertIn('ORDER BY "location_id", "id" LIMIT', sql)
+        self.assertNotIn('> (', selects[0])
+        self.assertIn('AND ("location_id", "id") > (', selects[1])
+
+    def test_purge_user(self):
+        """Tests a user is purged with their listings, searches and
+        token, leaving other users alone.
+        """
+        user = self.owners[1]
+        Token.objects.create(user=user)
+
+        Purger(batch_size=5).purge(get_user_model(), [user.id])
+
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        self.assertFalse(Property.all_objects.filter(owner=user).exists())
+        self.assertFalse(SavedSearch.objects.exists())
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+    def test_stopped_purge_resumes(self):
+        """Tests a stopped purge leaves whole batches and finishes when
+        run again.
+        """
+        purger = Purger(batch_size=5)
+        purger.progress = lambda table, deleted: purger.stop()
+
+        self.assertFalse(purger.purge(Country, [self.country.id]))
+        self.assertTrue(Country.objects.filter(pk=self.country.pk).exists())
+        self.assertEqual(len(purger.deleted), 1)
+        self.assertLessEqual(sum(purger.deleted.values()), 5)
+
+        self.assertTrue(Purger(batch_size=5).purge(Country,
+                                                   [self.country.id]))
+        self.assertFalse(Location.objects.filter(
+            country=self.country
+        ).exists())
+
+    def test_purge_command(self):
+        """Tests the command purges the given rows and reports them."""
+        out = StringIO()
+
+        call_command('purge', 'location', str(Location.objects.first().id),
+                     '--batch-size', '4', stdout=out)
+
+        self.assertIn('core_location: 1 rows deleted', out.getvalue())
+        self.assertIn('Purge complete', out.getvalue())
+        self.assertEqual(Location.objects.count(), 5)
+
+
+class TestPurgeTombstones(TransactionTestCase):
+    """Tests purged properties reach the readers of the change log"""
+
+    def test_purged_properties_in_change_feed(self):
+        """Tests properties purged with their location are sent to
+        syncing clients as tombstones.
+        """
+        reference = seeding.seed_reference_data(country_count=1,
+                                                locations_per_country=2)
+        owners = seeding.seed_users(1)
+        seeding.seed_properties(10, owners, reference, seed=1)
+        location = Location.objects.first()
+        purged = set(location.property_set.values_list('id', flat=True))
+        client = APIClient()
+        client.force_authenticate(owners[0])
+        cursor = client.get(reverse('listing:changes')).data['next_cursor']
+
+        Purger(batch_size=3).purge(Location, [location.id])
+        res = client.get(reverse('listing:changes'), {'cursor': cursor})
+
+        self.assertTrue(purged)
+        self.assertEqual({change['id'] for change in res.data['results']},
+                         purged)
+        self.assertTrue(all(change['deleted']
+                            for change in res.data['results']))
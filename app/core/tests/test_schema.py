@@ -0,0 +1,122 @@
+"""
+Tests for the precomputed OpenAPI schema.
+"""
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import schema
+
+
+class TestPrecomputedSchema(SimpleTestCase):
+    """Tests generating, storing and serving the schema"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.schema_dir = Path(tmp.name)
+        settings = override_settings(SCHEMA_DIR=self.schema_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        version = patch('core.schema.code_version', return_value='v1')
+        self.version = version.start()
+        self.addCleanup(version.stop)
+        schema._loaded.clear()
+        self.addCleanup(schema._loaded.clear)
+        self.factory = RequestFactory()
+        self.view = schema.PrecomputedSchemaView.as_view()
+
+    def test_schema_generated_once_per_version(self):
+        """Tests the schema is generated once and then read from disk."""
+        with patch('core.schema.generate_schema',
+                   return_value=b'{"openapi": "3.0.3"}') as generate:
+            schema.load_schema()
+            schema._loaded.clear()
+            schema.load_schema()
+
+            self.assertEqual(generate.call_count, 1)
+            self.assertTrue((self.schema_dir / 'openapi-v1.json').exists())
+            self.assertTrue(
+                (self.schema_dir / 'openapi-v1.json.gz').exists()
+            )
+
+            self.version.return_value = 'v2'
+            schema.load_schema()
+
+            self.assertEqual(generate.call_count, 2)
+
+    def test_serves_schema_with_etag(self):
+        """Tests the schema is served as JSON with an ETag."""
+        res = self.view(self.factory.get('/api/schema/'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('/api/listing/properties/', json.loads(res.content)[
+            'paths'
+        ])
+        self.assertTrue(res['ETag'])
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+
+    def test_serves_gzip_when_accepted(self):
+        """Tests clients accepting gzip get the precompressed schema."""
+        res = self.view(self.factory.get('/api/schema/',
+                                         HTTP_ACCEPT_ENCODING='gzip, br'))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'openapi', gzip.decompress(res.content))
+
+    def test_not_modified_for_matching_etag(self):
+        """Tests a client holding the current schema gets an empty 304."""
+        etag = self.view(self.factory.get('/api/schema/'))['ETag']
+        res = self.view(self.factory.get('/api/schema/',
+                                         HTTP_IF_NONE_MATCH=etag))
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+
+class TestSchemaVersion(SimpleTestCase):
+    """Tests the schema version is fixed at build time"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.schema_dir = Path(tmp.name)
+        settings = override_settings(SCHEMA_DIR=self.schema_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        env = patch.dict('os.environ', {'APP_VERSION': ''})
+        env.start()
+        self.addCleanup(env.stop)
+        schema.code_version.cache_clear()
+        self.addCleanup(schema.code_version.cache_clear)
+        schema._loaded.clear()
+        self.addCleanup(schema._loaded.clear)
+
+    def test_build_records_version(self):
+        """Tests the server reads the version the build recorded."""
+        with patch('core.schema.source_digest', return_value='abc123'), \
+                patch('core.schema.generate_schema', return_value=b'{}'):
+            call_command('build_schema', stdout=StringIO())
+
+        with patch('core.schema.source_digest') as digest, \
+                patch('core.schema.generate_schema') as generate:
+            self.assertEqual(schema.load_schema()[1], b'{}')
+
+            digest.assert_not_called()
+            generate.assert_not_called()
+        self.assertEqual(schema.code_version(), 'abc123')
+
+    def test_unbuilt_schema_kept_in_memory(self):
+        """Tests a server without a build neither hashes nor stores."""
+        with patch('core.schema.source_digest') as digest, \
+                patch('core.schema.generate_schema', return_value=b'{}'):
+            schema.load_schema()
+
+            digest.assert_not_called()
+        self.assertEqual(list(self.schema_dir.iterdir()), [])
@@ -0,0 +1,126 @@
+"""
+Tests for the token-bucket throttle stores
+"""
+import os
+import threading
+import unittest
+from unittest.mock import PropertyMock, patch
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.test import SimpleTestCase
+
+from core import throttling
+
+
+class TestGCRA(SimpleTestCase):
+    """Test the bucket arithmetic"""
+
+    def test_allows_burst_then_waits_for_refill(self):
+        tat, waits = None, []
+        for _ in range(4):
+            new_tat, wait = throttling.gcra(tat, 100.0, 10.0, 3)
+            waits.append(wait)
+            if not wait:
+                tat = new_tat
+
+        self.assertEqual(waits, [0, 0, 0, 10.0])
+        self.assertEqual(throttling.gcra(tat, 110.0, 10.0, 3)[1], 0)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('10/min'), (10, 60))
+        self.assertEqual(throttling.parse_rate('1000/day'), (1000, 86400))
+
+
+class TestLocalBucketStore(SimpleTestCase):
+    """Test the per-process store"""
+
+    @patch('time.monotonic', return_value=50.0)
+    def test_buckets_are_independent(self, _):
+        store = throttling.LocalBucketStore()
+
+        self.assertEqual(store.consume('a', 1.0, 1), 0)
+        self.assertGreater(store.consume('a', 1.0, 1), 0)
+        self.assertEqual(store.consume('b', 1.0, 1), 0)
+
+    @patch('time.monotonic')
+    def test_full_buckets_are_evicted(self, monotonic):
+        store = throttling.LocalBucketStore(size=2)
+        monotonic.return_value = 0.0
+        store.consume('a', 1.0, 1)
+        store.consume('b', 1.0, 1)
+        monotonic.return_value = 5.0
+        store.consume('c', 1.0, 1)
+        store.consume('d', 1.0, 1)
+        store.consume('e', 1.0, 1)
+
+        self.assertEqual(list(store._tats), ['d', 'e'])
+
+    @patch('time.monotonic', return_value=0.0)
+    def test_least_recently_refilled_dropped_at_capacity(self, _):
+        """Tests a full table drops only its least recently refilled
+        bucket.
+        """
+        store = throttling.LocalBucketStore(size=3)
+        for key in ('a', 'b', 'c', 'a', 'd'):
+            store.consume(key, 1.0, 5)
+
+        self.assertEqual(list(store._tats), ['c', 'a', 'd'])
+
+
+class TestCacheBucketStore(SimpleTestCase):
+    """Test the store shared through the Django cache"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_limits_across_store_instances(self):
+        first = throttling.CacheBucketStore()
+        second = throttling.CacheBucketStore()
+
+        self.assertEqual(first.consume('a', 60.0, 2), 0)
+        self.assertEqual(second.consume('a', 60.0, 2), 0)
+        self.assertGreater(first.consume('a', 60.0, 2), 0)
+
+    def test_concurrent_requests_spend_each_token_once(self):
+        """Tests a burst of concurrent requests from one client gets
+        exactly as many through as the bucket holds.
+        """
+        store = throttling.CacheBucketStore()
+        waits = []
+        start = threading.Barrier(8)
+
+        def consume():
+            start.wait()
+            waits.append(store.consume('a', 60.0, 5))
+
+        threads = [threading.Thread(target=consume) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(waits.count(0), 5)
+
+
+@unittest.skipUnless(os.environ.get('REDIS_URL'), 'REDIS_URL is not set')
+class TestRedisBucketStore(SimpleTestCase):
+    """Test the atomic update the store runs on Redis"""
+
+    def setUp(self):
+        self.cache = RedisCache(os.environ['REDIS_URL'], {})
+        self.cache.delete('throttle:a')
+        patcher = patch.object(throttling.CacheBucketStore, 'cache',
+                               new_callable=PropertyMock,
+                               return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_allows_burst_then_waits(self):
+        """Tests the script allows the burst, then returns the wait."""
+        store = throttling.CacheBucketStore()
+
+        waits = [store.consume('a', 60.0, 2) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 60.0, delta=1)
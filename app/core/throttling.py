@@ -0,0 +1,212 @@
+"""
+Token-bucket request throttling.
+
+Buckets are kept in the GCRA form: a single "theoretical arrival time"
+per client, from which the tokens left follow. A bucket whose time has
+passed is full and is dropped, so memory only grows with the clients
+currently being limited. The store is local to each process by default,
+or shared through a Django cache with THROTTLE['STORE'] = 'cache', as
+in the production settings: with several workers, local buckets let a
+client through once per worker.
+
+Anonymous clients are keyed by address as DRF's get_ident sees it, so
+REST_FRAMEWORK['NUM_PROXIES'] must match the proxies in front.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+# gcra() run by Redis on KEYS[1] with ARGV now, interval, burst,
+# returning the seconds to wait as a string: Redis truncates numbers
+# returned from Lua to integers.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allowed_at = tat - interval * (burst - 1)
+if allowed_at > now then
+    return tostring(allowed_at - now)
+end
+tat = tat + interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX',
+           math.ceil((tat - now) * 1000) + 1000)
+return '0'
+"""
+
+
+def parse_rate(rate):
+    """Turns '10/min' into (10 requests, 60 seconds)."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def gcra(tat, now, interval, burst):
+    """Applies one request to a bucket whose arrival time is `tat`.
+
+    Returns (new tat, 0) when allowed, or (tat, seconds to wait).
+    """
+    tat = max(tat or now, now)
+    allowed_at = tat - interval * (burst - 1)
+    if allowed_at > now:
+        return tat, allowed_at - now
+    return tat + interval, 0
+
+
+class LocalBucketStore:
+    """Per-process buckets, bounded to `size` limited clients.
+
+    Buckets are kept least recently refilled first, so full buckets and,
+    past `size`, the oldest ones are dropped from the front a few at a
+    time instead of scanning the table.
+    """
+
+    def __init__(self, size=100_000):
+        self.size = size
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, interval, burst):
+        now = time.monotonic()
+        with self._lock:
+            tat, wait = gcra(self._tats.get(key), now, interval, burst)
+            if not wait:
+                self._tats[key] = tat
+                self._tats.move_to_end(key)
+                self._evict(now)
+        return wait
+
+    def _evict(self, now):
+        """Drops full buckets, and while over `size` the least recently
+        refilled ones, from the front.
+        """
+        tats = self._tats
+        while tats:
+            tat = next(iter(tats.values()))
+            if tat > now and len(tats) <= self.size:
+                break
+            tats.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+class CacheBucketStore:
+    """Buckets shared by every process through a Django cache.
+
+    With Redis each update is a single script the server runs
+    atomically, so concurrent requests from one client cannot spend the
+    same token and none of them waits on a lock. Other caches get the
+    update under a lock of this process, which is only atomic for caches
+    local to it, such as LocMemCache.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def consume(self, key, interval, burst):
+        key = f'throttle:{key}'
+        cache = self.cache
+        if isinstance(cache, RedisCache):
+            return self._consume_redis(cache, key, interval, burst)
+        with self._lock:
+            now = time.time()
+            tat, wait = gcra(cache.get(key), now, interval, burst)
+            if not wait:
+                cache.set(key, tat, max(1, int(tat - now) + 1))
+            return wait
+
+    def _consume_redis(self, cache, key, interval, burst):
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(GCRA_SCRIPT)
+        return float(self._script(keys=[key],
+                                  args=[time.time(), interval, burst],
+                                  client=client))
+
+
+def build_store():
+    config = settings.THROTTLE
+    if config['STORE'] == 'cache':
+        return CacheBucketStore(config['CACHE_ALIAS'])
+    return LocalBucketStore(config['LOCAL_SIZE'])
+
+
+bucket_store = build_store()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Allows bursts of up to N requests, refilled at N per period.
+
+    Rates come from DEFAULT_THROTTLE_RATES[scope] at request time; a
+    scope without a rate is not limited.
+    """
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_key(self, request, view):
+        """Identifies the client, or returns None to skip throttling."""
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) \
+            if scope else None
+        key = self.get_key(request, view) if rate else None
+        if key is None:
+            return True
+        num, period = parse_rate(rate)
+        self.wait_time = bucket_store.consume(f'{scope}:{key}',
+                                              period / num, num)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    """Limits anonymous clients by IP address."""
+    scope = 'anon'
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_key(request, view)
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """Limits authenticated clients by user."""
+    scope = 'user'
+
+    def get_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return super().get_key(request, view)
+
+
+class ScopedBucketThrottle(TokenBucketThrottle):
+    """Limits the views that set a `throttle_scope`, by user or IP."""
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None)
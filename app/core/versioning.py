@@ -0,0 +1,84 @@
+"""
+Optimistic concurrency for API updates of versioned models.
+
+Responses carry the row version in the body and as an ETag. A client
+sending it back in If-Match gets a 412 instead of overwriting changes
+made since it read the row. Updates write only the changed columns, in
+a single UPDATE conditional on the version.
+"""
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from core.models import VersionConflict
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('The resource was modified by another request.')
+    default_code = 'precondition_failed'
+
+
+def if_match_version(request):
+    """The version a request's If-Match header expects, if any."""
+    header = request.headers.get('If-Match', '').strip() if request else ''
+    if not header or header == '*':
+        return None
+    try:
+        return int(header.removeprefix('W/').strip('"'))
+    except ValueError:
+        raise serializers.ValidationError(
+            {'If-Match': _('Expected a version number.')}
+        )
+
+
+class VersionedModelSerializer(serializers.ModelSerializer):
+    """Updates a VersionedModel with a single conditional UPDATE of the
+    fields that changed.
+    """
+    version = serializers.IntegerField(read_only=True)
+
+    def apply(self, instance, validated_data):
+        """Copies the validated changes onto the instance."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+
+    def update(self, instance, validated_data):
+        serializers.raise_errors_on_nested_writes('update', self,
+                                                  validated_data)
+        expected = if_match_version(self.context.get('request'))
+        if expected is not None and expected != instance.version:
+            raise PreconditionFailed()
+
+        fields = instance._meta.concrete_fields
+        before = {field.attname: getattr(instance, field.attname)
+                  for field in fields}
+        self.apply(instance, validated_data)
+        changed = [
+            field.name for field in fields
+            if getattr(instance, field.attname) != before[field.attname]
+        ]
+        if changed:
+            changed += [field.name for field in fields
+                        if getattr(field, 'auto_now', False)]
+            try:
+                with transaction.atomic():
+                    instance.save(update_fields=changed)
+            except VersionConflict:
+                raise PreconditionFailed()
+        return instance
+
+
+class VersionETagMixin:
+    """Adds the version of the returned object as the ETag header."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        data = getattr(response, 'data', None)
+        if isinstance(data, dict) and 'version' in data \
+                and status.is_success(response.status_code):
+            response['ETag'] = f'"{data["version"]}"'
+        return response
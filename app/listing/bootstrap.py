@@ -0,0 +1,95 @@
+"""
+Precomputed bundle of all the reference data clients load on startup.
+
+The bundle is rebuilt only after reference data changes: writes bump a
+generation counter in the shared cache, and each generation is rendered,
+hashed and compressed once. A bump only reaches the processes sharing
+that cache, so bundles are also rebuilt after MAX_AGE seconds; with a
+per-process cache, changes made by other processes show within that
+long.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+
+from rest_framework.renderers import JSONRenderer
+
+from core.http import compress
+from core.models import (
+    Amenity,
+    Country,
+    Location,
+    PropertyType,
+    Unit,
+)
+from listing.serializers import (
+    AmenitySerializer,
+    CountrySerializer,
+    LocationSerializer,
+    PropertyTypeSerializer,
+)
+
+GENERATION_KEY = 'bootstrap:gen'
+MAX_AGE = 300
+
+_lock = threading.Lock()
+# The generation last loaded by this process: (generation, bundle,
+# time it expires at).
+_loaded = (None, None, 0.0)
+
+
+def build_payload():
+    """Collects the reference data as one JSON document."""
+    return JSONRenderer().render({
+        'property_types': PropertyTypeSerializer(
+            PropertyType.objects.order_by('id'), many=True
+        ).data,
+        'countries': CountrySerializer(
+            Country.objects.order_by('id'), many=True
+        ).data,
+        'locations': LocationSerializer(
+            Location.objects.order_by('id'), many=True
+        ).data,
+        'amenities': AmenitySerializer(
+            Amenity.objects.order_by('id'), many=True
+        ).data,
+        'units': [
+            {'name': name, 'label': label}
+            for name, label in Unit.UNIT_CHOICES
+        ],
+    })
+
+
+def load_bundle():
+    """Returns (hash, body, gzipped body) for the current reference data.
+
+    Each process keeps the latest generation in memory; other processes
+    pick it up from the shared cache instead of rebuilding it.
+    """
+    global _loaded
+    generation = cache.get(GENERATION_KEY, 0)
+    loaded, bundle, expires = _loaded
+    if loaded == generation and time.time() < expires:
+        return bundle
+    with _lock:
+        key = f'bootstrap:bundle:{generation}'
+        entry = cache.get(key)
+        if entry is None:
+            body = build_payload()
+            entry = ((hashlib.sha256(body).hexdigest()[:32], body,
+                      compress(body)), time.time() + MAX_AGE)
+            cache.set(key, entry, MAX_AGE)
+        bundle, expires = entry
+        _loaded = (generation, bundle, expires)
+    return bundle
+
+
+def invalidate():
+    """Marks the bundle out of date after reference data changes."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        if not cache.add(GENERATION_KEY, 1, None):
+            cache.incr(GENERATION_KEY)
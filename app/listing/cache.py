@@ -0,0 +1,267 @@
+"""
+Two-tier response cache for property listings.
+
+Entries live in a per-process LRU in front of the shared Django cache.
+Each key embeds generation counters for the country and property type a
+search is scoped to, so a Property write only invalidates the searches
+it can affect. Concurrent misses for the same key are collapsed into one
+computation, and stale entries are served while a single background
+refresh runs.
+
+The shared cache must be shared by every worker: each process keeps its
+own LRU and generation memo, and only bumping the shared counters
+reaches the others. A process reads the counters at most once per
+GENERATION_TTL seconds, so a write elsewhere shows in its responses
+within that long.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+EPOCH_KEY = 'property-cache:epoch'
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded, per-process map of recent entries."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def scope_key(country=None, property_type=None):
+    """Generation counter key for the searches within a scope."""
+    scope = f'{(country or "*").title()}|{(property_type or "*").title()}'
+    return f'property-cache:gen:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+
+def write_scopes(country, property_type):
+    """Every scope a write to a property in (country, type) can affect."""
+    return [
+        scope_key(),
+        scope_key(country=country),
+        scope_key(property_type=property_type),
+        scope_key(country, property_type),
+    ]
+
+
+class ResponseCache:
+    """Caches list responses keyed on normalized query parameters."""
+
+    FILTERS = ('country', 'property_type', 'available', 'min_price',
+               'max_price')
+    PAGING = ('page', 'page_size')
+
+    def __init__(self, alias='default', timeout=30, stale_timeout=300,
+                 local_size=1024, lock_timeout=5, generation_ttl=1):
+        self.alias = alias
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.generation_ttl = generation_ttl
+        self.local = LocalLRU(local_size)
+        self._generations = LocalLRU(local_size)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def normalize(self, query_params):
+        """Canonical form of the filters and page a list request was
+        made with.
+        """
+        params = {}
+        if (query_params.get('page') or '').strip():
+            for name in self.PAGING:
+                value = (query_params.get(name) or '').strip()
+                if value:
+                    params[name] = value
+        for name in self.FILTERS:
+            value = query_params.get(name)
+            if value is None or not value.strip():
+                continue
+            value = value.strip()
+            if name in ('country', 'property_type'):
+                value = value.title()
+            elif name == 'available':
+                value = str(value.lower() in ('1', 'true', 'yes'))
+            else:
+                try:
+                    value = str(Decimal(value).normalize())
+                except InvalidOperation:
+                    continue
+            params[name] = value
+        return params
+
+    def key(self, params):
+        """Builds the entry key from the params and current generations."""
+        scope = scope_key(params.get('country'), params.get('property_type'))
+        generations = self.generations([EPOCH_KEY, scope])
+        raw = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+        digest = hashlib.sha256(raw.encode()).hexdigest()[:32]
+        return (
+            f'property-cache:list:{digest}:'
+            f'{generations.get(EPOCH_KEY, 0)}:{generations.get(scope, 0)}'
+        )
+
+    def generations(self, keys):
+        """Current values of the generation counters, read from the
+        shared cache only once the values remembered have expired.
+        """
+        now = time.monotonic()
+        found, missing = {}, []
+        for key in keys:
+            memo = self._generations.get(key)
+            if memo is not None and memo[1] > now:
+                found[key] = memo[0]
+            else:
+                missing.append(key)
+        if missing:
+            fetched = self.shared.get_many(missing)
+            for key in missing:
+                found[key] = fetched.get(key, 0)
+                self._generations.set(
+                    key, (found[key], now + self.generation_ttl)
+                )
+        return found
+
+    def get_or_compute(self, params, compute):
+        """Returns the cached response data for `params`, calling
+        `compute()` at most once per process on a miss.
+        """
+        key = self.key(params)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+
+        if entry is not None:
+            data, fresh_until = entry
+            if time.time() >= fresh_until:
+                self._refresh_in_background(key, compute)
+            return data
+        return self._single_flight(key, compute)
+
+    def _store(self, key, data):
+        entry = (data, time.time() + self.timeout)
+        self.shared.set(key, entry, self.timeout + self.stale_timeout)
+        self.local.set(key, entry)
+        return data
+
+    def _single_flight(self, key, compute):
+        """Computes a missing entry once, however many threads and
+        processes ask for it at the same time.
+        """
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait(self.lock_timeout)
+            entry = self.local.get(key)
+            return entry[0] if entry is not None else compute()
+
+        try:
+            lock, token = f'{key}:lock', uuid.uuid4().hex
+            acquired = self.shared.add(lock, token, self.lock_timeout)
+            if not acquired:
+                entry = self._wait_for(key)
+                if entry is not None:
+                    self.local.set(key, entry)
+                    return entry[0]
+            try:
+                return self._store(key, compute())
+            finally:
+                # Once the lock has expired another process may hold it.
+                if acquired and self.shared.get(lock) == token:
+                    self.shared.delete(lock)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            event.set()
+
+    def _wait_for(self, key):
+        """Polls the shared cache while another process computes `key`."""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            entry = self.shared.get(key)
+            if entry is not None:
+                return entry
+            time.sleep(0.05)
+        return None
+
+    def _refresh_in_background(self, key, compute):
+        """Starts a refresh for a stale entry unless one is running."""
+        with self._inflight_lock:
+            if key in self._inflight:
+                return
+            event = self._inflight[key] = threading.Event()
+
+        def refresh():
+            try:
+                self._store(key, compute())
+            finally:
+                connection.close()
+                with self._inflight_lock:
+                    del self._inflight[key]
+                event.set()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, country, property_type):
+        """Expires every search a property in (country, type) shows in."""
+        for scope in write_scopes(country, property_type):
+            self._bump(scope)
+
+    def invalidate_all(self):
+        """Expires every cached search, e.g. after bulk loads."""
+        self._bump(EPOCH_KEY)
+
+    def _bump(self, key):
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            if not self.shared.add(key, 1, None):
+                self.shared.incr(key)
+        self._generations.clear()
+
+    def clear(self):
+        """Drops every entry held by this process and expires the rest."""
+        self.local.clear()
+        self.invalidate_all()
+
+
+property_cache = ResponseCache(**{
+    key.lower(): value for key, value in settings.PROPERTY_CACHE.items()
+})
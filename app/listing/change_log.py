@@ -0,0 +1,65 @@
+"""
+Retention of the property change log.
+
+The triggers append a row for every write, so the log is pruned from
+its oldest end once rows are older than the retention period, a batch
+at a time. ChangeLogHorizon keeps the position of the last row pruned:
+a sync cursor before it may have missed changes, and its client has to
+reload the listings and continue from the head of the log.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ChangeLogHorizon, PropertyChange
+
+BATCH_SIZE = 10_000
+
+
+def head():
+    """Position of the last change the feed serves now, or of the
+    horizon while there is none.
+    """
+    return PropertyChange.objects.settled().values_list(
+        'txid', 'id'
+    ).last() or ChangeLogHorizon.position()
+
+
+def is_stale(position):
+    """Whether a feed position precedes pruned changes."""
+    horizon = ChangeLogHorizon.position()
+    return horizon is not None and tuple(position) < horizon
+
+
+def prune(retention_days, now=None, batch_size=BATCH_SIZE):
+    """Deletes the oldest settled changes made more than
+    `retention_days` ago, returning how many were deleted.
+
+    Rows go in feed order and pruning stops at the first one inside the
+    retention period, so every row before the horizon is gone.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        rows = PropertyChange.objects.settled().values_list(
+            'txid', 'id', 'changed_at'
+        )[:batch_size]
+        expired = []
+        for row in rows:
+            if row[2] >= cutoff:
+                break
+            expired.append(row)
+        if not expired:
+            return deleted
+        txid, pk, _ = expired[-1]
+        with transaction.atomic():
+            ChangeLogHorizon.objects.update_or_create(pk=1, defaults={
+                'txid': txid, 'change_id': pk, 'pruned_at': now,
+            })
+            deleted += PropertyChange.objects.filter(
+                id__in=[row[1] for row in expired]
+            ).delete()[0]
+        if len(expired) < batch_size:
+            return deleted
@@ -0,0 +1,173 @@
+"""
+Buffered view and impression counters for properties.
+
+An UPDATE per property view would queue every reader of a popular
+listing behind the same row lock. Each process instead adds up its
+counts in memory and writes them, every COUNTERS['FLUSH_INTERVAL']
+seconds or once COUNTERS['MAX_PENDING'] properties are waiting, with a
+single statement per batch. Server workers also run a flusher thread,
+so counts are saved on time while no views come in to trigger a flush.
+A crashed process loses at most the counts it gathered since its last
+flush, and a failed flush drops its batch rather than retrying and
+holding more.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+# Properties per statement, within the bind parameter limit.
+BATCH_SIZE = 5000
+
+FLUSH_SQL = """
+INSERT INTO core_propertycounter AS counter
+    (property_id, views, impressions, updated_at)
+VALUES {rows}
+ON CONFLICT (property_id) DO UPDATE SET
+    views = counter.views + EXCLUDED.views,
+    impressions = counter.impressions + EXCLUDED.impressions,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+class CounterBuffer:
+    """Per-process totals of the views and impressions not yet saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.clear()
+
+    def clear(self):
+        """Forgets the counts not yet flushed."""
+        with self._lock:
+            self.pending = {}
+            self.flushed_at = time.monotonic()
+
+    def _adopt(self):
+        """Takes ownership of the buffer in this process; called with the
+        lock held.
+        """
+        if self._pid != os.getpid():
+            # Counts inherited from a parent process are its to save.
+            if self._pid is None:
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+            self.pending = {}
+
+    def add(self, prop_ids, views=0, impressions=0):
+        """Counts a view and/or impression of each of `prop_ids`, flushing
+        when the interval has passed or the buffer is full.
+        """
+        config = settings.COUNTERS
+        with self._lock:
+            self._adopt()
+            pending = self.pending
+            for prop_id in prop_ids:
+                counts = pending.get(prop_id)
+                if counts is None:
+                    pending[prop_id] = [views, impressions]
+                else:
+                    counts[0] += views
+                    counts[1] += impressions
+            due = len(pending) >= config['MAX_PENDING'] \
+                or time.monotonic() - self.flushed_at \
+                >= config['FLUSH_INTERVAL']
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Saves the pending counts, returning how many properties they
+        covered.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        # Sorted, so concurrent flushes lock rows in the same order.
+        rows = sorted((prop_id, views, impressions)
+                      for prop_id, (views, impressions) in pending.items())
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for start in range(0, len(rows), BATCH_SIZE):
+                    batch = rows[start:start + BATCH_SIZE]
+                    cursor.execute(
+                        FLUSH_SQL.format(
+                            rows=', '.join(['(%s, %s, %s, now())']
+                                           * len(batch))
+                        ),
+                        [value for row in batch for value in row]
+                    )
+        except DatabaseError:
+            logger.warning('Dropped the counts of %d properties',
+                           len(rows), exc_info=True)
+            return 0
+        return len(rows)
+
+    def start(self):
+        """Starts the thread flushing every FLUSH_INTERVAL seconds, unless
+        this process runs it already. Threads do not survive a fork, so
+        each worker starts its own.
+        """
+        with self._lock:
+            self._adopt()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._flush_forever,
+                                            args=(self._stopping,),
+                                            name='counters-flusher',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the flusher thread, without flushing."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _flush_forever(self, stopping):
+        try:
+            while True:
+                with self._lock:
+                    due_at = self.flushed_at \
+                        + settings.COUNTERS['FLUSH_INTERVAL']
+                if stopping.wait(max(due_at - time.monotonic(), 0)):
+                    return
+                with self._lock:
+                    due = time.monotonic() - self.flushed_at \
+                        >= settings.COUNTERS['FLUSH_INTERVAL']
+                if due:
+                    # Recycles the connection the way a request does.
+                    close_old_connections()
+                    try:
+                        self.flush()
+                    except Exception:
+                        logger.exception('Counter flush failed')
+        finally:
+            connection.close()
+
+
+counters = CounterBuffer()
+
+
+def record_view(prop_id):
+    counters.add([prop_id], views=1)
+
+
+def record_impressions(prop_ids):
+    counters.add(prop_ids, impressions=1)
@@ -0,0 +1,173 @@
+"""
+Price and availability history of properties.
+
+Triggers on core_property append a row to core_propertyhistory whenever
+a statement inserts properties or changes their price or availability,
+all the rows of a statement in one INSERT; the write path never waits
+on an extra round trip. The table is partitioned by month: partitions
+are created ahead of time by the job worker, and months past the
+retention period are dropped whole, which is as cheap as dropping a
+table. Rows keep the location and unit they were recorded with, so
+history outlives purged properties.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from core.models import PropertyHistory
+
+logger = logging.getLogger(__name__)
+
+TABLE = PropertyHistory._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+BUCKETS = ('day', 'week', 'month')
+
+
+def month_start(day, offset=0):
+    """The first day of the month `offset` months after `day`'s."""
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partitions():
+    """Maps the first day of each monthly partition to its table name."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname LIKE %s
+            """,
+            [TABLE, f'{TABLE}_y%']
+        )
+        names = [name for name, in cursor.fetchall()]
+    return {
+        date(int(name[-7:-3]), int(name[-2:]), 1): name
+        for name in names
+    }
+
+
+def create_partitions(months_ahead, today=None):
+    """Creates the partitions from this month to `months_ahead` months
+    on, returning the names of those created.
+    """
+    first = month_start(today or timezone.now().date())
+    existing = partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = month_start(first, offset)
+        if month not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+    return created
+
+
+def create_partition(month):
+    """Creates the partition of `month`.
+
+    Rows of that month written while it had no partition sit in the
+    default one, and Postgres refuses to attach a partition whose rows
+    the default partition holds: they are moved into the new table
+    first, in the same transaction.
+    """
+    name = partition_name(month)
+    # DDL takes no parameters; dates format safely.
+    bounds = f"FROM ('{month}') TO ('{month_start(month, 1)}')"
+    columns = ', '.join(
+        field.column for field in PropertyHistory._meta.concrete_fields
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)'
+        )
+        # Attaching locks the default partition anyway; taking the lock
+        # first keeps writers from adding rows of the month meanwhile.
+        cursor.execute(
+            f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE'
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f"WHERE changed_at >= '{month}' "
+            f"AND changed_at < '{month_start(month, 1)}' "
+            f'RETURNING {columns}) '
+            f'INSERT INTO {name} ({columns}) SELECT {columns} FROM moved'
+        )
+        if cursor.rowcount:
+            logger.warning('Moved %d rows from %s to %s', cursor.rowcount,
+                           DEFAULT_PARTITION, name)
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+            f'FOR VALUES {bounds}'
+        )
+
+
+def drop_partitions(retention_months, today=None):
+    """Drops the partitions of months wholly older than
+    `retention_months` months, returning their names.
+    """
+    cutoff = month_start(today or timezone.now().date(), -retention_months)
+    dropped = []
+    for month, name in sorted(partitions().items()):
+        if month >= cutoff:
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+        dropped.append(name)
+    return dropped
+
+
+def period(since=None, until=None, default_days=365):
+    """Bounds of a history query, the last `default_days` by default,
+    as datetimes so partitions outside them are skipped.
+    """
+    until = until or timezone.now()
+    since = since or until - timedelta(days=default_days)
+    if isinstance(since, date) and not isinstance(since, datetime):
+        since = timezone.make_aware(datetime.combine(since, time.min))
+    if isinstance(until, date) and not isinstance(until, datetime):
+        until = timezone.make_aware(datetime.combine(until, time.max))
+    return since, until
+
+
+def for_property(prop_id, since=None, until=None):
+    """The changes of one property within the period, oldest first."""
+    since, until = period(since, until)
+    return PropertyHistory.objects.filter(
+        property_id=prop_id,
+        changed_at__gte=since,
+        changed_at__lte=until,
+    ).order_by('changed_at', 'id')
+
+
+def for_location(location_id, bucket='month', since=None, until=None):
+    """Prices recorded at a location per time bucket and unit: the
+    number of changes, how many left the property available, and the
+    lowest, average and highest price.
+    """
+    since, until = period(since, until)
+    return PropertyHistory.objects.filter(
+        location_id=location_id,
+        changed_at__gte=since,
+        changed_at__lte=until,
+    ).annotate(
+        bucket=Trunc('changed_at', bucket),
+    ).values(
+        'bucket', unit_name=F('unit__name'),
+    ).annotate(
+        changes=Count('id'),
+        min_price=Min('price_per_unit'),
+        avg_price=Avg('price_per_unit'),
+        max_price=Max('price_per_unit'),
+        available_changes=Count('id', filter=Q(available=True)),
+    ).order_by('bucket', 'unit_name')
@@ -0,0 +1,191 @@
+"""
+Property photo storage.
+
+Uploads are streamed to a temporary file in fixed-size chunks, hashed on
+the way, then moved into place under the SHA-256 of their content, so
+memory use does not grow with the photo and a photo posted on several
+listings is stored once. Stored files never change: downloads are
+cached for good and validated by their hash, and are handed to the
+front proxy when PHOTOS['ACCEL_REDIRECT'] is set.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import (
+    SkipFile,
+    TemporaryFileUploadHandler,
+)
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+CHUNK_SIZE = 64 * 2 ** 10
+# A year, the longest lifetime caches are expected to honour.
+MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('The photo is too large.')
+    default_code = 'payload_too_large'
+
+
+def sniff(head):
+    """The image type the first bytes of a file belong to, if any."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to a temporary file, hashing them and checking
+    their type and size as the chunks arrive.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.content_type = sniff(raw_data)
+            if self.content_type is None:
+                self.error = 'type'
+                raise SkipFile()
+        self.size += len(raw_data)
+        if self.size > settings.PHOTOS['MAX_SIZE']:
+            self.error = 'size'
+            raise SkipFile()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.digest.hexdigest()
+        upload.content_type = self.content_type
+        return upload
+
+
+def photo_path(digest):
+    """Where the photo with SHA-256 `digest` is stored."""
+    return settings.PHOTOS['ROOT'] / digest[:2] / digest[2:4] / digest
+
+
+def store(upload):
+    """Moves an uploaded file into place under its hash, unless the same
+    content is already stored. Returns whether it was stored now.
+    """
+    path = photo_path(upload.sha256)
+    if path.exists():
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Moved next to the target first, so the file appears complete.
+    part = path.with_name(f'{path.name}.{uuid.uuid4().hex}.part')
+    file_move_safe(upload.temporary_file_path(), part)
+    os.chmod(part, 0o644)
+    os.replace(part, path)
+    return True
+
+
+def parse_range(header, size):
+    """The (start, end) byte span of a single-range Range header, None to
+    send the whole file, or False when it cannot be satisfied.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return False
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > end:
+        return False
+    return start, end
+
+
+def read_span(path, start, length):
+    """Yields `length` bytes of a file from `start`, a chunk at a time."""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def photo_response(request, photo):
+    """Serves a stored photo, honouring If-None-Match, Range and
+    If-Range.
+    """
+    etag = f'"{photo.sha256}"'
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in if_none_match or if_none_match.strip() == '*':
+        response = HttpResponseNotModified()
+    elif settings.PHOTOS['ACCEL_REDIRECT']:
+        response = HttpResponse(content_type=photo.content_type)
+        relative = photo_path(photo.sha256).relative_to(
+            settings.PHOTOS['ROOT']
+        )
+        response['X-Accel-Redirect'] = \
+            f"{settings.PHOTOS['ACCEL_REDIRECT'].rstrip('/')}/{relative}"
+    else:
+        response = file_response(request, photo, etag)
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, photo, etag):
+    path = photo_path(photo.sha256)
+    if not path.exists():
+        raise Http404('Photo file is missing.')
+    span = None
+    if request.headers.get('If-Range', etag) == etag:
+        span = parse_range(request.headers.get('Range'), photo.size)
+    if span is False:
+        response = HttpResponse(
+            status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        response['Content-Range'] = f'bytes */{photo.size}'
+        return response
+    if span is None:
+        # Sent with the server's file wrapper, e.g. sendfile, when it has
+        # one.
+        return FileResponse(open(path, 'rb'),
+                            content_type=photo.content_type)
+    start, end = span
+    response = StreamingHttpResponse(
+        read_span(path, start, end - start + 1),
+        status=status.HTTP_206_PARTIAL_CONTENT,
+        content_type=photo.content_type,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{photo.size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
@@ -0,0 +1,33 @@
+"""
+Market price percentiles, precomputed in the core_pricestats
+materialized view so requests never aggregate core_property.
+"""
+from django.db import connection
+
+from core.models import PriceStats
+
+
+def refresh(concurrently=True):
+    """Recomputes the price statistics.
+
+    A concurrent refresh keeps the current rows readable while the new
+    ones are computed, at the cost of a slower refresh.
+    """
+    mode = 'CONCURRENTLY ' if concurrently else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'REFRESH MATERIALIZED VIEW {mode}{PriceStats._meta.db_table}'
+        )
+
+
+def for_market(country=None, location=None, property_type=None, unit=None):
+    """Statistics for exactly the given scope, one row per unit unless
+    `unit` is given. A location name may match one location per country.
+    """
+    queryset = PriceStats.objects.filter(location=location,
+                                         property_type=property_type)
+    if country is not None or location is None:
+        queryset = queryset.filter(country=country)
+    if unit is not None:
+        queryset = queryset.filter(unit=unit)
+    return queryset.order_by('unit', 'country', 'location_id')
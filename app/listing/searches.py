@@ -0,0 +1,70 @@
+"""
+Matching new listings against saved searches.
+
+Saved searches are indexed by their criteria: (country, property type,
+minimum price), with "any" stored as NULL. Each new listing therefore
+only looks up the four postings its own country and type can match, with
+or without either filter, and reads from each only the searches whose
+minimum price it meets. The work grows with the matches found rather
+than with the number of saved searches, and a whole batch of listings is
+matched by one statement.
+"""
+from django.db import connection, transaction
+
+from core.models import Property
+
+BATCH_SIZE = 1000
+
+_CANDIDATES = """
+    SELECT id, owner_id, max_price FROM core_savedsearch
+    WHERE country_id {country} AND property_type_id {property_type}
+        AND min_price <= p.price_per_unit
+"""
+
+MATCH_SQL = """
+INSERT INTO core_searchmatch (search_id, property_id, created_on)
+SELECT s.id, p.id, now()
+FROM core_property p
+JOIN core_location l ON l.id = p.location_id
+CROSS JOIN LATERAL ({candidates}) s
+WHERE p.id = ANY(%s)
+    AND p.deleted_at IS NULL
+    AND s.owner_id <> p.owner_id
+    AND (s.max_price IS NULL OR p.price_per_unit <= s.max_price)
+ON CONFLICT (search_id, property_id) DO NOTHING
+""".format(candidates=' UNION ALL '.join(
+    _CANDIDATES.format(country=country, property_type=property_type)
+    for country in ('= l.country_id', 'IS NULL')
+    for property_type in ('= p.property_type_id', 'IS NULL')
+))
+
+
+def match_batch(limit=BATCH_SIZE):
+    """Matches up to `limit` listings not matched yet, skipping those
+    another worker is matching. Returns (listings, matches recorded).
+    """
+    with transaction.atomic():
+        ids = list(
+            Property.all_objects.filter(search_matched=False)
+            .order_by('id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return 0, 0
+        with connection.cursor() as cursor:
+            cursor.execute(MATCH_SQL, [ids])
+            matches = cursor.rowcount
+        # A plain UPDATE: matching is not an edit of the listing.
+        Property.all_objects.filter(id__in=ids).update(search_matched=True)
+    return len(ids), matches
+
+
+def match_pending(limit=BATCH_SIZE):
+    """Matches every listing not matched yet, a batch at a time."""
+    total = 0
+    while True:
+        listings, matches = match_batch(limit)
+        if not listings:
+            return total
+        total += matches
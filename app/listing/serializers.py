@@ -1,11 +1,24 @@
 """
 Contains all the serializers used for the project.
 """
+from collections.abc import Mapping
+
+from django.urls import reverse
+from django.utils.translation import gettext as _
+
 from rest_framework import serializers
 
+from core.versioning import VersionedModelSerializer
 from core.models import (
-    Unit,
+    Country,
+    Location,
+    PriceStats,
     Property,
+    PropertyHistory,
+    PropertyPhoto,
+    PropertyType,
+    SavedSearch,
+    Unit,
 )
 
 
@@ -44,26 +57,199 @@ class PropertySerializer(serializers.ModelSerializer):
                   'property_type']
 
 
-class PropertyDetailSerializer(PropertySerializer):
+class PropertyRankingSerializer(PropertySerializer):
+    """Serializes a property with its number of views."""
+    views = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Property
+        fields = PropertySerializer.Meta.fields + ['views']
+
+
+class PropertyDetailSerializer(VersionedModelSerializer, PropertySerializer):
     """Serializes more details for a property."""
-    country = CountrySerializer()
+    country = CountrySerializer(write_only=True, required=False)
     location = LocationSerializer()
     unit = UnitSerializer()
 
+    NAMED_FIELDS = ('property_type', 'country', 'location', 'unit')
+
     class Meta:
-        fields = PropertySerializer.Meta.fields + ['country', 'location',
-                                                   'unit']
-        extra_kwargs = {
-            'country': {
-                'write_only': True,
-                'required': False,
-            },
-        }
+        model = Property
+        fields = PropertySerializer.Meta.fields + ['description', 'country',
+                                                   'location', 'unit',
+                                                   'version']
+
+    def to_internal_value(self, data):
+        """Allows related objects to be given by plain name."""
+        if isinstance(data, Mapping):
+            data = dict(data.items())
+            for field in self.NAMED_FIELDS:
+                if isinstance(data.get(field), str):
+                    data[field] = {'name': data[field]}
+        return super().to_internal_value(data)
+
+    def _resolve_related(self, validated_data, instance=None):
+        """Swaps the nested names for the related model instances."""
+        country_data = validated_data.pop('country', None)
+        if 'property_type' in validated_data:
+            validated_data['property_type'], _ = \
+                PropertyType.objects.get_or_create(
+                    **validated_data['property_type']
+                )
+        if 'unit' in validated_data:
+            name = validated_data['unit']['name']
+            validated_data['unit'] = (
+                Unit.objects.filter(name=name).first()
+                or Unit.objects.create(name=name)
+            )
+        if 'location' in validated_data:
+            name = validated_data['location']['name']
+            if country_data is not None:
+                country, _ = Country.objects.get_or_create(**country_data)
+            elif instance is not None:
+                country = instance.location.country
+            else:
+                location = Location.objects.filter(name=name).first()
+                if location is None:
+                    raise serializers.ValidationError(
+                        {'country': 'Required for a new location.'}
+                    )
+                country = location.country
+            validated_data['location'], _ = Location.objects.get_or_create(
+                name=name,
+                country=country
+            )
+        return validated_data
 
     def create(self, validated_data):
         """Creates an instance of the Property from serializer"""
-        # unit_str = validated_data.pop('unit')
-        # type_str = validated_data.pop('property_type')
-        # country_str = validated_data.pop('country')
-        # location_str = validated_data.pop('location')
-        pass
+        return super().create(self._resolve_related(validated_data))
+
+    def update(self, instance, validated_data):
+        """Updates an instance of the Property from serializer"""
+        return super().update(
+            instance,
+            self._resolve_related(validated_data, instance)
+        )
+
+
+class PropertyChangeSerializer(PropertyDetailSerializer):
+    """Serializes a property change for the sync feed.
+
+    Deleted properties are sent as tombstones carrying only their id.
+    """
+    deleted = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Property
+        fields = PropertyDetailSerializer.Meta.fields + ['updated_at',
+                                                         'deleted']
+
+    def get_deleted(self, obj) -> bool:
+        return obj.deleted_at is not None
+
+    def to_representation(self, instance):
+        if instance.deleted_at is not None:
+            return {
+                'id': instance.id,
+                'updated_at': serializers.DateTimeField().to_representation(
+                    instance.updated_at
+                ),
+                'deleted': True,
+            }
+        return super().to_representation(instance)
+
+
+class PriceStatsSerializer(serializers.ModelSerializer):
+    """Serializes the price percentiles of a market."""
+
+    class Meta:
+        model = PriceStats
+        fields = ['country', 'location', 'property_type', 'unit',
+                  'listings', 'p10', 'median', 'p90', 'refreshed_at']
+
+
+class PriceHistoryQuerySerializer(serializers.Serializer):
+    """Validates the period, and bucket size, of a price history query."""
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=['day', 'week', 'month'],
+                                     default='month')
+
+    def validate(self, attrs):
+        if 'since' in attrs and 'until' in attrs \
+                and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError(
+                {'since': _('since must not be later than until.')}
+            )
+        return attrs
+
+
+class PriceHistorySerializer(serializers.ModelSerializer):
+    """Serializes one recorded price and availability of a property."""
+
+    class Meta:
+        model = PropertyHistory
+        fields = ['price_per_unit', 'available', 'changed_at']
+
+
+class PriceHistoryBucketSerializer(serializers.Serializer):
+    """Serializes the prices recorded at a location in a time bucket."""
+    bucket = serializers.DateTimeField()
+    unit = serializers.CharField(source='unit_name', allow_null=True)
+    changes = serializers.IntegerField()
+    available_changes = serializers.IntegerField()
+    min_price = serializers.DecimalField(max_digits=5, decimal_places=2)
+    avg_price = serializers.DecimalField(max_digits=5, decimal_places=2)
+    max_price = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """Serializes a saved search, naming its country and property type."""
+    country = serializers.SlugRelatedField(
+        slug_field='name', queryset=Country.objects.all(),
+        required=False, allow_null=True
+    )
+    property_type = serializers.SlugRelatedField(
+        slug_field='name', queryset=PropertyType.objects.all(),
+        required=False, allow_null=True
+    )
+
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'name', 'country', 'property_type', 'min_price',
+                  'max_price', 'created_on']
+        read_only_fields = ['id', 'created_on']
+
+    def validate(self, attrs):
+        """Checks the price range is not empty."""
+        def current(field):
+            return attrs.get(field, getattr(self.instance, field, None))
+
+        min_price, max_price = current('min_price'), current('max_price')
+        if max_price is not None and min_price is not None \
+                and max_price < min_price:
+            raise serializers.ValidationError(
+                {'max_price': _('Must not be below min_price.')}
+            )
+        return attrs
+
+
+class PropertyPhotoSerializer(serializers.ModelSerializer):
+    """Serializes a listing photo with the URL it is served from."""
+    sha256 = serializers.CharField(source='photo_id', read_only=True)
+    size = serializers.IntegerField(source='photo.size', read_only=True)
+    content_type = serializers.CharField(source='photo.content_type',
+                                         read_only=True)
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PropertyPhoto
+        fields = ['id', 'sha256', 'size', 'content_type', 'url', 'position',
+                  'created_on']
+
+    def get_url(self, obj) -> str:
+        url = reverse('listing:photo', args=[obj.photo_id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
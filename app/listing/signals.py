@@ -0,0 +1,80 @@
+"""
+Signal handlers keeping the property listing cache coherent with writes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import (
+    Amenity,
+    Country,
+    Location,
+    Property,
+    PropertyType,
+    Unit,
+)
+from listing import bootstrap, tasks
+from listing.cache import property_cache
+
+
+def property_scope(prop):
+    """The (country, property type) names a property is listed under."""
+    return prop.location.country.name, prop.property_type.name
+
+
+@receiver(pre_save, sender=Property)
+def remember_previous_scope(sender, instance, update_fields=None, **kwargs):
+    """Records where an existing property was listed before the update."""
+    instance._previous_scope = None
+    moved = update_fields is None \
+        or not update_fields.isdisjoint({'location', 'property_type'})
+    if instance.pk is not None and moved:
+        instance._previous_scope = Property.all_objects.filter(
+            pk=instance.pk
+        ).values_list(
+            'location__country__name',
+            'property_type__name'
+        ).first()
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_property_listings(sender, instance, **kwargs):
+    """Expires the cached searches the property appears in, once the
+    write commits; expired earlier, a concurrent read could cache the
+    rows as they were before it under the new generation.
+    """
+    scopes = {property_scope(instance)}
+    previous = getattr(instance, '_previous_scope', None)
+    if previous is not None:
+        scopes.add(previous)
+
+    def invalidate():
+        for country, property_type in scopes:
+            property_cache.invalidate(country, property_type)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Property)
+def match_new_listing(sender, instance, created=False, **kwargs):
+    """Queues matching of a new listing against the saved searches."""
+    if created and not instance.search_matched:
+        transaction.on_commit(tasks.schedule_search_matching)
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=PropertyType)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=PropertyType)
+@receiver(post_delete, sender=Unit)
+def invalidate_bootstrap(sender, **kwargs):
+    """Rebuilds the bootstrap bundle once reference data changes commit;
+    rebuilt earlier, it could be cached with the data as it was before.
+    """
+    transaction.on_commit(bootstrap.invalidate)
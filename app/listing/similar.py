@@ -0,0 +1,244 @@
+"""
+In-memory nearest-neighbour search for similar properties.
+
+Every live property is a row of compact NumPy columns: log price and
+integer codes for its property type, unit, location and country. A
+query scores all rows at once with a weighted distance and keeps the
+top k, so the only SQL per request loads the results. The columns are
+loaded once per process, then kept current every few seconds from the
+change log the sync feed reads, which also records purged properties.
+Server workers load them while warming up and sync from a background
+thread, so requests only read them.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.db import close_old_connections, connection
+
+from core.models import Property, PropertyChange
+from listing import change_log
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('id', 'price_per_unit', 'property_type_id', 'unit__name',
+          'location_id', 'location__country_id', 'deleted_at')
+
+
+class SimilarityIndex:
+    """Feature columns of every live property, searchable by distance.
+
+    The distance adds the absolute difference in log price to a penalty
+    for each of property type, unit, location and country that differs.
+    """
+
+    WEIGHTS = {
+        'price': 1.0,
+        'property_type': 1.0,
+        'unit': 4.0,
+        'location': 0.5,
+        'country': 1.0,
+    }
+    # Seconds between checks for changed properties.
+    sync_interval = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.clear()
+
+    def clear(self):
+        """Forgets every property; the next query reloads them all."""
+        with self._lock:
+            self.columns = None
+            self.position = None
+            self.synced_at = 0.0
+            self._units = {}
+
+    def _unit_code(self, name):
+        return self._units.setdefault(name, len(self._units))
+
+    def _build(self, rows):
+        """Turns (id, price, type, unit, location, country, deleted_at)
+        rows into columns sorted by id.
+        """
+        rows = sorted(rows)
+        return {
+            'id': np.fromiter((r[0] for r in rows), np.int64, len(rows)),
+            'price': np.log1p(np.fromiter((r[1] for r in rows), np.float32,
+                                          len(rows))),
+            'property_type': np.fromiter((r[2] for r in rows), np.int32,
+                                         len(rows)),
+            'unit': np.fromiter((self._unit_code(r[3]) for r in rows),
+                                np.int32, len(rows)),
+            'location': np.fromiter((r[4] for r in rows), np.int32,
+                                    len(rows)),
+            'country': np.fromiter((r[5] for r in rows), np.int32,
+                                   len(rows)),
+            'live': np.fromiter((r[6] is None for r in rows), np.bool_,
+                                len(rows)),
+        }
+
+    def sync(self):
+        """Loads every property, or only those changed since the last
+        sync.
+        """
+        with self._lock:
+            if self.columns is not None \
+                    and change_log.is_stale(self.position):
+                # Changes it has not applied were pruned.
+                self.columns = None
+            if self.columns is None:
+                # Read first: changes made during the load are applied
+                # again on the next sync.
+                latest = PropertyChange.objects.settled().values_list(
+                    'txid', 'id'
+                ).last()
+                rows = Property.objects.values_list(*FIELDS).iterator(
+                    chunk_size=20_000
+                )
+                self.columns = self._build(rows)
+                self.position = latest or (0, 0)
+            else:
+                changes = list(PropertyChange.objects.settled().after(
+                    *self.position
+                ).values_list('txid', 'id', 'property_id'))
+                if changes:
+                    changed = {change[2] for change in changes}
+                    rows = list(Property.all_objects.filter(
+                        id__in=changed
+                    ).values_list(*FIELDS))
+                    self._apply(rows)
+                    self._remove(changed - {row[0] for row in rows})
+                    self.position = changes[-1][:2]
+            self.synced_at = time.monotonic()
+
+    def _apply(self, rows):
+        """Updates changed rows in place and merges in new ones."""
+        columns = self.columns
+        ids = columns['id']
+        added = []
+        for row in rows:
+            pos = np.searchsorted(ids, row[0])
+            if pos == len(ids) or ids[pos] != row[0]:
+                added.append(row)
+                continue
+            columns['price'][pos] = np.log1p(float(row[1]))
+            columns['property_type'][pos] = row[2]
+            columns['unit'][pos] = self._unit_code(row[3])
+            columns['location'][pos] = row[4]
+            columns['country'][pos] = row[5]
+            columns['live'][pos] = row[6] is None
+        if not added:
+            return
+        new = self._build(added)
+        merged = {name: np.concatenate([columns[name], new[name]])
+                  for name in columns}
+        if len(ids) and new['id'][0] < ids[-1]:
+            order = np.argsort(merged['id'], kind='stable')
+            merged = {name: column[order] for name, column in merged.items()}
+        self.columns = merged
+
+    def _remove(self, ids):
+        """Drops the rows of properties that no longer exist."""
+        if not ids:
+            return
+        keep = ~np.isin(self.columns['id'], list(ids))
+        self.columns = {name: column[keep]
+                        for name, column in self.columns.items()}
+
+    def maybe_sync(self):
+        if self.columns is None \
+                or time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync()
+
+    def start(self):
+        """Starts the thread syncing every `sync_interval` seconds, unless
+        this process runs it already.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._sync_forever,
+                                            args=(self._stopping,),
+                                            name='similarity-sync',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the sync thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sync_forever(self, stopping):
+        try:
+            while not stopping.wait(self.sync_interval):
+                # Recycles the connection the way a request does.
+                close_old_connections()
+                try:
+                    self.sync()
+                except Exception:
+                    logger.exception('Similarity index sync failed')
+        finally:
+            connection.close()
+
+    def _position(self, columns, prop_id):
+        pos = int(np.searchsorted(columns['id'], prop_id))
+        if pos < len(columns['id']) and columns['id'][pos] == prop_id:
+            return pos
+        return None
+
+    def similar(self, prop_id, k=10):
+        """Ids of the `k` live properties closest to `prop_id`, nearest
+        first.
+        """
+        # With the sync thread running, requests only sync if the index
+        # was never loaded, and a property created since the last sync
+        # waits for the next one.
+        background = self._thread is not None and self._thread.is_alive()
+        if not background or self.columns is None:
+            self.maybe_sync()
+        columns = self.columns
+        pos = self._position(columns, prop_id)
+        if pos is None:
+            if background:
+                return []
+            # Created since the last sync.
+            self.sync()
+            columns = self.columns
+            pos = self._position(columns, prop_id)
+            if pos is None:
+                return []
+
+        # Computed in place on preallocated buffers, adding penalties
+        # arithmetically rather than through masks, which branch on every
+        # row; a query over a million rows stays within a few ms.
+        weights = self.WEIGHTS
+        distance = np.subtract(columns['price'], columns['price'][pos])
+        np.abs(distance, out=distance)
+        distance *= np.float32(weights['price'])
+        mismatch = np.empty(len(distance), np.bool_)
+        penalty = np.empty(len(distance), np.float32)
+        for name in ('property_type', 'unit', 'location', 'country'):
+            np.not_equal(columns[name], columns[name][pos], out=mismatch)
+            np.multiply(mismatch, np.float32(weights[name]), out=penalty)
+            distance += penalty
+        live = columns['live']
+        distance[~live] = np.inf
+        distance[pos] = np.inf
+
+        k = min(k, int(np.count_nonzero(live)) - int(live[pos]))
+        if k <= 0:
+            return []
+        # Partitioning the values alone is cheaper than argpartition.
+        kth = np.partition(distance, k - 1)[k - 1]
+        nearest = np.flatnonzero(distance <= kth)
+        nearest = nearest[np.argsort(distance[nearest], kind='stable')][:k]
+        return columns['id'][nearest].tolist()
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,108 @@
+"""
+Background tasks for the listing app
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import on_worker_start, task
+from core.models import Job
+from listing import change_log, history, price_stats, searches
+
+
+@task(name='listing.refresh_price_stats', priority=-1, max_attempts=3)
+def refresh_price_stats(repeat=False):
+    """Refreshes the price statistics, then schedules the next refresh
+    when `repeat` is set, whether or not this one succeeded.
+    """
+    try:
+        price_stats.refresh()
+    finally:
+        if repeat:
+            schedule_price_stats()
+
+
+def enqueue_once(func, delay, **payload):
+    """Queues `func` to run in `delay` seconds unless a run of it is
+    already queued, returning whether it was queued now.
+
+    A periodic task queues its next run even when it fails, alongside
+    the retry of the failed run; the first of them to finish finds the
+    other queued, so the two runs merge back into one.
+    """
+    queued = Job.objects.filter(name=func.task_name,
+                                status=Job.QUEUED).exists()
+    if not queued:
+        func.enqueue(run_at=timezone.now() + timedelta(seconds=delay),
+                     **payload)
+    return not queued
+
+
+@on_worker_start
+def schedule_price_stats():
+    """Queues the next periodic refresh unless one is already queued."""
+    return enqueue_once(refresh_price_stats,
+                        settings.PRICE_STATS['REFRESH_INTERVAL'],
+                        repeat=True)
+
+
+@task(name='listing.match_saved_searches', priority=-1)
+def match_saved_searches():
+    """Records which saved searches the listings created since the last
+    run match.
+    """
+    searches.match_pending()
+
+
+def schedule_search_matching():
+    """Queues a matching run, shared by every listing created until it
+    starts.
+    """
+    return enqueue_once(match_saved_searches,
+                        settings.SAVED_SEARCHES['MATCH_DELAY'])
+
+
+@task(name='listing.maintain_price_history', priority=-1, max_attempts=3)
+def maintain_price_history(repeat=False):
+    """Creates the coming price history partitions and drops expired
+    ones, then schedules the next run when `repeat` is set, whether or
+    not this one succeeded.
+    """
+    config = settings.PRICE_HISTORY
+    try:
+        history.create_partitions(config['MONTHS_AHEAD'])
+        history.drop_partitions(config['RETENTION_MONTHS'])
+    finally:
+        if repeat:
+            schedule_price_history()
+
+
+@on_worker_start
+def schedule_price_history():
+    """Queues the next periodic maintenance unless one is already
+    queued.
+    """
+    return enqueue_once(maintain_price_history,
+                        settings.PRICE_HISTORY['MAINTENANCE_INTERVAL'],
+                        repeat=True)
+
+
+@task(name='listing.prune_property_changes', priority=-1, max_attempts=3)
+def prune_property_changes(repeat=False):
+    """Prunes the change log past its retention period, then schedules
+    the next run when `repeat` is set, whether or not this one succeeded.
+    """
+    try:
+        change_log.prune(settings.CHANGE_LOG['RETENTION_DAYS'])
+    finally:
+        if repeat:
+            schedule_change_pruning()
+
+
+@on_worker_start
+def schedule_change_pruning():
+    """Queues the next periodic pruning unless one is already queued."""
+    return enqueue_once(prune_property_changes,
+                        settings.CHANGE_LOG['PRUNE_INTERVAL'],
+                        repeat=True)
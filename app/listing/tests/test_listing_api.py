@@ -1,21 +1,42 @@
 """
 Contains the tests for the listing API
 """
+import gzip
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import seeding
 from core.models import (
     PropertyType,
     Country,
     Location,
     Amenity,
+    Job,
     Property,
+    PropertyChange,
+    PropertyCounter,
     Unit,
 )
+from core.pagination import EstimatedCountPaginator
+from core.tests.harness import PLAN_ROWS, QueryHarnessMixin
+from listing import bootstrap, change_log, price_stats, tasks, typeahead
+from listing.counters import CounterBuffer, counters
+from listing.cache import property_cache
+from listing.similar import SimilarityIndex, similarity_index
 from listing.serializers import (
     PropertyTypeSerializer,
     CountrySerializer,
@@ -24,12 +45,16 @@ from listing.serializers import (
     PropertySerializer,
     PropertyDetailSerializer,
 )
+from listing.views import PropertyViewset
 
 TYPES_URL = reverse('listing:property_types')
 COUNTRIES_URL = reverse('listing:countries')
 LOCATIONS_URL = reverse('listing:locations')
 AMENITIES_URL = reverse('listing:amenities')
 PROPERTY_LISTING_URL = reverse('listing:property-list')
+CHANGES_URL = reverse('listing:changes')
+BOOTSTRAP_URL = reverse('listing:bootstrap')
+PRICE_STATS_URL = reverse('listing:price_stats')
 
 
 def property_detail_url(prop_id):
@@ -37,6 +62,14 @@ def property_detail_url(prop_id):
     return reverse('listing:property-detail', args=[prop_id])
 
 
+MOST_VIEWED_URL = reverse('listing:property-most-viewed')
+
+
+def similar_url(prop_id):
+    """Reverse url for the similar properties of a property"""
+    return reverse('listing:property-similar', args=[prop_id])
+
+
 def create_user(**params):
     """Handles creating new users for testing"""
     return get_user_model().objects.create_user(**params)
@@ -54,17 +87,17 @@ def create_property(user, **params):
     }
     payload.update(**params)
     unit = Unit.objects.create(name=payload.pop('unit'))
-    property_type = PropertyType.objects.create(
+    property_type, _ = PropertyType.objects.get_or_create(
         name=payload.pop('property_type')
     )
-    country = Country.objects.create(name=payload.pop('country'))
-    location = Location.objects.create(
+    country, _ = Country.objects.get_or_create(name=payload.pop('country'))
+    location, _ = Location.objects.get_or_create(
         name=payload.pop('location'),
         country=country
     )
 
     return Property.objects.create(
-        user=user,
+        owner=user,
         location=location,
         property_type=property_type,
         unit=unit,
@@ -186,6 +219,7 @@ class TestListingAPIPrivateTests(TestCase):
         self.user = create_user(**payload)
         self.client = APIClient()
         self.client.force_authenticate(user=self.user)
+        property_cache.clear()
 
     def test_create_property_requests(self):
         """Tests creating property requests"""
@@ -210,25 +244,21 @@ class TestListingAPIPrivateTests(TestCase):
         names = ('Richardson estate', 'Colonial avenue', 'Empty beach')
         prices = (23.45, 21.90, 34.56)
         for name, price in zip(names, prices):
-            create_property(self.user, {
-                'name': name,
-                'price_per_unit': price,
-            })
+            create_property(self.user, name=name, price_per_unit=price)
 
         res = self.client.get(PROPERTY_LISTING_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIs(type(res.data), list)
+        self.assertIsInstance(res.data, list)
         properties = Property.objects.all()
         serializer = PropertySerializer(properties, many=True)
         self.assertEqual(res.data, serializer.data)
 
     def test_retrieve_property_requests(self):
         """Tests retrieving property requests"""
-        prop = create_property(self.user, {
-            'name': 'Garden towers resort, Ajah, Lagos',
-            'price_per_unit': 21.37,
-        })
+        prop = create_property(self.user,
+                               name='Garden towers resort, Ajah, Lagos',
+                               price_per_unit=21.37)
         url = property_detail_url(prop.id)
         res = self.client.get(url)
 
@@ -238,8 +268,927 @@ class TestListingAPIPrivateTests(TestCase):
 
     def test_update_property_requests(self):
         """Tests updating property requests"""
-        pass
+        prop = create_property(self.user)
+
+        res = self.client.patch(property_detail_url(prop.id),
+                                {'name': 'Garden Towers'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        prop.refresh_from_db()
+        self.assertEqual(prop.name, 'Garden Towers')
+        self.assertEqual(prop.version, 2)
+        self.assertEqual(res.data['version'], 2)
+        self.assertEqual(res['ETag'], '"2"')
 
     def test_delete_property_requests(self):
         """Tests deleting property requests"""
         pass
+
+
+class TestPropertyConcurrency(TestCase):
+    """Tests property updates are conditional on the version read"""
+
+    def setUp(self):
+        property_cache.clear()
+        self.user = create_user(email='owner@example.com',
+                                password='testing123')
+        self.prop = create_property(self.user)
+        self.url = property_detail_url(self.prop.id)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_patch_updates_changed_columns(self):
+        """Tests a PATCH writes one UPDATE of only the changed columns."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(self.url, {'price_per_unit': 50},
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        columns = updates[0].split(' SET ')[1].split(' WHERE ')[0]
+        self.assertIn('"price_per_unit"', columns)
+        self.assertIn('"version"', columns)
+        self.assertIn('"updated_at"', columns)
+        self.assertNotIn('"name"', columns)
+        self.assertIn('"version" = 1', updates[0].split(' WHERE ')[1])
+
+    def test_unchanged_patch_writes_nothing(self):
+        """Tests a PATCH repeating the current values skips the UPDATE."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(self.url, {'name': self.prop.name},
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries
+                          if q['sql'].startswith('UPDATE')])
+        self.assertEqual(res.data['version'], 1)
+
+    def test_if_match_current_version(self):
+        """Tests an update with the current version in If-Match applies."""
+        res = self.client.patch(self.url, {'name': 'New name'},
+                                format='json', HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['version'], 2)
+
+    def test_if_match_stale_version(self):
+        """Tests an update based on an old version is refused."""
+        Property.objects.filter(pk=self.prop.pk).update(version=2)
+
+        res = self.client.patch(self.url, {'name': 'New name'},
+                                format='json', HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.prop.refresh_from_db()
+        self.assertNotEqual(self.prop.name, 'New name')
+
+    def test_concurrent_update_conflicts(self):
+        """Tests a write landing between the read and the update of a
+        request is not overwritten.
+        """
+        get_object = PropertyViewset.get_object
+
+        def read_then_bump(view):
+            prop = get_object(view)
+            Property.objects.filter(pk=prop.pk).update(version=5)
+            return prop
+
+        with patch.object(PropertyViewset, 'get_object', read_then_bump):
+            res = self.client.patch(self.url, {'name': 'New name'},
+                                    format='json')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.prop.refresh_from_db()
+        self.assertEqual(self.prop.version, 5)
+        self.assertNotEqual(self.prop.name, 'New name')
+
+    def test_invalid_if_match(self):
+        """Tests an If-Match that is not a version is rejected."""
+        res = self.client.patch(self.url, {'name': 'New name'},
+                                format='json', HTTP_IF_MATCH='"abc"')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestListingQueryScaling(QueryHarnessMixin, TestCase):
+    """Guards the listing endpoints against N+1 queries and full scans"""
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com',
+                                password='testing123')
+        self.client = APIClient()
+        self.added = 0
+        property_cache.clear()
+
+    def _names(self, prefix, count):
+        """Unique names for `count` new rows."""
+        names = [f'{prefix} {self.added + i}' for i in range(count)]
+        self.added += count
+        return names
+
+    def test_reference_lists_constant_queries(self):
+        """Tests the reference data lists use a fixed number of queries."""
+        for url, model in ((TYPES_URL, PropertyType),
+                           (COUNTRIES_URL, Country),
+                           (AMENITIES_URL, Amenity)):
+            with self.subTest(url=url):
+                self.assertConstantQueries(
+                    lambda: self.client.get(url),
+                    lambda n: model.objects.bulk_create(
+                        [model(name=name)
+                         for name in self._names(model.__name__, n)]
+                    )
+                )
+
+    def test_location_lists_constant_queries(self):
+        """Tests listing locations, filtered or not, stays O(1) queries."""
+        country = Country.objects.create(name='Nigeria')
+
+        def grow(n):
+            Location.objects.bulk_create([
+                Location(name=name, country=country)
+                for name in self._names('Location', n)
+            ])
+
+        self.assertConstantQueries(lambda: self.client.get(LOCATIONS_URL),
+                                   grow)
+        self.assertConstantQueries(
+            lambda: self.client.get(LOCATIONS_URL, {'country': 'Nigeria'}),
+            grow
+        )
+
+    def test_property_list_constant_queries(self):
+        """Tests nested property_type/location/unit do not cause N+1."""
+        def grow(n):
+            for name in self._names('Property', n):
+                create_property(self.user, name=name, property_type=name,
+                                location=name, country=name)
+
+        self.assertConstantQueries(
+            lambda: self.client.get(PROPERTY_LISTING_URL),
+            grow
+        )
+
+    def test_property_detail_uses_index(self):
+        """Tests retrieving a property never scans the whole table."""
+        reference = seeding.seed_reference_data()
+        owners = seeding.seed_users(10)
+        seeding.seed_properties(PLAN_ROWS, owners, reference)
+        prop = Property.objects.order_by('id').last()
+
+        _, queries = self.capture(
+            lambda: self.client.get(property_detail_url(prop.id))
+        )
+
+        self.assertNoSeqScan(self.main_query(queries, 'core_property'))
+
+
+class TestPropertyChangesFeed(TransactionTestCase):
+    """Tests the incremental sync feed of property changes
+
+    Changes are only served once their transaction has committed, so
+    these tests commit as they go.
+    """
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com',
+                                password='testing123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.properties = [
+            create_property(self.user, name=f'Property {i}')
+            for i in range(5)
+        ]
+
+    def changed_ids(self, res):
+        return [change['id'] for change in res.data['results']]
+
+    def test_pages_through_changes_with_cursor(self):
+        """Tests the feed is returned in bounded pages in change order."""
+        res = self.client.get(CHANGES_URL, {'limit': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.changed_ids(res),
+                         [p.id for p in self.properties[:3]])
+        self.assertTrue(res.data['has_more'])
+
+        res = self.client.get(CHANGES_URL, {
+            'limit': 3,
+            'cursor': res.data['next_cursor'],
+        })
+
+        self.assertEqual(self.changed_ids(res),
+                         [p.id for p in self.properties[3:]])
+        self.assertFalse(res.data['has_more'])
+
+    def test_only_changes_since_cursor_returned(self):
+        """Tests updates and deletes after a cursor are reported."""
+        cursor = self.client.get(CHANGES_URL).data['next_cursor']
+        updated, deleted = self.properties[1], self.properties[3]
+        self.client.patch(property_detail_url(updated.id),
+                          {'name': 'Renamed'}, format='json')
+        res = self.client.delete(property_detail_url(deleted.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.get(CHANGES_URL, {'cursor': cursor})
+
+        self.assertEqual(self.changed_ids(res), [updated.id, deleted.id])
+        self.assertEqual(res.data['results'][0]['name'], 'Renamed')
+        self.assertEqual(res.data['results'][1]['deleted'], True)
+        self.assertNotIn('name', res.data['results'][1])
+
+        res = self.client.get(CHANGES_URL, {
+            'cursor': res.data['next_cursor'],
+        })
+        self.assertEqual(res.data['results'], [])
+
+    def age_changes(self, days):
+        """Backdates every change logged so far by `days` days."""
+        PropertyChange.objects.update(
+            changed_at=F('changed_at') - timedelta(days=days)
+        )
+
+    def test_prune_keeps_changes_within_retention(self):
+        """Tests only changes older than the retention period are
+        pruned, and the horizon moves to the last of them.
+        """
+        self.age_changes(40)
+        newer = create_property(self.user, name='Newer')
+
+        self.assertEqual(change_log.prune(30, batch_size=2), 5)
+
+        self.assertEqual(
+            list(PropertyChange.objects.values_list('property', flat=True)),
+            [newer.id],
+        )
+        self.assertTrue(change_log.is_stale((0, 0)))
+
+    def test_stale_cursor_told_to_resync(self):
+        """Tests a cursor from before the pruned changes gets 410 with a
+        cursor to continue from after reloading.
+        """
+        cursor = self.client.get(CHANGES_URL, {'limit': 1}).data[
+            'next_cursor'
+        ]
+        self.age_changes(40)
+        change_log.prune(30)
+
+        stale = self.client.get(CHANGES_URL, {'cursor': cursor})
+        fresh = self.client.get(CHANGES_URL)
+        newer = create_property(self.user, name='Newer')
+
+        self.assertEqual(stale.status_code, status.HTTP_410_GONE)
+        self.assertEqual(fresh.status_code, status.HTTP_410_GONE)
+        res = self.client.get(CHANGES_URL, {
+            'cursor': stale.data['resync_cursor'],
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.changed_ids(res), [newer.id])
+
+    def test_pruning_scheduled_on_worker_start(self):
+        """Tests the pruning job queues itself once."""
+        self.assertTrue(tasks.schedule_change_pruning())
+        self.assertFalse(tasks.schedule_change_pruning())
+
+    def test_bulk_and_cascading_changes_reported(self):
+        """Tests queryset updates, renamed related rows and cascading
+        deletes reach the feed.
+        """
+        first, second, third = self.properties[:3]
+        cursor = self.client.get(CHANGES_URL).data['next_cursor']
+        Property.objects.filter(id=first.id).update(available=False)
+        PropertyType.objects.filter(id=second.property_type_id).update(
+            name='Duplex'
+        )
+        third.unit.delete()
+
+        res = self.client.get(CHANGES_URL, {'cursor': cursor})
+
+        results = {change['id']: change for change in res.data['results']}
+        self.assertFalse(results[first.id]['available'])
+        self.assertEqual(results[second.id]['property_type'],
+                         {'name': 'Duplex'})
+        self.assertTrue(results[third.id]['deleted'])
+        self.assertFalse(Property.all_objects.filter(id=third.id).exists())
+
+    def test_matching_saved_searches_not_reported(self):
+        """Tests bookkeeping updates do not show as changes."""
+        cursor = self.client.get(CHANGES_URL).data['next_cursor']
+        Property.objects.update(search_matched=True)
+
+        res = self.client.get(CHANGES_URL, {'cursor': cursor})
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_running_transactions_hold_back_later_changes(self):
+        """Tests changes committed after an open transaction began
+        writing wait until it ends, so the cursor never passes it.
+        """
+        cursor = self.client.get(CHANGES_URL).data['next_cursor']
+        written, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    create_property(self.user, name='Slow', unit='WEEK')
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        self.assertTrue(written.wait(5))
+        fast = create_property(self.user, name='Fast', unit='MONTH')
+
+        held = self.client.get(CHANGES_URL, {'cursor': cursor})
+        release.set()
+        writer.join()
+        res = self.client.get(CHANGES_URL, {'cursor': cursor})
+
+        self.assertEqual(held.data['results'], [])
+        self.assertEqual([change['name'] for change in res.data['results']],
+                         ['Slow', 'Fast'])
+        self.assertEqual(self.changed_ids(res)[1], fast.id)
+
+    def test_deleted_property_kept_as_tombstone(self):
+        """Tests deleting hides the property but keeps the row."""
+        prop = self.properties[0]
+        self.client.delete(property_detail_url(prop.id))
+
+        res = self.client.get(property_detail_url(prop.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Property.objects.filter(id=prop.id).exists())
+        self.assertIsNotNone(Property.all_objects.get(id=prop.id).deleted_at)
+
+    def test_invalid_cursor_rejected(self):
+        """Tests a malformed cursor is a bad request."""
+        res = self.client.get(CHANGES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestBootstrapAPI(TestCase):
+    """Tests the bundled reference data endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        bootstrap.invalidate()
+        country = Country.objects.create(name='Nigeria')
+        Location.objects.create(name='Kubwa', country=country)
+        PropertyType.objects.create(name='Bungalow')
+        Amenity.objects.create(name='Wifi')
+
+    def test_bundles_all_reference_data(self):
+        """Tests one request returns every reference list and unit."""
+        res = self.client.get(BOOTSTRAP_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'])
+        data = json.loads(res.content)
+        self.assertEqual(data['countries'], [{'name': 'Nigeria'}])
+        self.assertEqual(data['locations'], [{'name': 'Kubwa'}])
+        self.assertEqual(data['property_types'], [{'name': 'Bungalow'}])
+        self.assertEqual(data['amenities'], [{'name': 'Wifi'}])
+        self.assertEqual([u['name'] for u in data['units']],
+                         [name for name, _ in Unit.UNIT_CHOICES])
+
+    def test_cached_bundle_needs_no_queries(self):
+        """Tests the bundle is built once until reference data changes."""
+        self.client.get(BOOTSTRAP_URL)
+
+        with self.assertNumQueries(0):
+            self.client.get(BOOTSTRAP_URL)
+
+    def test_current_hash_not_modified(self):
+        """Tests clients holding the current hash get an empty 304."""
+        etag = self.client.get(BOOTSTRAP_URL)['ETag']
+        content_hash = etag.strip('"')
+
+        res = self.client.get(BOOTSTRAP_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+        res = self.client.get(BOOTSTRAP_URL, {'hash': content_hash})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_reference_data_change_updates_bundle(self):
+        """Tests a reference data write produces a new hash."""
+        etag = self.client.get(BOOTSTRAP_URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name='Ghana')
+
+        res = self.client.get(BOOTSTRAP_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertIn({'name': 'Ghana'}, json.loads(res.content)['countries'])
+
+    def test_bundle_kept_until_commit(self):
+        """Tests the bundle is only rebuilt once the write commits, so a
+        request during the transaction cannot cache it stale.
+        """
+        etag = self.client.get(BOOTSTRAP_URL)['ETag']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Country.objects.create(name='Ghana')
+            during = self.client.get(BOOTSTRAP_URL)['ETag']
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(during, etag)
+        self.assertNotEqual(self.client.get(BOOTSTRAP_URL)['ETag'], etag)
+
+    def test_change_missed_by_local_cache_shows_after_max_age(self):
+        """Tests a process whose cache never sees another process's
+        invalidation still serves the change once its bundle expires.
+        """
+        local = LocMemCache('bootstrap-local', {})
+        self.addCleanup(setattr, bootstrap, '_loaded', (None, None, 0.0))
+        with patch('listing.bootstrap.cache', local):
+            etag = bootstrap.load_bundle()[0]
+        # Invalidates through the default cache, as another process.
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name='Ghana')
+
+        with patch('listing.bootstrap.cache', local):
+            kept = bootstrap.load_bundle()[0]
+            with patch('listing.bootstrap.time.time',
+                       return_value=time.time() + bootstrap.MAX_AGE + 1):
+                rebuilt = bootstrap.load_bundle()
+
+        self.assertEqual(kept, etag)
+        self.assertNotEqual(rebuilt[0], etag)
+        self.assertIn(b'Ghana', rebuilt[1])
+
+    def test_gzip_when_accepted(self):
+        """Tests the precompressed bundle is sent to gzip clients."""
+        res = self.client.get(BOOTSTRAP_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'Nigeria', gzip.decompress(res.content))
+
+
+class TestPriceStatsAPI(QueryHarnessMixin, TestCase):
+    """Tests the market price statistics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='owner@example.com',
+                                password='testing123')
+        for price in range(10, 110, 10):
+            create_property(self.user, price_per_unit=price, unit='MONTH')
+        create_property(self.user, price_per_unit=500, unit='MONTH',
+                        property_type='Duplex', location='Ikeja')
+        create_property(self.user, price_per_unit=20, unit='DAY',
+                        country='Ghana', location='Accra')
+        price_stats.refresh()
+
+    def test_country_percentiles(self):
+        """Tests median and p10/p90 are computed per unit for a country."""
+        res = self.client.get(PRICE_STATS_URL, {'country': 'nigeria'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        stats = res.data[0]
+        self.assertEqual(stats['unit'], 'MONTH')
+        self.assertEqual(stats['listings'], 11)
+        self.assertEqual(stats['median'], '60.00')
+        self.assertEqual(stats['p10'], '20.00')
+        self.assertEqual(stats['p90'], '100.00')
+        self.assertIsNone(stats['location'])
+        self.assertIsNone(stats['property_type'])
+
+    def test_location_and_type_scope(self):
+        """Tests the statistics can be narrowed to a location and type."""
+        res = self.client.get(PRICE_STATS_URL, {
+            'location': 'Ikeja',
+            'property_type': 'duplex',
+        })
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['country'], 'Nigeria')
+        self.assertEqual(res.data[0]['median'], '500.00')
+
+    def test_all_markets_per_unit(self):
+        """Tests the unscoped statistics have one row per unit."""
+        res = self.client.get(PRICE_STATS_URL)
+
+        self.assertEqual([row['unit'] for row in res.data], ['DAY', 'MONTH'])
+        self.assertEqual(res.data[1]['listings'], 11)
+
+    def test_deleted_properties_excluded_after_refresh(self):
+        """Tests refreshing drops deleted listings from the figures."""
+        Property.objects.get(location__name='Accra').soft_delete()
+        price_stats.refresh()
+
+        res = self.client.get(PRICE_STATS_URL, {'unit': 'day'})
+
+        self.assertEqual(res.data, [])
+
+    def test_never_reads_properties(self):
+        """Tests requests are served without touching core_property."""
+        _, queries = self.capture(
+            lambda: self.client.get(PRICE_STATS_URL, {'country': 'Nigeria'})
+        )
+
+        self.assertFalse(any('core_property"' in sql for sql in queries))
+
+    def test_periodic_refresh_scheduled_once(self):
+        """Tests the refresh job reschedules itself without piling up."""
+        self.assertTrue(tasks.schedule_price_stats())
+        self.assertFalse(tasks.schedule_price_stats())
+
+        [job] = Job.objects.all()
+        self.assertEqual(job.payload, {'repeat': True})
+
+    def test_failed_refresh_still_rescheduled(self):
+        """Tests a refresh that fails queues the next one anyway."""
+        with patch('listing.price_stats.refresh',
+                   side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            tasks.refresh_price_stats(repeat=True)
+
+        [job] = Job.objects.all()
+        self.assertEqual(job.name, 'listing.refresh_price_stats')
+
+
+class TestSimilarProperties(TransactionTestCase):
+    """Tests the similar properties endpoint
+
+    The index follows committed changes only, so these tests commit.
+    """
+
+    def setUp(self):
+        similarity_index.clear()
+        self.client = APIClient()
+        self.user = create_user(email='owner@example.com',
+                                password='testing123')
+        self.prop = create_property(self.user, price_per_unit=100)
+        self.close = create_property(self.user, price_per_unit=110)
+        self.cheaper = create_property(self.user, price_per_unit=50)
+        self.duplex = create_property(self.user, price_per_unit=100,
+                                      property_type='Duplex')
+        self.yearly = create_property(self.user, price_per_unit=100,
+                                      unit='YEAR')
+
+    def similar_ids(self, prop, **params):
+        res = self.client.get(similar_url(prop.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_nearest_first(self):
+        """Tests properties are ranked by price, type and unit."""
+        ids = self.similar_ids(self.prop)
+
+        self.assertEqual(ids, [self.close.id, self.cheaper.id,
+                               self.duplex.id, self.yearly.id])
+
+    def test_limit(self):
+        """Tests the number of results can be limited."""
+        self.assertEqual(self.similar_ids(self.prop, limit=2),
+                         [self.close.id, self.cheaper.id])
+
+    @patch.object(SimilarityIndex, 'sync_interval', 0)
+    def test_changes_picked_up(self):
+        """Tests new, edited and deleted properties are seen."""
+        self.similar_ids(self.prop)
+        self.close.soft_delete()
+        self.cheaper.price_per_unit = 101
+        self.cheaper.save()
+        newer = create_property(self.user, price_per_unit=104)
+
+        ids = self.similar_ids(self.prop)
+
+        self.assertEqual(ids, [self.cheaper.id, newer.id,
+                               self.duplex.id, self.yearly.id])
+
+    @patch.object(SimilarityIndex, 'sync_interval', 0)
+    def test_purged_property_removed(self):
+        """Tests a property deleted outright leaves the index."""
+        self.similar_ids(self.prop)
+        Property.all_objects.filter(id=self.close.id).delete()
+
+        ids = self.similar_ids(self.prop)
+
+        self.assertNotIn(self.close.id, ids)
+        self.assertNotIn(self.close.id, similarity_index.columns['id'])
+
+    @patch.object(SimilarityIndex, 'sync_interval', 0)
+    def test_reloads_once_changes_were_pruned(self):
+        """Tests the index reloads when changes it has not applied were
+        pruned from the log.
+        """
+        self.similar_ids(self.prop)
+        self.cheaper.price_per_unit = 101
+        self.cheaper.save()
+        PropertyChange.objects.update(
+            changed_at=F('changed_at') - timedelta(days=40)
+        )
+        change_log.prune(30)
+
+        ids = self.similar_ids(self.prop)
+
+        self.assertEqual(ids[:2], [self.cheaper.id, self.close.id])
+
+    def test_similar_to_new_property(self):
+        """Tests a property created after the index loaded is found."""
+        self.similar_ids(self.prop)
+        newer = create_property(self.user, price_per_unit=104)
+
+        self.assertEqual(self.similar_ids(newer)[0], self.prop.id)
+
+    @patch.object(SimilarityIndex, 'sync_interval', 0.05)
+    def test_sync_thread_keeps_index_current(self):
+        """Tests the sync thread picks up new properties, and requests
+        then read the index without syncing it.
+        """
+        similarity_index.sync()
+        similarity_index.start()
+        self.addCleanup(similarity_index.stop)
+        newer = create_property(self.user, price_per_unit=104)
+        deadline = time.monotonic() + 5
+        while newer.id not in similarity_index.columns['id'] \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.similar_ids(newer)
+
+        self.assertEqual(ids[0], self.prop.id)
+        self.assertFalse([q for q in queries.captured_queries
+                          if 'core_propertychange' in q['sql']])
+
+    def test_unknown_property(self):
+        """Tests asking for a missing property returns 404."""
+        res = self.client.get(similar_url(0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestLocationTypeahead(TestCase):
+    """Tests autocompleting location names"""
+
+    def setUp(self):
+        self.client = APIClient()
+        nigeria = Country.objects.create(name='Nigeria')
+        ghana = Country.objects.create(name='Ghana')
+        for name in ('Lagos', 'Lekki', 'Lokoja', 'Abuja', 'Ikeja'):
+            Location.objects.create(name=name, country=nigeria)
+        for name in ('Accra', 'Lagos'):
+            Location.objects.create(name=name, country=ghana)
+        # Test transactions never commit, so the index is not told.
+        bootstrap.invalidate()
+
+    def suggest(self, **params):
+        res = self.client.get(LOCATIONS_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix_matches_in_order(self):
+        """Tests names starting with the prefix are listed once each."""
+        self.assertEqual(self.suggest(prefix='l'),
+                         ['Lagos', 'Lekki', 'Lokoja'])
+        self.assertEqual(self.suggest(prefix='LE'), ['Lekki'])
+
+    def test_country_scope(self):
+        """Tests suggestions can be limited to a country."""
+        self.assertEqual(self.suggest(prefix='a', country='ghana'),
+                         ['Accra'])
+        self.assertEqual(self.suggest(prefix='a', country='Mars'), [])
+
+    def test_limit(self):
+        """Tests the number of suggestions can be limited."""
+        self.assertEqual(self.suggest(prefix='l', limit=2),
+                         ['Lagos', 'Lekki'])
+
+    def test_new_locations_suggested(self):
+        """Tests the prefix index is rebuilt when locations change."""
+        self.suggest(prefix='l')
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(
+                name='Lafia', country=Country.objects.get(name='Nigeria')
+            )
+
+        self.assertEqual(self.suggest(prefix='la'), ['Lafia', 'Lagos'])
+
+    def test_change_missed_by_local_cache_suggested_after_max_age(self):
+        """Tests a location added through another process's cache is
+        suggested once the index is MAX_AGE old.
+        """
+        index = typeahead.PrefixIndex()
+        local = LocMemCache('typeahead-local', {})
+        with patch('listing.typeahead.cache', local):
+            index.search('la')
+        # Invalidates through the default cache, as another process.
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(
+                name='Lafia', country=Country.objects.get(name='Nigeria')
+            )
+
+        with patch('listing.typeahead.cache', local):
+            kept = index.search('la')
+            with patch('listing.typeahead.time.time',
+                       return_value=time.time() + bootstrap.MAX_AGE + 1):
+                rebuilt = index.search('la')
+
+        self.assertEqual(kept, ['Lagos'])
+        self.assertEqual(rebuilt, ['Lafia', 'Lagos'])
+
+    def test_prefix_hits_skip_database(self):
+        """Tests a full page of prefix matches needs no queries."""
+        self.suggest(prefix='l')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.suggest(prefix='l', limit=3)
+
+        self.assertEqual(len(queries), 0)
+
+    def test_fuzzy_matches(self):
+        """Tests misspelt names are matched through pg_trgm."""
+        if not typeahead.trigram_available():
+            self.skipTest('pg_trgm is not installed')
+
+        self.assertEqual(self.suggest(prefix='lokaja'), ['Lokoja'])
+
+    def test_without_prefix_lists_all(self):
+        """Tests the plain listing is unchanged."""
+        self.assertEqual(len(self.suggest()), 7)
+
+
+class TestPropertyPagination(TestCase):
+    """Tests the optional page-number pagination of the property list"""
+
+    def setUp(self):
+        property_cache.clear()
+        self.client = APIClient()
+        user = create_user(email='owner@example.com', password='testing123')
+        self.props = [create_property(user, name=f'Home {n}')
+                      for n in range(5)]
+
+    def test_pages_on_request(self):
+        """Tests asking for a page returns it with the total."""
+        res = self.client.get(PROPERTY_LISTING_URL,
+                              {'page': 2, 'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 5)
+        self.assertFalse(res.data['count_is_estimate'])
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [prop.id for prop in self.props[2:4]])
+        self.assertIsNotNone(res.data['next'])
+
+    def test_links_relative(self):
+        """Tests the next and previous links leave out the host, so a
+        cached page is right for clients of any host.
+        """
+        res = self.client.get(PROPERTY_LISTING_URL,
+                              {'page': 2, 'page_size': 2})
+
+        self.assertEqual(res.data['next'],
+                         f'{PROPERTY_LISTING_URL}?page=3&page_size=2')
+        self.assertEqual(res.data['previous'],
+                         f'{PROPERTY_LISTING_URL}?page_size=2')
+
+    def test_pages_cached_separately(self):
+        """Tests each page is cached under its own key."""
+        first = self.client.get(PROPERTY_LISTING_URL, {'page': 1,
+                                                       'page_size': 2})
+        second = self.client.get(PROPERTY_LISTING_URL, {'page': 2,
+                                                        'page_size': 2})
+
+        self.assertNotEqual(first.data['results'], second.data['results'])
+
+    @patch.object(EstimatedCountPaginator, 'exact_count_limit', 0)
+    def test_large_counts_estimated(self):
+        """Tests large results report a planner estimate."""
+        res = self.client.get(PROPERTY_LISTING_URL, {'page': 1})
+
+        self.assertTrue(res.data['count_is_estimate'])
+
+    def test_unpaginated_by_default(self):
+        """Tests the plain list is returned without a page parameter."""
+        res = self.client.get(PROPERTY_LISTING_URL)
+
+        self.assertEqual(len(res.data), 5)
+
+
+class TestViewCounters(TestCase):
+    """Tests property views are counted in memory and saved in batches"""
+
+    def setUp(self):
+        property_cache.clear()
+        counters.clear()
+        self.client = APIClient()
+        user = create_user(email='owner@example.com', password='testing123')
+        self.props = [create_property(user, name=f'Home {n}')
+                      for n in range(3)]
+
+    def test_views_buffered_until_flush(self):
+        """Tests views are only written when the buffer is flushed."""
+        for _ in range(3):
+            self.client.get(property_detail_url(self.props[0].id))
+        self.client.get(property_detail_url(self.props[1].id))
+
+        self.assertFalse(PropertyCounter.objects.exists())
+        self.assertEqual(counters.flush(), 2)
+        views = dict(PropertyCounter.objects.values_list('property',
+                                                         'views'))
+        self.assertEqual(views, {self.props[0].id: 3, self.props[1].id: 1})
+
+    def test_flush_adds_to_saved_counts(self):
+        """Tests each flush adds to the totals of earlier ones in one
+        statement.
+        """
+        self.client.get(property_detail_url(self.props[0].id))
+        counters.flush()
+        self.client.get(property_detail_url(self.props[0].id))
+        self.client.get(property_detail_url(self.props[2].id))
+
+        with CaptureQueriesContext(connection) as ctx:
+            counters.flush()
+
+        writes = [q for q in ctx.captured_queries
+                  if q['sql'].lstrip().startswith('INSERT')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(
+            PropertyCounter.objects.get(property=self.props[0]).views, 2
+        )
+
+    def test_page_impressions_counted(self):
+        """Tests properties shown on a page count an impression each."""
+        self.client.get(PROPERTY_LISTING_URL, {'page': 1, 'page_size': 2})
+        counters.flush()
+
+        impressions = dict(PropertyCounter.objects.values_list(
+            'property', 'impressions'
+        ))
+        self.assertEqual(impressions, {self.props[0].id: 1,
+                                       self.props[1].id: 1})
+
+    @override_settings(COUNTERS={'FLUSH_INTERVAL': 60, 'MAX_PENDING': 2})
+    def test_full_buffer_flushed(self):
+        """Tests the buffer is flushed early once it holds MAX_PENDING
+        properties.
+        """
+        self.client.get(property_detail_url(self.props[0].id))
+        self.assertFalse(PropertyCounter.objects.exists())
+
+        self.client.get(property_detail_url(self.props[1].id))
+
+        self.assertEqual(PropertyCounter.objects.count(), 2)
+        self.assertEqual(counters.pending, {})
+
+    def test_failed_flush_dropped(self):
+        """Tests a failed flush drops its counts instead of piling up."""
+        counters.add([self.props[0].id], views=1)
+
+        with patch('listing.counters.FLUSH_SQL', 'SELECT missing'), \
+                self.assertLogs('listing.counters', 'WARNING'):
+            self.assertEqual(counters.flush(), 0)
+
+        self.assertEqual(counters.pending, {})
+        self.assertFalse(PropertyCounter.objects.exists())
+
+    def test_most_viewed_ranking(self):
+        """Tests the ranking lists viewed properties, most viewed first."""
+        for prop, views in zip(self.props, (2, 5)):
+            for _ in range(views):
+                self.client.get(property_detail_url(prop.id))
+        counters.flush()
+
+        res = self.client.get(MOST_VIEWED_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([(item['id'], item['views']) for item in res.data],
+                         [(self.props[1].id, 5), (self.props[0].id, 2)])
+
+
+class TestCounterFlusher(TransactionTestCase):
+    """Tests the flusher thread saves counts while no views come in"""
+
+    def test_flushes_without_traffic(self):
+        """Tests pending counts are saved once the interval passes, with
+        no further views to trigger the flush.
+        """
+        user = create_user(email='owner@example.com', password='testing123')
+        prop = create_property(user)
+        buffer = CounterBuffer()
+        buffer.add([prop.id], views=1)
+
+        with override_settings(COUNTERS={'FLUSH_INTERVAL': 0.05,
+                                         'MAX_PENDING': 10}):
+            buffer.start()
+            self.addCleanup(buffer.stop)
+            deadline = time.monotonic() + 5
+            while not PropertyCounter.objects.exists() \
+                    and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(PropertyCounter.objects.get(property=prop).views, 1)
+        self.assertEqual(buffer.pending, {})
@@ -0,0 +1,261 @@
+"""
+Tests for the property listing response cache
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Country,
+    Location,
+    Property,
+    PropertyType,
+    Unit,
+)
+from listing.cache import ResponseCache, property_cache
+
+PROPERTY_LISTING_URL = reverse('listing:property-list')
+
+
+class TestResponseCache(SimpleTestCase):
+    """Tests the cache mechanics independently of the API"""
+
+    def setUp(self):
+        self.cache = ResponseCache(timeout=30, lock_timeout=2)
+        self.cache.clear()
+
+    def test_normalize_query_params(self):
+        """Tests equivalent searches share one normalized form."""
+        params = self.cache.normalize({
+            'country': ' nigeria ',
+            'property_type': 'BUNGALOW',
+            'available': 'true',
+            'min_price': '10.50',
+            'max_price': 'abc',
+            'page_size': '10',
+        })
+
+        self.assertEqual(params, {
+            'country': 'Nigeria',
+            'property_type': 'Bungalow',
+            'available': 'True',
+            'min_price': '10.5',
+        })
+
+    def test_normalize_keeps_page_when_paginating(self):
+        """Tests page size only distinguishes paginated searches."""
+        params = self.cache.normalize({'page': ' 2', 'page_size': '10'})
+
+        self.assertEqual(params, {'page': '2', 'page_size': '10'})
+
+    def test_concurrent_misses_compute_once(self):
+        """Tests concurrent misses for a key collapse into one call."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return ['listing']
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_compute({'country': 'Ghana'}, compute)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['listing']] * 8)
+
+    def test_stale_entry_served_while_refreshing(self):
+        """Tests a stale entry is returned while it refreshes."""
+        self.cache.timeout = 0
+        self.cache.get_or_compute({}, lambda: ['old'])
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.set()
+            return ['new']
+
+        self.assertEqual(self.cache.get_or_compute({}, compute), ['old'])
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(20):
+            if not self.cache._inflight:
+                break
+            time.sleep(0.05)
+
+        self.cache.timeout = 30
+        self.assertEqual(self.cache.get_or_compute({}, compute), ['new'])
+
+    def test_invalidation_is_scoped(self):
+        """Tests a write only expires the searches it can appear in."""
+        ghana = self.cache.key({'country': 'Ghana'})
+        kenya = self.cache.key({'country': 'Kenya'})
+        bungalows = self.cache.key({'property_type': 'Bungalow'})
+        everything = self.cache.key({})
+
+        self.cache.invalidate('Ghana', 'Bungalow')
+
+        self.assertNotEqual(self.cache.key({'country': 'Ghana'}), ghana)
+        self.assertEqual(self.cache.key({'country': 'Kenya'}), kenya)
+        self.assertNotEqual(
+            self.cache.key({'property_type': 'Bungalow'}), bungalows
+        )
+        self.assertNotEqual(self.cache.key({}), everything)
+
+    def test_invalidation_reaches_other_instances(self):
+        """Tests a write through another worker's cache expires the
+        entries of this one once its generations are read again.
+        """
+        self.cache.generation_ttl = 10
+        other = ResponseCache(timeout=30, lock_timeout=2)
+        params = {'country': 'Ghana'}
+        self.cache.get_or_compute(params, lambda: ['old'])
+
+        other.invalidate('Ghana', 'Bungalow')
+        remembered = self.cache.get_or_compute(params, lambda: ['new'])
+        with patch('listing.cache.time.monotonic',
+                   return_value=time.monotonic() + 11):
+            expired = self.cache.get_or_compute(params, lambda: ['new'])
+
+        self.assertEqual(remembered, ['old'])
+        self.assertEqual(expired, ['new'])
+        self.assertEqual(other.get_or_compute(params, list), ['new'])
+
+    def test_local_hit_skips_shared_cache(self):
+        """Tests a repeated lookup is answered within the process."""
+        self.cache.get_or_compute({}, lambda: ['listing'])
+
+        with patch.object(self.cache.shared, 'get_many') as get_many, \
+                patch.object(self.cache.shared, 'get') as get:
+            data = self.cache.get_or_compute({}, list)
+
+        self.assertEqual(data, ['listing'])
+        get_many.assert_not_called()
+        get.assert_not_called()
+
+    def test_keeps_lock_held_by_another_process(self):
+        """Tests computing after a lock wait times out leaves the other
+        holder's lock in place.
+        """
+        self.cache.lock_timeout = 0.1
+        lock = f"{self.cache.key({})}:lock"
+        self.cache.shared.set(lock, 'other', 30)
+
+        data = self.cache.get_or_compute({}, lambda: ['listing'])
+
+        self.assertEqual(data, ['listing'])
+        self.assertEqual(self.cache.shared.get(lock), 'other')
+
+
+class TestPropertyListCaching(TestCase):
+    """Tests the property list endpoint with the cache in front"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testing123'
+        )
+        self.client = APIClient()
+        self.unit = Unit.objects.create()
+        self.bungalow = PropertyType.objects.create(name='Bungalow')
+        self.lagos = Location.objects.create(
+            name='Lagos',
+            country=Country.objects.create(name='Nigeria')
+        )
+        self.accra = Location.objects.create(
+            name='Accra',
+            country=Country.objects.create(name='Ghana')
+        )
+        property_cache.clear()
+
+    def create_property(self, location, **params):
+        return Property.objects.create(
+            name=params.pop('name', 'Garden Heights'),
+            price_per_unit=params.pop('price_per_unit', 40),
+            owner=self.user,
+            location=location,
+            property_type=self.bungalow,
+            unit=self.unit,
+            **params
+        )
+
+    def test_repeated_list_served_from_cache(self):
+        """Tests a repeated search does not query the database."""
+        self.create_property(self.lagos)
+        self.client.get(PROPERTY_LISTING_URL, {'country': 'nigeria'})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PROPERTY_LISTING_URL,
+                                  {'country': 'Nigeria'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(queries), 0)
+
+    def test_write_invalidates_matching_search(self):
+        """Tests creating, moving and deleting properties is visible."""
+        res = self.client.get(PROPERTY_LISTING_URL, {'country': 'Nigeria'})
+        self.assertEqual(res.data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            prop = self.create_property(self.lagos)
+        res = self.client.get(PROPERTY_LISTING_URL, {'country': 'Nigeria'})
+        self.assertEqual([p['id'] for p in res.data], [prop.id])
+
+        prop.location = self.accra
+        with self.captureOnCommitCallbacks(execute=True):
+            prop.save()
+        res = self.client.get(PROPERTY_LISTING_URL, {'country': 'Nigeria'})
+        self.assertEqual(res.data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            prop.delete()
+        res = self.client.get(PROPERTY_LISTING_URL, {'country': 'Ghana'})
+        self.assertEqual(res.data, [])
+
+    def test_invalidated_on_commit(self):
+        """Tests a search stays cached until the write commits, so reads
+        during the transaction cannot cache rows it is about to change.
+        """
+        self.client.get(PROPERTY_LISTING_URL, {'country': 'Nigeria'})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_property(self.lagos)
+            res = self.client.get(PROPERTY_LISTING_URL,
+                                  {'country': 'Nigeria'})
+        self.assertEqual(res.data, [])
+
+        for callback in callbacks:
+            callback()
+        res = self.client.get(PROPERTY_LISTING_URL, {'country': 'Nigeria'})
+        self.assertEqual(len(res.data), 1)
+
+    def test_filter_properties(self):
+        """Tests filtering the list by country, availability and price."""
+        cheap = self.create_property(self.lagos, price_per_unit=10)
+        self.create_property(self.lagos, price_per_unit=90)
+        self.create_property(self.lagos, price_per_unit=12, available=False)
+        self.create_property(self.accra, price_per_unit=10)
+
+        res = self.client.get(PROPERTY_LISTING_URL, {
+            'country': 'Nigeria',
+            'available': 'true',
+            'max_price': '50',
+        })
+
+        self.assertEqual([p['id'] for p in res.data], [cheap.id])
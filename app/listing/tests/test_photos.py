@@ -0,0 +1,252 @@
+"""
+Tests for property photo uploads and downloads
+"""
+import hashlib
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Country,
+    Location,
+    Photo,
+    Property,
+    PropertyPhoto,
+    PropertyType,
+    Unit,
+)
+from listing import photos
+
+JPEG = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 800
+
+
+def photos_url(prop_id):
+    """Reverse url for the photos of a property"""
+    return reverse('listing:property-photos', args=[prop_id])
+
+
+def photo_url(digest):
+    """Reverse url to download a photo"""
+    return reverse('listing:photo', args=[digest])
+
+
+def upload(data=JPEG, name='front.jpg'):
+    return {'photo': SimpleUploadedFile(name, data)}
+
+
+class PhotoTestCase(TestCase):
+    """Stores photos in a temporary directory for each test"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        config = override_settings(PHOTOS={**settings.PHOTOS,
+                                           'ROOT': self.root})
+        config.enable()
+        self.addCleanup(config.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email='owner@example.com', password='testing123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        location = Location.objects.create(
+            name='Lagos', country=Country.objects.create(name='Nigeria')
+        )
+        self.props = [
+            Property.objects.create(
+                name=f'Home {n}', owner=self.user, location=location,
+                property_type=PropertyType.objects.get_or_create(
+                    name='Bungalow'
+                )[0],
+                unit=Unit.objects.create(name='DAY'),
+                price_per_unit=Decimal('40'),
+            )
+            for n in range(2)
+        ]
+
+    def stored_files(self):
+        return [path for path in self.root.rglob('*') if path.is_file()]
+
+
+class TestPhotoUpload(PhotoTestCase):
+    """Tests photos are streamed to storage and stored once"""
+
+    def test_upload_photo(self):
+        """Tests a photo is stored under the hash of its content."""
+        res = self.client.post(photos_url(self.props[0].id), upload(),
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        digest = hashlib.sha256(JPEG).hexdigest()
+        self.assertEqual(res.data['sha256'], digest)
+        self.assertEqual(res.data['content_type'], 'image/jpeg')
+        self.assertTrue(res.data['url'].endswith(photo_url(digest)))
+        self.assertEqual(photos.photo_path(digest).read_bytes(), JPEG)
+
+    def test_upload_streamed_in_chunks(self):
+        """Tests the upload is read a bounded chunk at a time."""
+        sizes = []
+        receive = photos.HashingUploadHandler.receive_data_chunk
+
+        def record(handler, raw_data, start):
+            sizes.append(len(raw_data))
+            return receive(handler, raw_data, start)
+
+        with patch.object(photos.HashingUploadHandler, 'receive_data_chunk',
+                          record):
+            self.client.post(photos_url(self.props[0].id), upload(),
+                             format='multipart')
+
+        self.assertGreater(len(sizes), 1)
+        self.assertLessEqual(max(sizes), photos.CHUNK_SIZE)
+
+    def test_duplicates_stored_once(self):
+        """Tests the same photo on two listings is stored once."""
+        for prop in self.props:
+            self.client.post(photos_url(prop.id), upload(),
+                             format='multipart')
+        again = self.client.post(photos_url(self.props[0].id), upload(),
+                                 format='multipart')
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertEqual(Photo.objects.count(), 1)
+        self.assertEqual(PropertyPhoto.objects.count(), 2)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_non_image_rejected(self):
+        """Tests files that are not images are refused."""
+        res = self.client.post(photos_url(self.props[0].id),
+                               upload(b'#!/bin/sh\n', 'photo.jpg'),
+                               format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_large_photo_rejected(self):
+        """Tests photos over the size limit are refused."""
+        with override_settings(PHOTOS={**settings.PHOTOS,
+                                       'MAX_SIZE': 1000}):
+            res = self.client.post(photos_url(self.props[0].id), upload(),
+                                   format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Photo.objects.exists())
+
+    def test_only_owner_uploads(self):
+        """Tests other users cannot add photos to a listing."""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testing123'
+        )
+        self.client.force_authenticate(user=other)
+
+        res = self.client.post(photos_url(self.props[0].id), upload(),
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_list_photos(self):
+        """Tests the photos of a listing are listed in order."""
+        self.client.post(photos_url(self.props[0].id), upload(),
+                         format='multipart')
+        self.client.post(photos_url(self.props[0].id),
+                         upload(JPEG + b'x', 'back.jpg'),
+                         format='multipart')
+
+        res = APIClient().get(photos_url(self.props[0].id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['position'] for item in res.data], [0, 1])
+
+
+class TestPhotoDownload(PhotoTestCase):
+    """Tests photos are served with caching and range support"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.post(photos_url(self.props[0].id), upload(),
+                         format='multipart')
+        self.digest = hashlib.sha256(JPEG).hexdigest()
+        self.url = photo_url(self.digest)
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def content(self, res):
+        """Reads a streamed body, which closes the file it came from."""
+        return b''.join(res.streaming_content)
+
+    def test_download(self):
+        """Tests the full photo is served, cacheable for good."""
+        res = self.get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.content(res), JPEG)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['ETag'], f'"{self.digest}"')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_not_modified(self):
+        """Tests clients holding the photo get an empty 304."""
+        res = self.get(HTTP_IF_NONE_MATCH=f'"{self.digest}"')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        """Tests a byte range is served as partial content."""
+        res = self.get(HTTP_RANGE='bytes=4-13')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(self.content(res), JPEG[4:14])
+        self.assertEqual(res['Content-Range'], f'bytes 4-13/{len(JPEG)}')
+
+    def test_suffix_range(self):
+        """Tests the last bytes can be asked for."""
+        res = self.get(HTTP_RANGE='bytes=-5')
+
+        self.assertEqual(self.content(res), JPEG[-5:])
+
+    def test_unsatisfiable_range(self):
+        """Tests a range past the end gets a 416."""
+        res = self.get(HTTP_RANGE=f'bytes={len(JPEG)}-')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_stale_if_range(self):
+        """Tests a range for another version gets the whole photo."""
+        res = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.content(res), JPEG)
+
+    def test_accel_redirect(self):
+        """Tests downloads are handed to the proxy when configured."""
+        with override_settings(PHOTOS={**settings.PHOTOS,
+                                       'ACCEL_REDIRECT': '/protected/'}):
+            res = self.get()
+
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}'
+        )
+        self.assertEqual(res.content, b'')
+
+    def test_unknown_photo(self):
+        """Tests unknown hashes are not found."""
+        res = self.client.get(photo_url('0' * 64))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,280 @@
+"""
+Tests for the property price and availability history
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Country,
+    Job,
+    Location,
+    Property,
+    PropertyHistory,
+    PropertyType,
+    Unit,
+)
+from core import jobs
+from core.tests.harness import QueryHarnessMixin
+from listing import history, tasks
+
+
+def price_history_url(prop_id):
+    """Reverse url for the price history of a property"""
+    return reverse('listing:property-price-history', args=[prop_id])
+
+
+def location_history_url(location_id):
+    """Reverse url for the price history of a location"""
+    return reverse('listing:location_price_history', args=[location_id])
+
+
+def create_user(**params):
+    """Handles creating new users for testing"""
+    return get_user_model().objects.create_user(**params)
+
+
+class TestPriceHistory(QueryHarnessMixin, TestCase):
+    """Tests recording and serving the price history"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='owner@example.com',
+                                password='testing123')
+        country = Country.objects.create(name='Nigeria')
+        self.location = Location.objects.create(name='Ikeja',
+                                                country=country)
+        self.property_type = PropertyType.objects.create(name='Duplex')
+        self.unit = Unit.objects.create(name='MONTH')
+        self.prop = self.create_property(price_per_unit=Decimal('100.00'))
+
+    def create_property(self, **params):
+        return Property.objects.create(
+            name='Garden Heights',
+            owner=self.user,
+            location=self.location,
+            property_type=self.property_type,
+            unit=self.unit,
+            **params
+        )
+
+    def prices(self, prop):
+        return list(prop.history.order_by('id').values_list(
+            'price_per_unit', 'available'
+        ))
+
+    def test_records_creation_and_relevant_changes(self):
+        """Tests only price and availability changes are recorded."""
+        self.client.force_authenticate(self.user)
+        url = reverse('listing:property-detail', args=[self.prop.id])
+
+        self.client.patch(url, {'name': 'Renamed'})
+        self.client.patch(url, {'price_per_unit': '120.00'})
+        self.client.patch(url, {'available': False})
+
+        self.assertEqual(self.prices(self.prop), [
+            (Decimal('100.00'), True),
+            (Decimal('120.00'), True),
+            (Decimal('120.00'), False),
+        ])
+
+    def test_bulk_update_recorded_per_row(self):
+        """Tests a queryset update records every row it changed."""
+        other = self.create_property(price_per_unit=Decimal('50.00'))
+
+        Property.objects.filter(
+            id__in=[self.prop.id, other.id]
+        ).update(available=False)
+
+        self.assertEqual(PropertyHistory.objects.filter(
+            available=False
+        ).count(), 2)
+
+    def test_property_price_history(self):
+        """Tests a property's history is listed oldest first."""
+        Property.objects.filter(id=self.prop.id).update(
+            price_per_unit=Decimal('90.00')
+        )
+
+        res = self.client.get(price_history_url(self.prop.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['price_per_unit'] for row in res.data],
+                         ['100.00', '90.00'])
+
+    def test_property_price_history_period(self):
+        """Tests the history is limited to the requested period."""
+        yesterday = timezone.now().date() - timedelta(days=1)
+
+        res = self.client.get(price_history_url(self.prop.id),
+                              {'until': yesterday.isoformat()})
+        invalid = self.client.get(price_history_url(self.prop.id), {
+            'since': timezone.now().date().isoformat(),
+            'until': yesterday.isoformat(),
+        })
+
+        self.assertEqual(res.data, [])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_location_history_buckets(self):
+        """Tests the prices at a location are aggregated per bucket."""
+        self.create_property(price_per_unit=Decimal('200.00'),
+                             available=False)
+
+        res = self.client.get(location_history_url(self.location.id),
+                              {'bucket': 'day'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        bucket = res.data[0]
+        self.assertEqual(bucket['unit'], 'MONTH')
+        self.assertEqual(bucket['changes'], 2)
+        self.assertEqual(bucket['available_changes'], 1)
+        self.assertEqual(bucket['min_price'], '100.00')
+        self.assertEqual(bucket['avg_price'], '150.00')
+        self.assertEqual(bucket['max_price'], '200.00')
+
+    def test_location_history_keeps_purged_properties(self):
+        """Tests the history of properties deleted outright still counts
+        towards their location.
+        """
+        Property.all_objects.filter(id=self.prop.id).delete()
+
+        res = self.client.get(location_history_url(self.location.id),
+                              {'bucket': 'day'})
+
+        [bucket] = res.data
+        self.assertEqual(bucket['unit'], 'MONTH')
+        self.assertEqual(bucket['changes'], 1)
+
+    def test_location_history_unknown_location(self):
+        res = self.client.get(location_history_url(self.location.id + 1))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_property_history_constant_queries(self):
+        """Tests the query count does not grow with the history."""
+        def grow(count):
+            for step in range(count):
+                Property.objects.filter(id=self.prop.id).update(
+                    price_per_unit=Decimal(step + 1)
+                )
+
+        self.assertConstantQueries(
+            lambda: self.client.get(price_history_url(self.prop.id)), grow
+        )
+
+
+class TestPriceHistoryPartitions(TestCase):
+    """Tests the upkeep of the monthly partitions"""
+
+    def test_month_start(self):
+        day = date(2026, 11, 19)
+
+        self.assertEqual(history.month_start(day, 2),
+                         date(2027, 1, 1))
+        self.assertEqual(history.month_start(day, -11),
+                         date(2025, 12, 1))
+
+    def test_create_partitions_ahead(self):
+        """Tests missing months are created once."""
+        today = timezone.now().date()
+        created = history.create_partitions(5, today=today)
+
+        self.assertEqual(created, [
+            history.partition_name(history.month_start(today, offset))
+            for offset in (4, 5)
+        ])
+        self.assertEqual(history.create_partitions(5, today=today), [])
+
+    def test_drop_expired_partitions(self):
+        """Tests months past the retention period are dropped whole."""
+        today = timezone.now().date()
+        expired = history.partition_name(history.month_start(today))
+
+        dropped = history.drop_partitions(
+            1, today=history.month_start(today, 2)
+        )
+
+        self.assertEqual(dropped[0], expired)
+        self.assertNotIn(history.month_start(today), history.partitions())
+        self.assertIn(history.month_start(today, 1), history.partitions())
+
+    def test_rows_in_default_partition_moved(self):
+        """Tests a month whose rows landed in the default partition gets
+        its own partition with those rows.
+        """
+        today = timezone.now().date()
+        month = history.month_start(today, 6)
+        prop = Property.objects.create(
+            name='Garden Heights',
+            owner=get_user_model().objects.create_user(
+                email='owner@example.com', password='testing123'
+            ),
+            location=Location.objects.create(
+                name='Ikeja', country=Country.objects.create(name='Nigeria')
+            ),
+            property_type=PropertyType.objects.create(name='Duplex'),
+            unit=Unit.objects.create(name='MONTH'),
+            price_per_unit=Decimal('100.00'),
+        )
+        PropertyHistory.objects.create(
+            property=prop, location_id=prop.location_id, unit=prop.unit,
+            price_per_unit=Decimal('90.00'), available=True,
+            changed_at=timezone.make_aware(datetime.combine(month, time())),
+        )
+
+        with self.assertLogs('listing.history', 'WARNING'):
+            created = history.create_partitions(6, today=today)
+
+        self.assertIn(history.partition_name(month), created)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {history.DEFAULT_PARTITION}'
+            )
+            self.assertEqual(cursor.fetchone(), (0,))
+            cursor.execute(
+                f'SELECT count(*) FROM {history.partition_name(month)}'
+            )
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_worker_schedules_periodic_jobs(self):
+        """Tests a starting worker queues the periodic jobs, so they run
+        without being scheduled by hand.
+        """
+        jobs.Worker(queues=['none']).run(once=True)
+
+        self.assertEqual(
+            set(Job.objects.values_list('name', flat=True)),
+            {'listing.maintain_price_history', 'listing.refresh_price_stats',
+             'listing.prune_property_changes'},
+        )
+
+    def test_failed_maintenance_still_rescheduled(self):
+        """Tests maintenance that fails queues the next run anyway."""
+        with patch('listing.history.create_partitions',
+                   side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            tasks.maintain_price_history(repeat=True)
+
+        [job] = Job.objects.all()
+        self.assertEqual(job.name, 'listing.maintain_price_history')
+
+    def test_maintenance_scheduled_once(self):
+        """Tests the maintenance job reschedules itself without piling
+        up.
+        """
+        self.assertTrue(tasks.schedule_price_history())
+        self.assertFalse(tasks.schedule_price_history())
+
+        [job] = Job.objects.all()
+        self.assertEqual(job.name, 'listing.maintain_price_history')
@@ -0,0 +1,215 @@
+"""
+Tests for saved searches and the matching of new listings
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Country,
+    Job,
+    Location,
+    Property,
+    PropertyType,
+    SavedSearch,
+    SearchMatch,
+    Unit,
+)
+from listing import searches, tasks
+
+SAVED_SEARCHES_URL = reverse('listing:saved-search-list')
+PROPERTY_LISTING_URL = reverse('listing:property-list')
+
+
+def matches_url(search_id):
+    """Reverse url for the matches of a saved search"""
+    return reverse('listing:saved-search-matches', args=[search_id])
+
+
+def create_user(**params):
+    """Handles creating new users for testing"""
+    return get_user_model().objects.create_user(**params)
+
+
+class TestSavedSearchMatching(TestCase):
+    """Tests new listings are matched to the saved searches they fit"""
+
+    def setUp(self):
+        self.owner = create_user(email='owner@example.com',
+                                 password='testing123')
+        self.searcher = create_user(email='searcher@example.com',
+                                    password='testing123')
+        self.nigeria = Country.objects.create(name='Nigeria')
+        self.ghana = Country.objects.create(name='Ghana')
+        self.lagos = Location.objects.create(name='Lagos',
+                                             country=self.nigeria)
+        self.accra = Location.objects.create(name='Accra',
+                                             country=self.ghana)
+        self.bungalow = PropertyType.objects.create(name='Bungalow')
+        self.duplex = PropertyType.objects.create(name='Duplex')
+        self.unit = Unit.objects.create(name='DAY')
+
+    def listing(self, location, property_type, price, **params):
+        return Property.objects.create(
+            name='Garden Heights', owner=self.owner, location=location,
+            property_type=property_type, unit=self.unit,
+            price_per_unit=Decimal(price), **params
+        )
+
+    def search(self, **params):
+        return SavedSearch.objects.create(owner=self.searcher, **params)
+
+    def matched(self):
+        return set(SearchMatch.objects.values_list('search', 'property'))
+
+    def test_filters_matched(self):
+        """Tests each listing matches exactly the searches it fits,
+        unset filters matching anything.
+        """
+        anything = self.search()
+        nigeria = self.search(country=self.nigeria)
+        duplexes = self.search(property_type=self.duplex)
+        cheap_lagos = self.search(country=self.nigeria,
+                                  property_type=self.bungalow,
+                                  max_price=Decimal('50'))
+        pricey = self.search(min_price=Decimal('100'))
+
+        cheap = self.listing(self.lagos, self.bungalow, '40')
+        ghana_duplex = self.listing(self.accra, self.duplex, '150')
+
+        self.assertEqual(searches.match_pending(), 6)
+        self.assertEqual(self.matched(), {
+            (anything.id, cheap.id), (nigeria.id, cheap.id),
+            (cheap_lagos.id, cheap.id), (anything.id, ghana_duplex.id),
+            (duplexes.id, ghana_duplex.id), (pricey.id, ghana_duplex.id),
+        })
+
+    def test_listings_matched_once(self):
+        """Tests a listing is only matched by the first run after it is
+        created.
+        """
+        self.search()
+        prop = self.listing(self.lagos, self.bungalow, '40')
+        searches.match_pending()
+        SearchMatch.objects.all().delete()
+
+        self.assertEqual(searches.match_pending(), 0)
+        prop.refresh_from_db()
+        self.assertTrue(prop.search_matched)
+        self.assertEqual(prop.version, 1)
+
+    def test_own_and_deleted_listings_skipped(self):
+        """Tests searches never match their owner's or deleted listings."""
+        self.search()
+        self.owner.saved_searches.create()
+        deleted = self.listing(self.lagos, self.bungalow, '40')
+        deleted.soft_delete()
+        self.listing(self.lagos, self.bungalow, '40')
+
+        self.assertEqual(searches.match_pending(), 1)
+        self.assertFalse(SearchMatch.objects.filter(
+            search__owner=self.owner
+        ).exists())
+
+    def test_batch_matched_in_one_statement(self):
+        """Tests a batch is matched without a query per search or
+        listing.
+        """
+        for _ in range(20):
+            self.search(country=self.nigeria)
+        for _ in range(10):
+            self.listing(self.lagos, self.bungalow, '40')
+
+        with CaptureQueriesContext(connection) as ctx:
+            listings, matches = searches.match_batch()
+
+        self.assertEqual((listings, matches), (10, 200))
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+
+    def test_creation_queues_one_run(self):
+        """Tests creating listings queues a single matching run."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing(self.lagos, self.bungalow, '40')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing(self.lagos, self.bungalow, '50')
+
+        self.assertEqual(Job.objects.filter(
+            name=tasks.match_saved_searches.task_name
+        ).count(), 1)
+
+
+class TestSavedSearchAPI(TestCase):
+    """Tests users managing their saved searches"""
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com',
+                                password='testing123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.country = Country.objects.create(name='Nigeria')
+
+    def test_create_saved_search(self):
+        """Tests saving a search by country name and price range."""
+        res = self.client.post(SAVED_SEARCHES_URL, {
+            'name': 'Cheap in Nigeria',
+            'country': 'Nigeria',
+            'max_price': '80.00',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        search = SavedSearch.objects.get()
+        self.assertEqual((search.owner, search.country),
+                         (self.user, self.country))
+        self.assertIsNone(search.property_type)
+
+    def test_empty_price_range_rejected(self):
+        """Tests a maximum price below the minimum is refused."""
+        res = self.client.post(SAVED_SEARCHES_URL, {
+            'min_price': '90.00',
+            'max_price': '80.00',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_price', res.data)
+
+    def test_only_own_searches_listed(self):
+        """Tests users only see their own saved searches."""
+        other = create_user(email='other@example.com', password='pass1234')
+        SavedSearch.objects.create(owner=other, name='Theirs')
+        SavedSearch.objects.create(owner=self.user, name='Mine')
+
+        res = self.client.get(SAVED_SEARCHES_URL)
+
+        self.assertEqual([item['name'] for item in res.data], ['Mine'])
+
+    def test_matches_listed(self):
+        """Tests the listings matched by a search are listed."""
+        search = SavedSearch.objects.create(owner=self.user)
+        owner = create_user(email='owner@example.com', password='pass1234')
+        prop = Property.objects.create(
+            name='Garden Heights', owner=owner,
+            location=Location.objects.create(name='Lagos',
+                                             country=self.country),
+            property_type=PropertyType.objects.create(name='Bungalow'),
+            unit=Unit.objects.create(name='DAY'),
+            price_per_unit=Decimal('40'),
+        )
+        searches.match_pending()
+
+        res = self.client.get(matches_url(search.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [prop.id])
+
+    def test_requires_authentication(self):
+        """Tests saved searches are private to signed in users."""
+        res = APIClient().get(SAVED_SEARCHES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
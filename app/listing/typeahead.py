@@ -0,0 +1,129 @@
+"""
+Location autocomplete.
+
+Exact prefix matches come from a sorted, case-folded list of location
+names held by each process, so most keystrokes never reach the database.
+When those run short, fuzzy matches are looked up through the pg_trgm
+index on core_location.name, where the extension is installed. The list
+is rebuilt after locations change, using the reference data generation
+the bootstrap bundle is versioned by, and like the bundle at least every
+bootstrap.MAX_AGE seconds in case the change was missed.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection
+
+from core.models import Location
+from listing import bootstrap
+
+# Shorter inputs have no trigrams to match on.
+FUZZY_MIN_LENGTH = 3
+
+_trigram = {}
+
+
+def fold(name):
+    return name.casefold()
+
+
+def trigram_available():
+    """Whether pg_trgm is installed in the current database."""
+    database = connection.settings_dict['NAME']
+    if database not in _trigram:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            _trigram[database] = cursor.fetchone() is not None
+    return _trigram[database]
+
+
+class PrefixIndex:
+    """Location names sorted by folded name, overall and per country."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = None
+        self.expires = 0.0
+        self.scopes = {}
+
+    def _build(self):
+        """Maps each country, and None for all, to parallel lists of
+        folded keys and names, sorted and without duplicates.
+        """
+        entries = {None: set()}
+        rows = Location.objects.values_list('name', 'country__name')
+        for name, country in rows:
+            entry = (fold(name), name)
+            entries[None].add(entry)
+            entries.setdefault(fold(country), set()).add(entry)
+        scopes = {}
+        for scope, pairs in entries.items():
+            pairs = sorted(pairs)
+            scopes[scope] = ([key for key, _ in pairs],
+                             [name for _, name in pairs])
+        return scopes
+
+    def current(self):
+        """The scopes for the current reference data, rebuilt on change
+        or once they are MAX_AGE old.
+        """
+        generation = cache.get(bootstrap.GENERATION_KEY, 0)
+        if generation != self.generation or time.time() >= self.expires:
+            with self._lock:
+                if generation != self.generation \
+                        or time.time() >= self.expires:
+                    self.scopes = self._build()
+                    self.generation = generation
+                    self.expires = time.time() + bootstrap.MAX_AGE
+        return self.scopes
+
+    def search(self, prefix, country=None, limit=10):
+        """Up to `limit` names starting with `prefix`, in order."""
+        scope = self.current().get(fold(country) if country else None)
+        if scope is None:
+            return []
+        keys, names = scope
+        prefix = fold(prefix)
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and end - start < limit \
+                and keys[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+
+prefix_index = PrefixIndex()
+
+
+def fuzzy_search(text, country=None, limit=10, exclude=()):
+    """Names most similar to `text`, using the trigram index."""
+    if len(text) < FUZZY_MIN_LENGTH or not trigram_available():
+        return []
+    queryset = Location.objects.filter(name__trigram_word_similar=text)
+    if country:
+        queryset = queryset.filter(country__name=country)
+    if exclude:
+        queryset = queryset.exclude(name__in=exclude)
+    queryset = queryset.annotate(
+        similarity=TrigramWordSimilarity(text, 'name')
+    ).order_by('-similarity', 'name').values_list('name', flat=True)
+    found = []
+    for name in queryset[:limit * 2]:
+        if name not in found:
+            found.append(name)
+    return found[:limit]
+
+
+def suggest(text, country=None, limit=10):
+    """Location names for an autocomplete box: prefix matches first,
+    then fuzzy ones.
+    """
+    names = prefix_index.search(text, country, limit)
+    if len(names) < limit:
+        names += fuzzy_search(text, country, limit - len(names), names)
+    return names
@@ -1,10 +1,17 @@
 """
 URL patterns for the listing API
 """
-from django.urls import path
+from django.urls import path, include
+
+from rest_framework.routers import DefaultRouter
 
 from listing import views
 
+router = DefaultRouter()
+router.register('properties', views.PropertyViewset, basename='property')
+router.register('saved_searches', views.SavedSearchViewset,
+                basename='saved-search')
+
 app_name = 'listing'
 
 urlpatterns = [
@@ -13,4 +20,12 @@ urlpatterns = [
   path('countries/', views.CountryListingView.as_view(), name='countries'),
   path('locations/', views.LocationListingView.as_view(), name='locations'),
   path('amenities/', views.AmenityListingView.as_view(), name='amenities'),
+  path('bootstrap/', views.BootstrapView.as_view(), name='bootstrap'),
+  path('changes/', views.PropertyChangesView.as_view(), name='changes'),
+  path('price_stats/', views.PriceStatsView.as_view(), name='price_stats'),
+  path('locations/<int:location_id>/price_history/',
+       views.LocationPriceHistoryView.as_view(),
+       name='location_price_history'),
+  path('photos/<str:digest>/', views.PhotoView.as_view(), name='photo'),
+  path('', include(router.urls)),
 ]
@@ -1,20 +1,72 @@
 """
 Contains all the API views for handling listings
 """
-from rest_framework.generics import ListAPIView
+import base64
+import binascii
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.views import View
+
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    PermissionDenied,
+    UnsupportedMediaType,
+    ValidationError,
+)
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.permissions import (
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from core.http import precomputed_response
+from core.pagination import EstimatedPageNumberPagination
+from core.versioning import VersionETagMixin
 from core.models import (
     PropertyType,
     Country,
     Location,
     Amenity,
+    Photo,
+    Property,
+    PropertyChange,
+    PropertyPhoto,
+    SavedSearch,
 )
+from listing import (
+    bootstrap,
+    change_log,
+    counters,
+    history,
+    photos,
+    price_stats,
+    typeahead,
+)
+from listing.cache import property_cache
+from listing.similar import similarity_index
 from listing.serializers import (
     PropertyTypeSerializer,
     CountrySerializer,
     LocationSerializer,
     AmenitySerializer,
+    PropertySerializer,
+    PropertyDetailSerializer,
+    PropertyChangeSerializer,
+    PropertyPhotoSerializer,
+    PropertyRankingSerializer,
+    PriceHistoryBucketSerializer,
+    PriceHistoryQuerySerializer,
+    PriceHistorySerializer,
+    PriceStatsSerializer,
+    SavedSearchSerializer,
 )
 
 
@@ -31,8 +83,13 @@ class CountryListingView(ListAPIView):
 
 
 class LocationListingView(ListAPIView):
-    """Handles the listing of all locations available"""
+    """Handles the listing of all locations available.
+
+    With `?prefix=` it autocompletes location names instead, optionally
+    within a `country`.
+    """
     serializer_class = LocationSerializer
+    max_suggestions = 50
 
     def get_queryset(self):
         queryset = Location.objects.all()
@@ -42,6 +99,22 @@ class LocationListingView(ListAPIView):
             queryset = queryset.filter(country=country)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        prefix = request.query_params.get('prefix')
+        if prefix is None:
+            return super().list(request, *args, **kwargs)
+        country = request.query_params.get('country')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        names = typeahead.suggest(
+            prefix.strip(),
+            country=country.title() if country else None,
+            limit=max(1, min(limit, self.max_suggestions)),
+        ) if prefix.strip() else []
+        return Response([{'name': name} for name in names])
+
 
 class AmenityListingView(ListAPIView):
     """Handles the listing of all amenities available."""
@@ -49,6 +122,361 @@ class AmenityListingView(ListAPIView):
     serializer_class = AmenitySerializer
 
 
-class PropertyViewset(ModelViewSet):
+class BootstrapView(View):
+    """Serves all the reference data in a single precomputed payload."""
+
+    def get(self, request, *args, **kwargs):
+        etag, body, gzipped = bootstrap.load_bundle()
+        return precomputed_response(request, etag, body, gzipped,
+                                    'application/json', max_age=60)
+
+
+class PropertyViewset(VersionETagMixin, ModelViewSet):
     """Handles all the actions associated with properties"""
-    pass
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = PropertyDetailSerializer
+    pagination_class = EstimatedPageNumberPagination
+
+    def get_queryset(self):
+        queryset = Property.objects.select_related(
+            'property_type',
+            'location',
+            'unit',
+        ).order_by('id')
+        if self.action in ('update', 'partial_update', 'destroy'):
+            queryset = queryset.filter(owner_id=self.request.user.id)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        params = property_cache.normalize(self.request.query_params)
+        if 'country' in params:
+            queryset = queryset.filter(
+                location__country__name=params['country']
+            )
+        if 'property_type' in params:
+            queryset = queryset.filter(
+                property_type__name=params['property_type']
+            )
+        if 'available' in params:
+            queryset = queryset.filter(
+                available=params['available'] == 'True'
+            )
+        if 'min_price' in params:
+            queryset = queryset.filter(price_per_unit__gte=params['min_price'])
+        if 'max_price' in params:
+            queryset = queryset.filter(price_per_unit__lte=params['max_price'])
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'similar'):
+            return PropertySerializer
+        if self.action == 'most_viewed':
+            return PropertyRankingSerializer
+        if self.action == 'photos':
+            return PropertyPhotoSerializer
+        if self.action == 'price_history':
+            return PriceHistorySerializer
+        return self.serializer_class
+
+    def list(self, request, *args, **kwargs):
+        """Lists properties, served from the listing cache when possible."""
+        params = property_cache.normalize(request.query_params)
+        data = property_cache.get_or_compute(params, self._list_data)
+        if isinstance(data, dict):
+            # Only pages count as impressions; the full list is an export.
+            counters.record_impressions([item['id']
+                                         for item in data['results']])
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        counters.record_view(response.data['id'])
+        return response
+
+    def _list_data(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ).data
+        return list(self.get_serializer(queryset, many=True).data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Lists the properties most like this one, nearest first."""
+        prop = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        ids = similarity_index.similar(prop.id, max(1, min(limit, 50)))
+        found = self.get_queryset().in_bulk(ids)
+        results = [found[pk] for pk in ids if pk in found]
+        counters.record_impressions([result.id for result in results])
+        return Response(self.get_serializer(results, many=True).data)
+
+    @action(detail=False)
+    def most_viewed(self, request):
+        """Lists the most viewed properties, most first, as of the last
+        flush of the view counters.
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            counter__views__gt=0
+        ).annotate(
+            views=F('counter__views')
+        ).order_by('-counter__views', 'counter__property')
+        return Response(self.get_serializer(
+            queryset[:max(1, min(limit, 50))], many=True
+        ).data)
+
+    @action(detail=True)
+    def price_history(self, request, pk=None):
+        """Lists the prices and availability of a property over the
+        period given by `since` and `until`, the last year by default,
+        oldest first.
+        """
+        prop = self.get_object()
+        query = PriceHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(self.get_serializer(
+            history.for_property(prop.id,
+                                 since=query.validated_data.get('since'),
+                                 until=query.validated_data.get('until')),
+            many=True
+        ).data)
+
+    @action(detail=True, methods=['get', 'post'],
+            parser_classes=[MultiPartParser])
+    def photos(self, request, pk=None):
+        """Lists the photos of a property, or adds one sent as the
+        `photo` field of a multipart upload.
+        """
+        prop = self.get_object()
+        if request.method == 'GET':
+            return Response(self.get_serializer(
+                prop.photos.select_related('photo').order_by('position',
+                                                             'id'),
+                many=True
+            ).data)
+        if prop.owner_id != request.user.id:
+            raise PermissionDenied()
+        return self._add_photo(request, prop)
+
+    def _add_photo(self, request, prop):
+        max_size = settings.PHOTOS['MAX_SIZE']
+        # Room for the multipart framing around the file.
+        if int(request.META.get('CONTENT_LENGTH') or 0) \
+                > max_size + photos.CHUNK_SIZE:
+            raise photos.PayloadTooLarge()
+        handler = photos.HashingUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        upload = request.data.get('photo')
+        if getattr(handler, 'error', None) == 'size':
+            raise photos.PayloadTooLarge()
+        if getattr(handler, 'error', None) == 'type':
+            raise UnsupportedMediaType(
+                request.content_type,
+                detail='Photos must be JPEG, PNG or WebP images.'
+            )
+        if upload is None:
+            raise ValidationError({'photo': 'No file was submitted.'})
+
+        with transaction.atomic():
+            photos.store(upload)
+            photo, _ = Photo.objects.get_or_create(
+                sha256=upload.sha256,
+                defaults={'size': upload.size,
+                          'content_type': upload.content_type},
+            )
+            link, created = PropertyPhoto.objects.get_or_create(
+                property=prop, photo=photo,
+                defaults={'position': prop.photos.count()},
+            )
+        return Response(
+            self.get_serializer(link).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
+
+def encode_cursor(txid, pk):
+    """Packs a feed position into an opaque cursor."""
+    raw = f'{txid}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Unpacks a cursor made by `encode_cursor`."""
+    try:
+        txid, pk = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        return int(txid), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise serializers.ValidationError({'cursor': 'Invalid cursor.'})
+
+
+class PropertyChangesView(GenericAPIView):
+    """Lists properties created, updated or deleted since a cursor.
+
+    Changes come from the change log in (transaction, id) order, and only
+    from transactions older than every transaction still running: one
+    that commits later cannot add a change before a position already
+    served. Each property shows once per page, in its latest state, or as
+    a tombstone once it is deleted. A cursor from before the pruned part
+    of the log gets 410 with the cursor to continue from once the client
+    has reloaded the listings.
+    """
+    serializer_class = PropertyChangeSerializer
+    page_size = 100
+    max_page_size = 1000
+
+    def get_queryset(self):
+        return PropertyChange.objects.settled()
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.query_params.get('limit',
+                                                     self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_properties(self, changes):
+        """The current state of each changed property, last changed
+        last, with purged ones as bare tombstones.
+        """
+        changed_at = {}
+        for change in changes:
+            changed_at.pop(change.property_id, None)
+            changed_at[change.property_id] = change.changed_at
+        found = Property.all_objects.select_related(
+            'property_type',
+            'location',
+            'unit',
+        ).in_bulk(list(changed_at))
+        return [
+            found.get(pk) or Property(id=pk, updated_at=at, deleted_at=at)
+            for pk, at in changed_at.items()
+        ]
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        cursor = request.query_params.get('cursor')
+        position = decode_cursor(cursor) if cursor else (0, 0)
+        if change_log.is_stale(position):
+            return Response({
+                'detail': 'The cursor is older than the change log. '
+                          'Reload the listings, then continue from '
+                          'resync_cursor.',
+                'resync_cursor': encode_cursor(*change_log.head()),
+            }, status=status.HTTP_410_GONE)
+        if cursor:
+            queryset = queryset.after(*position)
+
+        size = self.get_page_size()
+        changes = list(queryset[:size + 1])
+        has_more = len(changes) > size
+        changes = changes[:size]
+        if changes:
+            cursor = encode_cursor(changes[-1].txid, changes[-1].id)
+
+        return Response({
+            'results': self.get_serializer(self.get_properties(changes),
+                                           many=True).data,
+            'next_cursor': cursor,
+            'has_more': has_more,
+        })
+
+
+class PriceStatsView(ListAPIView):
+    """Lists the median and p10/p90 prices of a market, per unit.
+
+    The market is narrowed by any of `country`, `location`,
+    `property_type` and `unit`; figures come from the precomputed
+    statistics, refreshed on a schedule.
+    """
+    serializer_class = PriceStatsSerializer
+
+    def get_queryset(self):
+        params = self.request.query_params
+        country = params.get('country')
+        property_type = params.get('property_type')
+        unit = params.get('unit')
+        return price_stats.for_market(
+            country=country.title() if country else None,
+            location=params.get('location') or None,
+            property_type=property_type.title() if property_type else None,
+            unit=unit.upper() if unit else None,
+        )
+
+
+class LocationPriceHistoryView(GenericAPIView):
+    """Summarizes the prices recorded at a location per `bucket` (day,
+    week or month) and unit, over the period given by `since` and
+    `until`, the last year by default.
+    """
+    serializer_class = PriceHistoryBucketSerializer
+
+    def get(self, request, location_id, *args, **kwargs):
+        location = get_object_or_404(Location, pk=location_id)
+        query = PriceHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(self.get_serializer(
+            history.for_location(location.id, **query.validated_data),
+            many=True
+        ).data)
+
+
+class PhotoView(View):
+    """Serves a stored photo by the hash of its content."""
+
+    def get(self, request, digest):
+        photo = get_object_or_404(Photo, sha256=digest)
+        return photos.photo_response(request, photo)
+
+
+class SavedSearchViewset(ModelViewSet):
+    """Manages the searches a user is told about new matches of."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = SavedSearchSerializer
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(
+            owner_id=self.request.user.id
+        ).select_related('country', 'property_type').order_by('-id')
+
+    def get_serializer_class(self):
+        if self.action == 'matches':
+            return PropertySerializer
+        return self.serializer_class
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    @action(detail=True)
+    def matches(self, request, pk=None):
+        """Lists the listings that matched the search, newest first."""
+        search = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+        queryset = Property.objects.filter(
+            searchmatch__search=search
+        ).select_related('property_type').order_by('-searchmatch__id')
+        return Response(self.get_serializer(
+            queryset[:max(1, min(limit, 50))], many=True
+        ).data)
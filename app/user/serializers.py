@@ -6,13 +6,15 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.versioning import VersionedModelSerializer
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(VersionedModelSerializer):
     """Serializes the data for authentication"""
 
     class Meta:
         model = get_user_model()
-        fields = ['email', 'password', 'name']
+        fields = ['email', 'password', 'name', 'version']
         extra_kwargs = {
             'password': {
                 'write_only': True,
@@ -20,20 +22,30 @@ class UserSerializer(serializers.ModelSerializer):
             }
         }
 
+    def validate_email(self, value):
+        """Rejects an email already taken in any letter case."""
+        users = get_user_model().objects.filter_email(value)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                _('user with this email already exists.'),
+                code='unique'
+            )
+        return value
+
     def create(self, validated_data):
         """Create and return a user with encrypted password"""
         return get_user_model().objects.create_user(**validated_data)
 
-    def update(self, instance, validated_data):
-        """Update and return an instance of the user."""
+    def apply(self, instance, validated_data):
+        """Applies the changes, hashing a new password, so the update is
+        saved in one statement.
+        """
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
-
+        super().apply(instance, validated_data)
         if password:
-            user.set_password(password)
-            user.save()
-
-        return user
+            instance.set_password(password)
 
 
 class AuthSerializer(serializers.Serializer):
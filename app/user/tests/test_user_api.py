@@ -1,13 +1,22 @@
 """
 Unit tests for User creation and management A.P.I.
 """
+from unittest.mock import patch
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import seeding
+from core.tests.harness import PLAN_ROWS, QueryHarnessMixin
+from core.throttling import bucket_store
+
 CREATE_USER_URL = reverse('user:create')
 LOGIN_USER_URL = reverse('user:login')
 ME_URL = reverse('user:me')
@@ -22,6 +31,7 @@ class TestUserAPIPublicTests(TestCase):
     """Unauthenticated Tests for the user API"""
 
     def setUp(self):
+        bucket_store.clear()
         self.client = APIClient()
 
     def test_create_user(self):
@@ -49,6 +59,31 @@ class TestUserAPIPublicTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_not_create_user_with_email_in_other_case(self):
+        """Tests that an email cannot be reused by changing its case."""
+        create_user(email='test@example.com', password='testing123')
+
+        res = self.client.post(CREATE_USER_URL, data={
+            'email': 'Test@Example.com',
+            'password': 'testing123',
+            'name': 'Sample User',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', res.data)
+
+    def test_login_with_email_in_other_case(self):
+        """Tests that users can log in whatever case they type."""
+        create_user(email='Test@example.com', password='testing123')
+
+        res = self.client.post(LOGIN_USER_URL, data={
+            'email': 'test@EXAMPLE.com',
+            'password': 'testing123',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+
     def test_not_create_user_with_duplicate_email(self):
         """Tests that user cannot be created twice with the same email.
         """
@@ -111,8 +146,9 @@ class TestUserAPIPrivateTests(TestCase):
             'password': 'testing123',
             'name': 'Test User',
         }
-        user = create_user(**payload)
-        self.client.force_authenticate(user=user)
+        self.user = create_user(**payload)
+        self.client.force_authenticate(user=self.user)
+        bucket_store.clear()
 
     def test_me_endpoint_post_method_unallowed(self):
         """Tests that POST does not work on the me/ endpoint.
@@ -149,3 +185,158 @@ class TestUserAPIPrivateTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data.get('name'), update_payload.get('name'))
+
+    def test_password_change_single_update(self):
+        """Tests a profile and password change is saved in one UPDATE."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(ME_URL, data={'name': 'Gift',
+                                                  'password': 'newpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"password"', updates[0])
+        self.assertNotIn('"email"', updates[0])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(res['ETag'], '"2"')
+
+    def test_stale_update_refused(self):
+        """Tests an update based on an old version gets a 412."""
+        get_user_model().objects.filter(pk=self.user.pk).update(version=3)
+
+        res = self.client.patch(ME_URL, data={'name': 'Gift'},
+                                HTTP_IF_MATCH='"2"')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_login_keeps_version(self):
+        """Tests recording a login does not change the user's version."""
+        self.client.logout()
+        res = self.client.post(LOGIN_USER_URL, data={
+            'email': 'test@example.com',
+            'password': 'testing123',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.version, 1)
+
+
+class TestUserQueryScaling(QueryHarnessMixin, TestCase):
+    """Guards the user endpoints against N+1 queries and full scans"""
+
+    def setUp(self):
+        self.payload = {
+            'email': 'test@example.com',
+            'password': 'testing123',
+        }
+        self.user = create_user(**self.payload)
+        self.client = APIClient()
+        self.added = 0
+        bucket_store.clear()
+
+    def grow(self, n):
+        """Adds `n` more users to the table."""
+        seeding.seed_users(self.added + n)
+        self.added += n
+
+    def test_login_constant_queries(self):
+        """Tests login query count does not depend on the user count."""
+        self.assertConstantQueries(
+            lambda: self.client.post(LOGIN_USER_URL, data=self.payload),
+            self.grow
+        )
+
+    def test_me_constant_queries(self):
+        """Tests the profile query count does not depend on the user count.
+        """
+        self.client.force_authenticate(user=self.user)
+        self.assertConstantQueries(lambda: self.client.get(ME_URL),
+                                   self.grow)
+
+    def test_login_lookup_uses_index(self):
+        """Tests the login lookup by email never scans the users table."""
+        seeding.seed_users(PLAN_ROWS)
+
+        _, queries = self.capture(
+            lambda: self.client.post(LOGIN_USER_URL, data=self.payload)
+        )
+
+        self.assertNoSeqScan(self.main_query(queries, 'core_user'),
+                             table='core_user')
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'login': '3/min', 'signup': '2/min'},
+})
+class TestUserThrottling(TestCase):
+    """Tests login and signup bursts are limited per client"""
+
+    def setUp(self):
+        bucket_store.clear()
+        self.client = APIClient()
+        self.payload = {
+            'email': 'test@example.com',
+            'password': 'testing123',
+        }
+        create_user(**self.payload)
+
+    @patch('core.throttling.time.monotonic', return_value=1000.0)
+    def test_login_burst_throttled(self, _):
+        """Tests logins past the burst get a 429 with Retry-After."""
+        for _ in range(3):
+            res = self.client.post(LOGIN_USER_URL, data=self.payload)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(LOGIN_USER_URL, data=self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '20')
+
+    def test_signup_throttled(self):
+        """Tests signups past the burst are rejected before any work."""
+        for n in range(2):
+            res = self.client.post(CREATE_USER_URL, data={
+                'email': f'new{n}@example.com',
+                'password': 'testing123',
+                'name': 'New User',
+            })
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(CREATE_USER_URL, data={
+            'email': 'new2@example.com',
+            'password': 'testing123',
+            'name': 'New User',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(
+            get_user_model().objects.filter(email='new2@example.com').exists()
+        )
+
+    def test_clients_limited_separately(self):
+        """Tests one address using up its logins does not limit another."""
+        for _ in range(4):
+            self.client.post(LOGIN_USER_URL, data=self.payload)
+
+        res = self.client.post(LOGIN_USER_URL, data=self.payload,
+                               REMOTE_ADDR='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_rotation_still_throttled(self):
+        """Tests a client sending a new X-Forwarded-For on each request
+        is still limited by its own address.
+        """
+        for n in range(3):
+            self.client.post(LOGIN_USER_URL, data=self.payload,
+                             HTTP_X_FORWARDED_FOR=f'203.0.113.{n}')
+
+        res = self.client.post(LOGIN_USER_URL, data=self.payload,
+                               HTTP_X_FORWARDED_FOR='203.0.113.99')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -7,15 +7,18 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.settings import api_settings
 
+from core.versioning import VersionETagMixin
 from user.serializers import (UserSerializer, AuthSerializer)
 
 
 class CreateUserView(generics.CreateAPIView):
     """Handles requests for the creation of users"""
     serializer_class = UserSerializer
+    throttle_scope = 'signup'
 
 
-class RetrieveUpdateUserView(generics.RetrieveUpdateAPIView):
+class RetrieveUpdateUserView(VersionETagMixin,
+                             generics.RetrieveUpdateAPIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = UserSerializer
@@ -27,4 +30,6 @@ class RetrieveUpdateUserView(generics.RetrieveUpdateAPIView):
 class LoginUserView(ObtainAuthToken):
     """Handles requests to login as a given user."""
     serializer_class = AuthSerializer
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES